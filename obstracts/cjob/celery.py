@@ -1,6 +1,7 @@
 from datetime import timedelta
 import os
 from celery import Celery
+from kombu import Queue
 # Set the default Django settings module for the 'celery' program.
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'obstracts.settings')
@@ -13,9 +14,19 @@ app.config_from_object('os:environ', namespace='CELERY')
 # Load task modules from all registered Django apps.
 app.autodiscover_tasks()
 
+# a worker started without `-Q` consumes every queue, the worker profiles in
+# docker-compose.yml each pick their own with `-Q`
+from obstracts.cjob import queues  # noqa: E402
+
+app.conf.task_queues = [Queue(queue) for queue in queues.ALL]
+
 app.conf.beat_schedule = {
     "auto_refresh_statistics_data": {
         "task": "obstracts.cjob.tasks.auto_refresh_statistics_data",
         "schedule": timedelta(minutes=10),
-    }
+    },
+    "release_expired_feed_locks": {
+        "task": "obstracts.cjob.tasks.release_expired_feed_locks",
+        "schedule": timedelta(minutes=1),
+    },
 }
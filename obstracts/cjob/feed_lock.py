@@ -0,0 +1,153 @@
+"""
+Per-feed processing lock.
+
+Only one job per feed processes posts at a time. The holder keeps a lease
+that it renews with its heartbeat while it runs (`renew`); other jobs for the
+feed wait in FIFO order with the rest of their task chain stored, and
+`release` hands the lock to the next waiter and resumes its chain instead of
+having waiters poll. A holder whose lease ran out and whose job stopped
+heartbeating (e.g. its worker died) loses the lock the next time the feed's
+lock is touched, or on the `release_expired_feed_locks` sweep. Its job finds
+out the next time it renews, and stops.
+"""
+
+from datetime import timedelta
+import logging
+
+from celery import signature
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from obstracts.server import metrics, models
+
+
+def _lock_feed(feed_id):
+    # the feed row serializes every change to the feed's lock entries
+    models.FeedProfile.objects.select_for_update().get(pk=feed_id)
+
+
+def _lease_expiry():
+    return timezone.now() + timedelta(seconds=settings.FEED_LOCK_LEASE_SECONDS)
+
+
+def _grant_next(feed_id):
+    """Give the free lock of a locked feed to its oldest waiter."""
+    entry = models.FeedLock.objects.filter(feed_id=feed_id, acquired_at__isnull=True).first()
+    if not entry:
+        return None
+    entry.acquired_at = timezone.now()
+    entry.lease_expires_at = _lease_expiry()
+    entry.save(update_fields=["acquired_at", "lease_expires_at"])
+    metrics.feed_lock_wait_seconds.observe((entry.acquired_at - entry.created).total_seconds())
+    if entry.continuation:
+        continuation = entry.continuation
+        transaction.on_commit(lambda: _resume(entry.job_id, continuation))
+    return entry
+
+
+def _resume(job_id, continuation):
+    logging.info("feed lock granted to waiting job %s, resuming its chain", job_id)
+    job = models.Job.objects.get(pk=job_id)
+    job.update_state(models.JobState.PROCESSING)
+    # same as celery does when moving on to the next task of a chain
+    next_task = signature(continuation.pop())
+    next_task.apply_async(chain=continuation)
+
+
+def _expire_holder(feed_id):
+    stale = timezone.now() - timedelta(seconds=settings.JOB_HEARTBEAT_TIMEOUT_SECONDS)
+    holder = models.FeedLock.objects.filter(
+        # a job that still heartbeats is alive and keeps the lock
+        Q(job__heartbeat_at__lt=stale) | Q(job__heartbeat_at__isnull=True),
+        feed_id=feed_id,
+        acquired_at__isnull=False,
+        lease_expires_at__lt=timezone.now(),
+    ).first()
+    if not holder:
+        return False
+    logging.warning("feed lock lease of job %s on feed %s expired", holder.job_id, feed_id)
+    models.Job.objects.get(pk=holder.job_id).record_progress(error="feed lock lease expired")
+    holder.delete()
+    return True
+
+
+def acquire(job: models.Job, continuation=None):
+    """
+    Take the feed lock for `job`, or queue it behind the current holder.
+
+    `continuation` is the remaining celery chain (`task.request.chain`) that is
+    resumed when the lock is handed over. Returns whether the lock was taken.
+    """
+    with transaction.atomic():
+        _lock_feed(job.feed_id)
+        _expire_holder(job.feed_id)
+        entry, _ = models.FeedLock.objects.get_or_create(job=job, defaults=dict(feed_id=job.feed_id))
+        if entry.is_holder:
+            renew(job)
+            return True
+        entry.continuation = continuation
+        entry.save(update_fields=["continuation"])
+        if models.FeedLock.objects.filter(feed_id=job.feed_id, acquired_at__isnull=False).exists():
+            return False
+        granted = _grant_next(job.feed_id)
+        if granted.pk != entry.pk:
+            return False
+        # the caller carries on with its own chain
+        models.FeedLock.objects.filter(pk=entry.pk).update(continuation=None)
+        return True
+
+
+def renew(job: models.Job):
+    """Extend the lease of the lock held by `job`, returns False if it does not hold it."""
+    return bool(
+        models.FeedLock.objects.filter(job=job, acquired_at__isnull=False).update(
+            lease_expires_at=_lease_expiry()
+        )
+    )
+
+
+def release(job: models.Job):
+    """Drop `job`'s lock entry, handing the lock to the next waiter if it held it."""
+    with transaction.atomic():
+        _lock_feed(job.feed_id)
+        deleted, _ = models.FeedLock.objects.filter(job=job).delete()
+        if not models.FeedLock.objects.filter(feed_id=job.feed_id, acquired_at__isnull=False).exists():
+            _grant_next(job.feed_id)
+    return bool(deleted)
+
+
+def release_expired():
+    """Take the lock from dead holders whose lease expired and wake their waiters."""
+    feed_ids = set(
+        models.FeedLock.objects.filter(
+            acquired_at__isnull=False, lease_expires_at__lt=timezone.now()
+        ).values_list("feed_id", flat=True)
+    )
+    expired = 0
+    for feed_id in feed_ids:
+        with transaction.atomic():
+            _lock_feed(feed_id)
+            if _expire_holder(feed_id):
+                _grant_next(feed_id)
+                expired += 1
+    return expired
+
+
+def describe_locks():
+    """The holder and the waiting queue of every feed with lock entries."""
+    feeds = {}
+    for entry in models.FeedLock.objects.order_by("feed_id", "created"):
+        feed = feeds.setdefault(entry.feed_id, dict(feed_id=entry.feed_id, holder=None, waiting=[]))
+        if entry.is_holder:
+            feed["holder"] = dict(
+                job_id=entry.job_id,
+                acquired_at=entry.acquired_at,
+                lease_expires_at=entry.lease_expires_at,
+            )
+        else:
+            feed["waiting"].append(
+                dict(job_id=entry.job_id, queued_at=entry.created, position=len(feed["waiting"]) + 1)
+            )
+    return list(feeds.values())
@@ -20,7 +20,7 @@ def run_on_collections(job: Job, knowledgebase):
         print(f"Processing {collection_name}")
         processed_count, updated_count = sync.run_on_kb_and_collection(collection_name, knowledgebase, update_time=update_time)
         if job:
-            job.processed_items += updated_count
+            job.record_progress(processed=updated_count)
             job.extra['processed_feeds'] += 1
             job.extra['unique_objects'] += processed_count
-            job.save(update_fields=["processed_items", "extra"])
\ No newline at end of file
+            job.save(update_fields=["extra"])
\ No newline at end of file
@@ -0,0 +1,244 @@
+"""
+PDF generation.
+
+Every worker converts through one pooled HTTP session. Every attempt of a
+conversion, retries of 429s, server and connection errors included, is paced
+by a token bucket and capped by an in-flight limit, and the backoff between
+attempts is waited out without holding an in-flight slot. Both limits are
+kept in Redis, so they are shared by every worker, with a per process
+fallback when the cache is not Redis (tests, dev).
+
+The backend is `settings.PDF_BACKEND`. `PDFShiftBackend` talks to
+`settings.PDFSHIFT_API_URL`, which can point at `manage.py pdf_standin` to
+load test PDF throughput without PDFShift.
+"""
+
+import contextlib
+from functools import lru_cache
+import logging
+import threading
+import time
+import uuid
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+RETRY_DELAY_MAX_SECONDS = 120  # also caps how long a Retry-After header can make us wait
+SLOT_LEASE_SECONDS = 30  # renewed while the slot is held, so a killed worker frees it this quickly
+
+# returns the seconds to wait before a token is available, 0 if one was taken
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return tostring(wait)
+"""
+
+# leases expire so a killed worker cannot hold a slot forever
+SEMAPHORE_ACQUIRE_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[2])
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[3]))
+    return 1
+end
+return 0
+"""
+
+SEMAPHORE_RENEW_SCRIPT = """
+local t = redis.call('TIME')
+if redis.call('ZADD', KEYS[1], 'XX', 'CH', tonumber(t[1]) + tonumber(ARGV[2]), ARGV[1]) == 1 then
+    redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2]))
+    return 1
+end
+return 0
+"""
+
+
+class RetryableConversionError(Exception):
+    """A conversion attempt that can be retried, after `retry_after` seconds if the server said so."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PDFBackend:
+    def convert(self, params: dict) -> bytes:
+        """Convert once, raising `RetryableConversionError` if the attempt can be retried."""
+        raise NotImplementedError
+
+
+class PDFShiftBackend(PDFBackend):
+    """PDFShift's convert API, or anything speaking it at `PDFSHIFT_API_URL`."""
+
+    def __init__(self):
+        self.url = settings.PDFSHIFT_API_URL
+        self.session = requests.Session()
+        self.session.headers["X-API-Key"] = settings.PDFSHIFT_API_KEY or ""
+        # retried by convert(), so every attempt is rate limited
+        adapter = HTTPAdapter(max_retries=0, pool_maxsize=settings.PDF_MAX_IN_FLIGHT)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def convert(self, params):
+        try:
+            response = self.session.post(
+                self.url, json=params, timeout=settings.PDF_REQUEST_TIMEOUT_SECONDS
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableConversionError(f"pdf conversion request failed: {e}") from e
+        if response.status_code in RETRY_STATUSES:
+            raise RetryableConversionError(
+                f"pdf conversion returned {response.status_code}",
+                retry_after=_parse_retry_after(response.headers.get("Retry-After")),
+            )
+        if not response.ok:
+            logging.error("pdf conversion failed: %s", response.content[:1024])
+        response.raise_for_status()
+        return response.content
+
+
+def _parse_retry_after(value):
+    """Seconds to wait from a Retry-After header, only the delay-seconds form is used."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=1)
+def get_backend() -> PDFBackend:
+    return import_string(settings.PDF_BACKEND)()
+
+
+def _redis_client():
+    if isinstance(cache, RedisCache) or isinstance(getattr(cache, "_wrapped", None), RedisCache):
+        return cache._cache.get_client(write=True)
+    return None
+
+
+class _LocalLimits:
+    """Per process stand-in for the Redis limits."""
+
+    lock = threading.Lock()
+    tokens = None
+    updated_at = 0.0
+    in_flight = 0
+
+    @classmethod
+    def take_token(cls, rate, capacity):
+        with cls.lock:
+            now = time.monotonic()
+            tokens = capacity if cls.tokens is None else cls.tokens
+            tokens = min(capacity, tokens + (now - cls.updated_at) * rate)
+            cls.updated_at = now
+            if tokens >= 1:
+                cls.tokens = tokens - 1
+                return 0.0
+            cls.tokens = tokens
+            return (1 - tokens) / rate
+
+    @classmethod
+    def acquire_slot(cls, limit):
+        with cls.lock:
+            if cls.in_flight >= limit:
+                return False
+            cls.in_flight += 1
+            return True
+
+    @classmethod
+    def release_slot(cls):
+        with cls.lock:
+            cls.in_flight = max(0, cls.in_flight - 1)
+
+
+def wait_for_token():
+    """Block until the shared token bucket lets one more conversion start."""
+    rate = settings.PDF_RATE_LIMIT_PER_MINUTE / 60
+    capacity = max(1, settings.PDF_RATE_LIMIT_BURST)
+    client = _redis_client()
+    while True:
+        if client:
+            wait = float(
+                client.eval(TOKEN_BUCKET_SCRIPT, 1, cache.make_key("pdf-token-bucket"), rate, capacity)
+            )
+        else:
+            wait = _LocalLimits.take_token(rate, capacity)
+        if wait <= 0:
+            return
+        time.sleep(wait)
+
+
+@contextlib.contextmanager
+def in_flight_slot(poll_seconds=0.5):
+    """Hold one of the `PDF_MAX_IN_FLIGHT` conversion slots shared by all workers."""
+    limit = settings.PDF_MAX_IN_FLIGHT
+    client = _redis_client()
+    key = cache.make_key("pdf-in-flight")
+    member = uuid.uuid4().hex
+    while not (
+        client.eval(SEMAPHORE_ACQUIRE_SCRIPT, 1, key, limit, member, SLOT_LEASE_SECONDS)
+        if client
+        else _LocalLimits.acquire_slot(limit)
+    ):
+        time.sleep(poll_seconds)
+    released = threading.Event()
+    if client:
+        # the lease only expires if this process dies, however long the request takes
+        def renew_lease():
+            while not released.wait(SLOT_LEASE_SECONDS / 3):
+                client.eval(SEMAPHORE_RENEW_SCRIPT, 1, key, member, SLOT_LEASE_SECONDS)
+
+        threading.Thread(target=renew_lease, daemon=True).start()
+    try:
+        yield
+    finally:
+        released.set()
+        if client:
+            client.zrem(key, member)
+        else:
+            _LocalLimits.release_slot()
+
+
+def retry_delay(attempt, retry_after=None):
+    """Seconds to wait before retrying after `attempt` (0 for the first) failed."""
+    if retry_after is None:
+        retry_after = settings.PDF_RETRY_BACKOFF_SECONDS * 2**attempt
+    return min(retry_after, RETRY_DELAY_MAX_SECONDS)
+
+
+def convert(params: dict) -> bytes:
+    attempt = 0
+    while True:
+        with in_flight_slot():
+            wait_for_token()
+            try:
+                return get_backend().convert(params)
+            except RetryableConversionError as e:
+                if attempt >= settings.PDF_MAX_RETRIES:
+                    raise
+                delay = retry_delay(attempt, e.retry_after)
+                logging.warning("%s, retrying in %ss", e, delay)
+        time.sleep(delay)
+        attempt += 1
@@ -0,0 +1,40 @@
+"""
+Celery queues, one per workload class.
+
+Tasks pick their queue through `@shared_task(queue=...)`, so the routing holds
+whichever celery app sends them. Bookkeeping tasks (job state, feed lock) and
+history4feed's tasks stay on celery's default queue. Posts and PDFs of small
+jobs (single post reprocessing, manually added posts) go to a `_priority`
+queue, so they are not stuck behind the backfill of a whole feed. See the
+worker profiles in `docker-compose.yml`, a worker started without `-Q`
+consumes every queue in `ALL`.
+"""
+
+from django.conf import settings
+
+DEFAULT = "celery"
+POSTS = "posts"
+PDF = "pdf"
+KNOWLEDGEBASE = "knowledgebase"
+CLUSTERING = "clustering"
+MAINTENANCE = "maintenance"
+
+PRIORITY_SUFFIX = "_priority"
+
+ALL = [
+    DEFAULT,
+    POSTS + PRIORITY_SUFFIX,
+    POSTS,
+    PDF + PRIORITY_SUFFIX,
+    PDF,
+    KNOWLEDGEBASE,
+    CLUSTERING,
+    MAINTENANCE,
+]
+
+
+def for_job(queue, item_count):
+    """The queue for the tasks of a job processing `item_count` items."""
+    if item_count <= settings.PRIORITY_JOB_MAX_ITEMS:
+        return queue + PRIORITY_SUFFIX
+    return queue
@@ -1,25 +1,29 @@
+from datetime import timedelta
 import io
+import itertools
 import logging
+import threading
 import uuid
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from celery import shared_task, chain, current_task, Task as CeleryTask
+from celery import shared_task, chain, group, current_task, Task as CeleryTask
 from celery.worker.request import Request
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Q
 import typing
 from celery.exceptions import SoftTimeLimitExceeded, TimeLimitExceeded
 from django.utils import timezone
 
 from dogesec_commons.stixifier.stixifier import StixifyProcessor, ReportProperties
 from txt2stix.txt2stix import Txt2StixData
-import requests
 
-from obstracts.cjob import helpers
-from obstracts.classifier.models import DocumentEmbedding
+from obstracts.cjob import feed_lock, helpers, pdf, queues, timing
+from obstracts.classifier.models import DocumentEmbedding, invalidate_similarity_cache
 import obstracts.classifier.tasks as classifier_tasks
-from obstracts.server.statistics import build_data_and_add_to_cache
+from obstracts.server import metrics
+from obstracts.server.statistics import refresh_statistics_data
+from obstracts.server.values.values import track_uploaded_objects
 from ..server.models import Job
 from ..server import models
-from django.core.cache import cache
 from history4feed.app import models as h4f_models
 
 from django.core.files.base import File
@@ -29,31 +33,55 @@ if typing.TYPE_CHECKING:
     from .. import settings
 
 POLL_INTERVAL = 30
-LOCK_EXPIRE = 60 * 10
 
 
-def get_lock_id(job: Job):
-    lock_id = f"feed-lock-{job.feed.id}"
-    logging.debug("using lock id %s", lock_id)
-    return lock_id
-
+class ShouldRetry(Exception):
+    pass
 
-def queue_lock(job: Job):
-    logging.debug("lock_value = {v}".format(v=cache.get(get_lock_id(job))))
-    lock_value = dict(feed_id=str(job.feed.id))
-    if job:
-        lock_value["job_id"] = str(job.id)
 
-    status = cache.add(get_lock_id(job), lock_value, timeout=LOCK_EXPIRE)
-    return status
+class CancelledJob(Exception):
+    pass
 
 
-class ShouldRetry(Exception):
+class FeedLockLost(Exception):
     pass
 
 
-class CancelledJob(Exception):
-    pass
+class JobHeartbeat:
+    """
+    Heartbeat a job and renew its feed lock from a background thread while
+    one of its posts is processed, however long the post takes.
+    """
+
+    def __init__(self, job: Job, worker):
+        self.job = job
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.interval = min(settings.FEED_LOCK_LEASE_SECONDS, settings.JOB_HEARTBEAT_TIMEOUT_SECONDS) / 4
+
+    def beat(self):
+        """Heartbeat now, returns False if the job no longer holds its feed lock."""
+        self.job.heartbeat(self.worker)
+        return feed_lock.renew(self.job)
+
+    def start(self):
+        """Beat and keep beating, returns False without starting if the feed lock was lost."""
+        if not self.beat():
+            return False
+        threading.Thread(target=self._run, daemon=True).start()
+        return True
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        try:
+            while not self.stopped.wait(self.interval):
+                if not self.beat():
+                    logging.error("job %s lost its feed lock while processing a post", self.job.id)
+                    return
+        finally:
+            connection.close()
 
 
 @shared_task
@@ -68,12 +96,10 @@ def job_completed_with_error(job_id):
 
     if job.feed:
         logging.info("removing queue lock for feed `%s`", str(job.feed.id))
-        if cache.delete(get_lock_id(job)):
-            logging.info("lock deleted")
+        if feed_lock.release(job):
+            logging.info("lock released")
         else:
-            logging.error("Failed to remove lock")
-
-    job.save()
+            logging.info("job %s held no lock", job_id)
 
 
 def create_job_entry(h4f_job: h4f_models.Job, profile_id, **extra):
@@ -98,7 +124,8 @@ def create_pdf_reindex_job(feed, files):
         state=models.JobState.QUEUED,
     )
 
-    pdf_tasks = [reindex_pdf_for_post.si(job.id, f.post_id) for f in files]
+    queue = queues.for_job(queues.PDF, len(files))
+    pdf_tasks = [reindex_pdf_for_post.si(job.id, f.post_id).set(queue=queue) for f in files]
     pdf_tasks.append(job_completed_with_error.si(job.id))
     chain(pdf_tasks).apply_async()
 
@@ -136,10 +163,37 @@ def create_reprocessing_job(feed, posts: list[models.h4f_models.Post], options:
     return job
 
 
-def process_posts_from_index(job_id, post_ids, index, profile_ids=None):
-    """Build the remaining post-processing chain, including job finalization."""
+def process_posts_from_index(job_id, post_ids, index, profile_ids=None, stride=None):
+    """Build the remaining post-processing chain, including job finalization.
+
+    When `POST_PROCESSING_CONCURRENCY` is greater than 1 the posts are striped
+    across that many lanes, each lane being its own chain, so that up to that
+    many posts of the job are processed at once. The last lane to finish
+    finalizes the job. Passing `stride` builds the continuation of a single
+    lane starting at `index`.
+    """
     post_ids = [str(post_id) for post_id in post_ids]
     profile_ids = profile_ids or [None] * len(post_ids)
+    if stride:
+        return _build_lane(job_id, post_ids, index, profile_ids, stride)
+
+    lanes = min(settings.POST_PROCESSING_CONCURRENCY, len(post_ids) - index)
+    # where each lane has got to, so the job can be resumed if its worker dies
+    checkpoint = dict(post_ids=post_ids, profile_ids=profile_ids, stride=None, lanes={"0": index})
+    if lanes > 1:
+        checkpoint.update(
+            stride=lanes,
+            lanes={str((index + lane) % lanes): index + lane for lane in range(lanes)},
+        )
+        Job.objects.filter(pk=job_id).update(pending_lanes=lanes, checkpoint=checkpoint)
+        processing_group = group(
+            _build_lane(job_id, post_ids, index + lane, profile_ids, lanes)
+            for lane in range(lanes)
+        )
+        processing_group.stamp(obstracts_id=str(job_id))
+        return processing_group
+
+    Job.objects.filter(pk=job_id).update(checkpoint=checkpoint)
     tasks = [
         process_post.si(
             job_id=job_id,
@@ -148,7 +202,7 @@ def process_posts_from_index(job_id, post_ids, index, profile_ids=None):
             post_ids=post_ids,
             post_index=post_index,
             profile_ids=profile_ids,
-        )
+        ).set(queue=queues.for_job(queues.POSTS, len(post_ids)))
         for post_index, post_id in enumerate(post_ids[index:], start=index)
     ]
     tasks.append(job_completed_with_error.si(job_id=job_id))
@@ -157,6 +211,41 @@ def process_posts_from_index(job_id, post_ids, index, profile_ids=None):
     return processing_chain
 
 
+def _build_lane(job_id, post_ids, index, profile_ids, stride):
+    tasks = [
+        process_post.si(
+            job_id=job_id,
+            post_id=post_ids[post_index],
+            profile_id=profile_ids[post_index],
+            post_ids=post_ids,
+            post_index=post_index,
+            profile_ids=profile_ids,
+            stride=stride,
+        ).set(queue=queues.for_job(queues.POSTS, len(post_ids)))
+        for post_index in range(index, len(post_ids), stride)
+    ]
+    tasks.append(lane_completed.si(job_id=job_id))
+    lane_chain = chain(tasks)
+    lane_chain.stamp(obstracts_id=str(job_id))
+    return lane_chain
+
+
+@shared_task
+def lane_completed(job_id):
+    """Mark one processing lane as done, finalizing the job after the last one."""
+    with transaction.atomic():
+        job = Job.objects.select_for_update().get(pk=job_id)
+        if job.pending_lanes <= 0:
+            logging.warning("job %s has no pending lanes left", job_id)
+            return
+        job.pending_lanes -= 1
+        job.save(update_fields=["pending_lanes"])
+        is_last_lane = job.pending_lanes == 0
+
+    if is_last_lane:
+        job_completed_with_error(job_id=job_id)
+
+
 @shared_task(bind=True)
 def start_processing(self, job_id):
     job = Job.objects.get(pk=job_id)
@@ -178,20 +267,30 @@ def start_processing(self, job_id):
     t.stamp(obstracts_id=str(job.id))
     return self.replace(t)
 
-@shared_task(bind=True, default_retry_delay=10)
+@shared_task(bind=True)
 def wait_in_queue(self: CeleryTask, job_id):
     logging.info("job with id %s waiting in queue", job_id)
     job = Job.objects.get(pk=job_id)
     if job.is_cancelled():
-        job.errors.append("job cancelled while in queue")
-        job.save(update_fields=["errors"])
+        job.record_progress(error="job cancelled while in queue")
         return False
-    if not queue_lock(job):
-        return self.retry(max_retries=300)
+    if not feed_lock.acquire(job, continuation=self.request.chain):
+        # the rest of the chain is resumed by feed_lock.release when it is this job's turn
+        logging.info("job %s queued behind the feed lock holder", job_id)
+        self.request.chain = None
+        return False
+    job.heartbeat(self.request.hostname)
     job.update_state(models.JobState.PROCESSING)
     return True
 
 
+@shared_task(queue=queues.MAINTENANCE)
+def release_expired_feed_locks():
+    feed_count = feed_lock.release_expired()
+    if feed_count:
+        logging.warning("released %d expired feed locks", feed_count)
+
+
 def download_pdf(url, is_demo=False, cookie_consent_mode=None):
     params = {
         "source": url,
@@ -207,41 +306,61 @@ def download_pdf(url, is_demo=False, cookie_consent_mode=None):
         )
     if is_demo:
         params.update(sandbox=True)
-    response = requests.post(
-        f"https://api.pdfshift.io/v3/convert/pdf",
-        headers={"X-API-Key": settings.PDFSHIFT_API_KEY},
-        json=params,
-    )
-    if not response.ok:
-        print(response.content)
-    response.raise_for_status()
-    return response.content
+    return pdf.convert(params)
 
-@shared_task
+@shared_task(queue=queues.KNOWLEDGEBASE)
 def update_knowledgebase(job_id):
     job = models.Job.objects.get(pk=job_id)
     state = models.JobState.PROCESSED
     try:
         helpers.run_on_collections(job, job.extra['knowledgebase'])
     except Exception as e:
-        job.errors.append(str(e))
-        job.save(update_fields=["errors"])
+        job.record_progress(error=str(e))
         state = models.JobState.PROCESS_FAILED
     job.update_state(state)
 
 
-def _build_topic_embedding_for_post(post_file, force=False, include_non_incident=False):
-    try:
-        post_file.create_embedding(
-            force=force,
-            include_non_incident=include_non_incident,
-        )
-        if post_file.embedding_id:
-            return "processed", None
-        return "failed", f"embedding not created for post {post_file.post_id}"
-    except Exception:
-        logging.exception("embedding build failed for post %s", post_file.post_id)
-        return "failed", f"embedding build failed for post {post_file.post_id}"
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _prepare_embedding_documents(post_files: list[models.File]):
+    """Create or update the embedding documents of `post_files` with their current text."""
+    existing = DocumentEmbedding.objects.in_bulk([post_file.pk for post_file in post_files])
+    docs = []
+    for post_file in post_files:
+        doc = existing.get(post_file.pk, DocumentEmbedding(id=post_file.pk))
+        doc.text = post_file.embedding_text
+        docs.append(doc)
+    DocumentEmbedding.objects.bulk_create(
+        docs,
+        update_conflicts=True,
+        unique_fields=["id"],
+        update_fields=["text"],
+    )
+    return docs
+
+
+def _link_topic_embeddings(post_files: list[models.File], failures: dict):
+    """Point posts at their embeddings, returning the processed count and error messages."""
+    processed = []
+    errors = []
+    for post_file in post_files:
+        if post_file.pk in failures:
+            logging.error(
+                "embedding build failed for post %s: %s",
+                post_file.post_id,
+                failures[post_file.pk],
+            )
+            errors.append(f"embedding build failed for post {post_file.post_id}")
+            continue
+        post_file.embedding_id = post_file.pk
+        processed.append(post_file)
+    models.File.objects.bulk_update(processed, ["embedding"])
+    invalidate_similarity_cache()
+    return len(processed), errors
 
 
 def run_topic_embeddings_job(
@@ -252,7 +371,7 @@ def run_topic_embeddings_job(
 ):
     job = models.Job.objects.get(pk=job_id)
     try:
-        qs = models.File.objects.filter(processed=True)
+        qs = models.File.objects.filter(processed=True).select_related("post")
         if not include_non_incident:
             qs = qs.filter(ai_describes_incident=True)
 
@@ -264,31 +383,37 @@ def run_topic_embeddings_job(
             return
 
         cancelled = False
+        batches = _chunked(
+            qs.iterator(chunk_size=settings.CLASSIFIER_EMBEDDING_BATCH_SIZE),
+            settings.CLASSIFIER_EMBEDDING_BATCH_SIZE,
+        )
 
+        # only the embedding requests run in the pool, database writes stay on this thread
         with ThreadPoolExecutor(max_workers=workers) as pool:
             futures = {
                 pool.submit(
-                    _build_topic_embedding_for_post,
-                    post_file,
-                    force,
-                    include_non_incident,
-                ): post_file.pk
-                for post_file in qs
+                    classifier_tasks.compute_embeddings_for_documents,
+                    _prepare_embedding_documents(batch),
+                ): batch
+                for batch in batches
             }
             for future in as_completed(futures):
-                status, msg = future.result()
+                if future.cancelled():
+                    continue
+                batch = futures[future]
+                try:
+                    failures = future.result()
+                except Exception:
+                    logging.exception("embedding build failed for %d posts", len(batch))
+                    failures = {post_file.pk: "embedding request failed" for post_file in batch}
+                processed, errors = _link_topic_embeddings(batch, failures)
                 if job.is_cancelled():
                     cancelled = True
                     pool.shutdown(wait=False, cancel_futures=True)
-                if status == "processed":
-                    job.processed_items += 1
-                elif status == "failed":
-                    job.failed_processes += 1
-                    if msg:
-                        job.errors.append(msg)
-                else:
-                    logging.error("unexpected status %s for post %s", status, futures[future])
-                job.save(update_fields=["errors", "processed_items", "failed_processes"])
+                job.record_progress(processed=processed, failed=len(errors))
+                for msg in errors:
+                    job.record_progress(error=msg)
+        job.refresh_progress()
         if cancelled:
             job.update_state(models.JobState.CANCELLED)
         elif job.failed_processes and job.processed_items == 0:
@@ -297,46 +422,42 @@ def run_topic_embeddings_job(
             job.update_state(models.JobState.PROCESSED)
     except Exception as e:
         logging.exception("topic embedding task failed")
-        job.errors.append(str(e))
-        job.save(update_fields=["errors"])
+        job.record_progress(error=str(e))
         job.update_state(models.JobState.PROCESS_FAILED)
-    finally:
-        job.save(update_fields=["errors", "processed_items", "failed_processes"])
 
 
-def run_topic_clusters_job(job_id, force=False):
+def run_topic_clusters_job(job_id, force=False, workers=settings.CLASSIFIER_CONCURRENCY):
     job = models.Job.objects.get(pk=job_id)
     try:
         if job.is_cancelled():
             job.update_state(models.JobState.CANCELLED)
             return
 
-        classifier_tasks.run_clustering(
+        metrics = classifier_tasks.run_clustering(
             force=force,
-            workers=settings.CLASSIFIER_CONCURRENCY,
+            workers=workers,
             should_cancel=lambda: models.Job.objects.get(pk=job_id).is_cancelled(),
         )
+        job.extra = {**(job.extra or {}), "clustering": metrics}
+        job.save(update_fields=["extra"])
         if job.is_cancelled():
             job.update_state(models.JobState.CANCELLED)
             return
-        job.processed_items += 1
+        job.record_progress(processed=1)
         job.update_state(models.JobState.PROCESSED)
     except classifier_tasks.ClusteringCancelled:
         job.update_state(models.JobState.CANCELLED)
     except Exception as e:
         logging.exception("topic cluster task failed")
-        job.failed_processes += 1
-        job.errors.append(str(e))
+        job.record_progress(failed=1, error=str(e))
         job.update_state(models.JobState.PROCESS_FAILED)
-    finally:
-        job.save(update_fields=["errors", "processed_items", "failed_processes"])
 
 
-@shared_task
+@shared_task(queue=queues.CLUSTERING)
 def build_topic_clusters(job_id, force=False):
     run_topic_clusters_job(job_id, force=force)
 
-@shared_task
+@shared_task(queue=queues.PDF)
 def add_pdf_to_post(job_id, post_id):
     job = models.Job.objects.get(pk=job_id)
     post_file = models.File.objects.get(pk=post_id)
@@ -351,8 +472,7 @@ def add_pdf_to_post(job_id, post_id):
         post_file.save(update_fields=["pdf_file"])
     except Exception as e:
         logging.exception(f"process file to pdf failed for {post_file.pk}")
-        job.errors.append(f"process file to pdf failed for {post_file.pk}: {str(e)}")
-        job.save()
+        job.record_progress(error=f"process file to pdf failed for {post_file.pk}: {str(e)}")
 
 
 @shared_task
@@ -364,6 +484,7 @@ def process_post_hard_timeout(
     post_ids=None,
     post_index=None,
     profile_ids=None,
+    stride=None,
 ):
     """Record a hard timeout and resume after the post whose process was killed."""
     msg = f"task hard timed out for post {post_id} after {timeout} seconds"
@@ -378,15 +499,20 @@ def process_post_hard_timeout(
             job.failed_processes += 1
             job.save(update_fields=["errors", "failed_processes"])
         can_continue = job.failed_processes <= settings.MAX_FAILED_PROCESSES
+    if post_index is not None:
+        job.record_checkpoint(post_index, stride)
 
     if can_continue and post_ids is not None and post_index is not None:
         continuation = process_posts_from_index(
             job_id,
             post_ids,
-            post_index + 1,
+            post_index + (stride or 1),
             profile_ids=profile_ids,
+            stride=stride,
         )
         continuation.apply_async(task_id=failed_task_id)
+    elif stride:
+        lane_completed.delay(job_id=job_id)
     else:
         job_completed_with_error.delay(job_id=job_id)
 
@@ -405,6 +531,7 @@ class ProcessPostRequest(Request):
             post_ids = self.kwargs.get("post_ids")
             post_index = self.kwargs.get("post_index")
             profile_ids = self.kwargs.get("profile_ids")
+            stride = self.kwargs.get("stride")
             process_post_hard_timeout.delay(
                 job_id=job_id,
                 post_id=post_id,
@@ -413,6 +540,7 @@ class ProcessPostRequest(Request):
                 post_ids=post_ids,
                 post_index=post_index,
                 profile_ids=profile_ids,
+                stride=stride,
             )
         except Exception:
             logging.exception(
@@ -427,6 +555,7 @@ class ProcessPostTask(CeleryTask):
 @shared_task(
     bind=True,
     base=ProcessPostTask,
+    queue=queues.POSTS,
     soft_time_limit=settings.PROCESSING_TIMEOUT_SECONDS,
     time_limit=settings.PROCESSING_TIMEOUT_SECONDS + 20,
 )
@@ -438,6 +567,7 @@ def process_post(
     post_ids=None,
     post_index=None,
     profile_ids=None,
+    stride=None,
     *args,
 ):
     from obstracts.server.views import PostOnlyView
@@ -447,9 +577,14 @@ def process_post(
     profile = job.profile
     if profile_id:
         profile = models.Profile.objects.get(pk=profile_id)
+    timer = timing.PostTimer().start()
+    status = "failed"
+    heartbeat = JobHeartbeat(job, self.request.hostname)
     try:
         if job.is_cancelled():
             raise CancelledJob()
+        if not heartbeat.start():
+            raise FeedLockLost()
         file, _ = models.File.objects.update_or_create(
             post_id=post_id,
             defaults=dict(
@@ -462,9 +597,10 @@ def process_post(
         )
 
         if profile.generate_pdf and (job.type != models.JobType.REPROCESS_POSTS or not file.pdf_file):
-            add_pdf_to_post.delay(job_id, post_id)
-        
-        PostOnlyView.remove_report_objects(file)
+            add_pdf_to_post.apply_async(
+                (job_id, post_id), queue=queues.for_job(queues.PDF, len(post_ids or [post_id]))
+            )
+
 
         mode = "html_article"
         stream = io.BytesIO(post.description.encode())
@@ -501,30 +637,50 @@ def process_post(
             properties,
             dict(_obstracts_feed_id=str(job.feed.id), _obstracts_post_id=post_id),
         )
-        if job.type == models.JobType.REPROCESS_POSTS and job.extra['skip_extraction']:
-            processor.output_md = file.markdown_file.open().read().decode()
-            txt2stix_data = None
-            if job.extra['skip_extraction']:
-                if not file.txt2stix_data:
-                    raise Exception("no existing extraction data to use for reprocess with skip_extraction=true")
-                txt2stix_data = Txt2StixData.model_validate(file.txt2stix_data)
-            processor.txt2stix(txt2stix_data)
+        # the post's stored objects are not removed before the upload, only
+        # those missing from the new upload are removed after it
+        with track_uploaded_objects() as uploaded_keys:
+            if job.type == models.JobType.REPROCESS_POSTS and job.extra['skip_extraction']:
+                processor.output_md = file.markdown_file.open().read().decode()
+                txt2stix_data = None
+                if job.extra['skip_extraction']:
+                    if not file.txt2stix_data:
+                        raise Exception("no existing extraction data to use for reprocess with skip_extraction=true")
+                    txt2stix_data = Txt2StixData.model_validate(file.txt2stix_data)
+                with timer.stage("extraction"):
+                    processor.txt2stix(txt2stix_data)
+            else:
+                # same steps as processor.process(), timed one by one
+                with timer.stage("markdown"):
+                    processor.file2txt()
+                with timer.stage("extraction"):
+                    processor.txt2stix()
             processor.write_bundle(processor.bundler)
-            processor.upload_to_arango()
-        else:
-            processor.process()
+            with timer.stage("upload_to_arango"):
+                processor.upload_to_arango()
+        with timer.stage("remove_stale_objects"):
+            PostOnlyView.remove_stale_report_objects(file, uploaded_keys)
 
         if getattr(processor, "md_file", None):
-            file.markdown_file.save("markdown.md", processor.md_file.open(), save=False)
-            models.FileImage.objects.filter(report=file).delete()  # remove old references
+            with timer.stage("save_images"):
+                file.markdown_file.save("markdown.md", processor.md_file.open(), save=False)
+                models.FileImage.objects.filter(report=file).delete()  # remove old references
 
-            for image in processor.md_images:
-                models.FileImage.objects.create(
-                    report=file, file=File(image, image.name), name=image.name
-                )
+                for image in processor.md_images:
+                    models.FileImage.objects.create(
+                        report=file, file=File(image, image.name), name=image.name
+                    )
 
         file.set_txt2stix_data(processor.txt2stix_data)
-        file.create_embedding(include_non_incident=settings.CREATE_EMBEDDING_INCLUDE_NON_INCIDENT)
+        with timer.stage("embedding"):
+            file.create_embedding(include_non_incident=settings.CREATE_EMBEDDING_INCLUDE_NON_INCIDENT)
+        if file.embedding_id:
+            with timer.stage("topic_assignment"):
+                try:
+                    classifier_tasks.assign_to_cluster(file.embedding)
+                except Exception:
+                    # the next topic clustering run picks the post up instead
+                    logging.exception("topic assignment failed for post %s", post_id)
 
         file.processed = True
         file.save(
@@ -533,33 +689,70 @@ def process_post(
                 "markdown_file",
             ]
         )
-        job.processed_items += 1
+        job.record_progress(processed=1)
+        status = "processed"
     except CancelledJob:
         msg = f"job cancelled by user for post {post_id}"
         logging.error(msg, exc_info=True)
-        job.errors.append(msg)
+        job.record_progress(error=msg)
+        status = "cancelled"
+    except FeedLockLost:
+        # the lease expired with the job's heartbeat and another job may be processing the feed
+        msg = f"job lost its feed lock before post {post_id}, stopping it"
+        logging.error(msg)
+        job.record_progress(error=msg)
+        job.update_state(models.JobState.PROCESS_FAILED)
+        self.request.chain = None
     except (SoftTimeLimitExceeded, TimeLimitExceeded) as e:
         msg= f"task timed out for post {post_id}: {str(e)}"
-        job.errors.append(msg)
         logging.error(msg, exc_info=True)
-        job.failed_processes += 1
+        job.record_progress(failed=1, error=msg)
     except Exception as e:
         msg = f"processing failed for post {post_id}"
         logging.error(msg, exc_info=True)
-        job.failed_processes += 1
-        job.errors.append(msg)
-    job.save(update_fields=["errors", "processed_items", "failed_processes"])
+        job.record_progress(failed=1, error=msg)
+    finally:
+        heartbeat.stop()
+    timer.stop()
+    save_post_metrics(job, post_id, profile, timer, status)
+    if post_index is not None:
+        job.record_checkpoint(post_index, stride)
     return job_id
 
 
-@shared_task
-def reindex_pdf_for_post(job_id, post_id):
+def save_post_metrics(job, post_id, profile, timer: timing.PostTimer, status):
+    try:
+        models.PostProcessingMetrics.objects.create(
+            job=job,
+            post_id=post_id,
+            profile_id=profile and profile.id,
+            succeeded=status == "processed",
+            total_seconds=timer.total_seconds,
+            stages=timer.stages,
+            db_queries=timer.db_queries,
+            arango_requests=timer.arango_requests,
+        )
+    except Exception:
+        logging.exception("could not save processing metrics of post %s", post_id)
+    metrics.posts_processed.labels(job.feed_id, profile and profile.id, status).inc()
+    metrics.post_processing_seconds.labels("total").observe(timer.total_seconds)
+    for stage, seconds in timer.stages.items():
+        metrics.post_processing_seconds.labels(stage).observe(seconds)
+    logging.info(
+        "processed post %s in %ss (%d db queries, %d arango requests): %s",
+        post_id, timer.total_seconds, timer.db_queries, timer.arango_requests, timer.stages,
+    )
+
+
+@shared_task(bind=True, queue=queues.PDF)
+def reindex_pdf_for_post(self, job_id, post_id):
     post_file = models.File.objects.get(pk=post_id)
     error_msg = None
     success = False
     job = Job.objects.get(pk=job_id)
     if job.is_cancelled():
         return
+    job.heartbeat(self.request.hostname)
     job.update_state(models.JobState.PROCESSING)
     feedp = models.FeedProfile.objects.get(feed_id=post_file.feed_id)
     try:
@@ -578,41 +771,135 @@ def reindex_pdf_for_post(job_id, post_id):
         logging.exception(f"process file to pdf failed for {post_file.pk}")
         error_msg = f"process file to pdf failed for {post_file.pk}"
 
-    with transaction.atomic():
-        job = Job.objects.select_for_update().get(pk=job_id)
-        if success:
-            job.processed_items += 1
-        else:
-            job.failed_processes += 1
-            if error_msg:
-                job.errors.append(error_msg)
-        job.save(
-            update_fields=[
-                "errors",
-                "processed_items",
-                "failed_processes",
-            ]
-        )
+    if success:
+        job.record_progress(processed=1)
+    else:
+        job.record_progress(failed=1, error=error_msg)
 
 
-@shared_task
-def auto_refresh_statistics_data():
-    build_data_and_add_to_cache(timezone.now())
+@shared_task(queue=queues.MAINTENANCE)
+def auto_refresh_statistics_data(lock_acquired=False):
+    refresh_statistics_data(timezone.now(), lock_acquired=lock_acquired)
 
 from celery import signals
 
 
+def resume_from_checkpoint(job: Job):
+    """Build the chain that carries on `job` from its checkpoint."""
+    checkpoint = job.checkpoint
+    post_ids, profile_ids, stride = (
+        checkpoint["post_ids"],
+        checkpoint["profile_ids"],
+        checkpoint["stride"],
+    )
+    if not stride:
+        continuation = process_posts_from_index(
+            job.id, post_ids, checkpoint["lanes"]["0"], profile_ids=profile_ids
+        )
+    else:
+        indexes = sorted(index for index in checkpoint["lanes"].values() if index < len(post_ids))
+        Job.objects.filter(pk=job.id).update(pending_lanes=len(indexes))
+        if indexes:
+            continuation = group(
+                _build_lane(job.id, post_ids, index, profile_ids, stride) for index in indexes
+            )
+        else:
+            continuation = job_completed_with_error.si(job_id=job.id)
+    # the job may have lost its feed lock while it was orphaned
+    t = chain(wait_in_queue.si(job_id=job.id), continuation)
+    t.stamp(obstracts_id=str(job.id))
+    return t
+
+
+def resume_orphaned_jobs(worker=None):
+    """
+    Resume processing jobs whose heartbeat expired from their checkpoint.
+
+    Jobs still heartbeating belong to a live worker and are left alone, as are
+    queued jobs, which are resumed by the feed lock. Every orphan is claimed
+    with a conditional update so only one booting worker resumes it.
+    """
+    expired = timezone.now() - timedelta(seconds=settings.JOB_HEARTBEAT_TIMEOUT_SECONDS)
+    orphans = models.Job.objects.filter(
+        state__in=[models.JobState.PROCESSING, models.JobState.CANCELLING],
+        checkpoint__isnull=False,
+        heartbeat_at__lt=expired,
+    )
+    resumed = []
+    for job in orphans:
+        claimed = models.Job.objects.filter(pk=job.pk, heartbeat_at=job.heartbeat_at).update(
+            heartbeat_at=timezone.now(), worker=worker
+        )
+        if not claimed:
+            continue
+        logging.warning("resuming job %s orphaned by worker %s", job.id, job.worker)
+        if job.state == models.JobState.CANCELLING:
+            job_completed_with_error.delay(job_id=job.id)
+        else:
+            resume_from_checkpoint(job).apply_async()
+        resumed.append(job.id)
+    return resumed
+
+
+def fail_orphaned_jobs():
+    """
+    End processing jobs whose heartbeat expired and that have no checkpoint to
+    resume from, e.g. PDF reindex jobs, and hand their feed lock on.
+
+    A job that never heartbeated counts as expired once it is older than the
+    heartbeat timeout. Processing jobs become failed and cancelling jobs
+    cancelled.
+    """
+    expired = timezone.now() - timedelta(seconds=settings.JOB_HEARTBEAT_TIMEOUT_SECONDS)
+    orphans = models.Job.objects.filter(
+        Q(heartbeat_at__lt=expired) | Q(heartbeat_at__isnull=True, created__lt=expired),
+        state__in=[models.JobState.PROCESSING, models.JobState.CANCELLING],
+        checkpoint__isnull=True,
+    )
+    failed = []
+    for job in orphans:
+        state = models.JobState.CANCELLED if job.state == models.JobState.CANCELLING else models.JobState.PROCESS_FAILED
+        claimed = models.Job.objects.filter(pk=job.pk, state=job.state, heartbeat_at=job.heartbeat_at).update(
+            state=state, completion_time=timezone.now()
+        )
+        if not claimed:
+            continue
+        logging.warning("job %s orphaned by worker %s has no checkpoint, marking it %s", job.id, job.worker, state)
+        job.record_progress(error="job was orphaned by a worker shutdown and cannot be resumed")
+        feed_lock.release(job)
+        failed.append(job.id)
+    return failed
+
+
 @signals.worker_ready.connect
-def mark_old_jobs_as_failed(**kwargs):
+def mark_old_jobs_as_failed(sender=None, **kwargs):
+    # history4feed cancels its own retrieval jobs on startup
     models.Job.objects.filter(state=models.JobState.RETRIEVING).update(
         state=models.JobState.RETRIEVE_FAILED
     )
-    models.Job.objects.exclude(
-        state__in=[
-            models.JobState.RETRIEVE_FAILED,
-            models.JobState.CANCELLED,
-            models.JobState.PROCESS_FAILED,
-            models.JobState.PROCESSED,
-        ]
-    ).update(state=models.JobState.CANCELLED)
+    resume_orphaned_jobs(getattr(sender, "hostname", None))
+    fail_orphaned_jobs()
     auto_refresh_statistics_data.delay()
+
+
+def unconsumed_queues(active_queues):
+    """The queues of `queues.ALL` that none of the workers in `active_queues` consume."""
+    consumed = {
+        queue["name"] for worker_queues in (active_queues or {}).values() for queue in worker_queues
+    }
+    return [queue for queue in queues.ALL if queue not in consumed]
+
+
+@signals.worker_ready.connect
+def warn_unconsumed_queues(sender=None, **kwargs):
+    # tasks sent to a queue no worker consumes wait there silently
+    for queue in unconsumed_queues(sender.app.control.inspect(timeout=5).active_queues()):
+        logging.warning(
+            "no celery worker consumes the %r queue, its tasks will not run, see the worker profiles in docker-compose.yml",
+            queue,
+        )
+
+
+@signals.worker_init.connect
+def start_metrics_exporter(sender=None, **kwargs):
+    metrics.start_celery_exporter()
@@ -0,0 +1,99 @@
+"""
+Per-stage timing of post processing.
+
+`PostTimer` records the wall-clock time of the named stages of one post, and
+counts the database queries and ArangoDB requests made while it runs. Stages
+may be nested (e.g. the object values hook runs inside the Arango upload), a
+stage's time excludes the stages nested in it, so the stages add up to at
+most the total.
+
+Code that can run outside of post processing uses the module level `stage()`,
+which is a no-op unless a timer is running on the current thread.
+"""
+
+import contextlib
+import functools
+import threading
+import time
+
+from django.db import connections
+
+_current = threading.local()
+
+
+def current_timer() -> "PostTimer | None":
+    return getattr(_current, "timer", None)
+
+
+class PostTimer:
+    def __init__(self):
+        self.stages = {}
+        self.db_queries = 0
+        self.arango_requests = 0
+        self.total_seconds = None
+        self._nested = [0.0]
+        self._started_at = None
+        self._exit_stack = None
+
+    def start(self):
+        self._exit_stack = contextlib.ExitStack()
+        for conn in connections.all():
+            self._exit_stack.enter_context(conn.execute_wrapper(self._count_query))
+        _current.timer = self
+        self._started_at = time.perf_counter()
+        return self
+
+    def stop(self):
+        self.total_seconds = round(time.perf_counter() - self._started_at, 3)
+        _current.timer = None
+        self._exit_stack.close()
+        return self
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self._nested.append(0.0)
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started_at
+            nested = self._nested.pop()
+            self._nested[-1] += elapsed
+            self.stages[name] = round(self.stages.get(name, 0) + elapsed - nested, 3)
+
+    def _count_query(self, execute, sql, params, many, context):
+        self.db_queries += 1
+        return execute(sql, params, many, context)
+
+
+@contextlib.contextmanager
+def stage(name):
+    timer = current_timer()
+    if not timer:
+        yield
+        return
+    with timer.stage(name):
+        yield
+
+
+def _count_arango_requests():
+    # python-arango has no request hook, every client (ours, stix2arango's and
+    # dogesec_commons') sends through DefaultHTTPClient
+    from arango.http import DefaultHTTPClient
+
+    send_request = DefaultHTTPClient.send_request
+    if getattr(send_request, "counts_requests", False):
+        return
+
+    @functools.wraps(send_request)
+    def counted_send_request(self, *args, **kwargs):
+        timer = current_timer()
+        if timer:
+            timer.arango_requests += 1
+        return send_request(self, *args, **kwargs)
+
+    counted_send_request.counts_requests = True
+    DefaultHTTPClient.send_request = counted_send_request
+
+
+_count_arango_requests()
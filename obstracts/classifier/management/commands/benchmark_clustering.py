@@ -0,0 +1,83 @@
+import time
+
+import hdbscan
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sklearn.metrics import adjusted_rand_score, silhouette_score
+
+from obstracts.classifier import tasks
+from obstracts.classifier.models import DocumentEmbedding
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare HDBSCAN fit time and cluster quality on the stored embeddings "
+        "with and without PCA reduction. Nothing is saved."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dimensions",
+            type=int,
+            nargs="+",
+            default=[0, 100, 50, 25],
+            help="Reduction dimensions to compare, 0 clusters the raw embeddings. The first one is the baseline for ARI.",
+        )
+        parser.add_argument(
+            "--min-cluster-size",
+            type=int,
+            default=settings.CLASSIFIER_MIN_CLUSTER_SIZE,
+        )
+        parser.add_argument(
+            "--sample-size",
+            type=int,
+            default=5000,
+            help="Number of embeddings sampled when computing the silhouette score.",
+        )
+
+    def handle(self, *args, **options):
+        qs = DocumentEmbedding.objects.exclude(embedding__isnull=True)
+        X, _, load_metrics = tasks.load_embeddings(qs)
+        if len(X) < 2:
+            self.stdout.write("Not enough embeddings to benchmark.")
+            return
+        self.stdout.write(
+            f"Loaded {len(X)} embeddings in {load_metrics['load_seconds']}s"
+        )
+        self.stdout.write(
+            f"{'dims':>6} {'fit s':>8} {'clusters':>8} {'noise':>6} {'silhouette':>10} {'ARI':>6}"
+        )
+
+        baseline = None
+        for dimensions in options["dimensions"]:
+            started_at = time.monotonic()
+            reducer = tasks.fit_reducer(X, dimensions)
+            clusterer = hdbscan.HDBSCAN(
+                min_cluster_size=options["min_cluster_size"], prediction_data=True
+            )
+            labels = clusterer.fit_predict(tasks.reduce_embeddings(reducer, X))
+            fit_seconds = time.monotonic() - started_at
+            if baseline is None:
+                baseline = labels
+
+            self.stdout.write(
+                f"{dimensions or X.shape[1]:>6} {fit_seconds:>8.2f} "
+                f"{labels.max() + 1:>8} {np.mean(labels == -1):>6.1%} "
+                f"{self._silhouette(X, labels, options['sample_size']):>10} "
+                f"{adjusted_rand_score(baseline, labels):>6.3f}"
+            )
+
+    def _silhouette(self, X, labels, sample_size):
+        """Silhouette of the clustered (non-noise) points, always measured on the raw embeddings."""
+        clustered = labels != -1
+        if len(set(labels[clustered])) < 2:
+            return "n/a"
+        score = silhouette_score(
+            X[clustered],
+            labels[clustered],
+            metric="cosine",
+            sample_size=min(sample_size, int(clustered.sum())),
+            random_state=0,
+        )
+        return f"{score:.3f}"
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.11 on 2026-10-17 10:41
+
+import hashlib
+from django.db import migrations, models
+
+
+def backfill_content_hash(apps, schema_editor):
+    """
+    Existing embeddings were all computed with text-embedding-3-small at 512 dimensions for their current text.
+    """
+    DocumentEmbedding = apps.get_model('classifier', 'DocumentEmbedding')
+    docs = []
+    for doc in DocumentEmbedding.objects.exclude(embedding__isnull=True).only('id', 'text').iterator(chunk_size=2000):
+        doc.content_hash = hashlib.sha256(f"text-embedding-3-small\n512\n{doc.text}".encode()).hexdigest()
+        docs.append(doc)
+    DocumentEmbedding.objects.bulk_update(docs, ['content_hash'], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classifier', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentembedding',
+            name='content_hash',
+            field=models.CharField(db_index=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(
+            code=backfill_content_hash,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
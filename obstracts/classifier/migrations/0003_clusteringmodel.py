@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-17 12:05
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classifier', '0002_documentembedding_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClusteringModel',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('file', models.FileField(max_length=1024, upload_to='classifier/models/')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classifier', '0003_clusteringmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentembedding',
+            name='clustered_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
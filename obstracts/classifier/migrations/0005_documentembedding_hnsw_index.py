@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 13:10
+
+import pgvector.django.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('classifier', '0004_documentembedding_clustered_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentembedding',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='classifier_doc_embedding_hnsw', opclasses=['vector_cosine_ops']),
+        ),
+    ]
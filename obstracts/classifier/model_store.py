@@ -0,0 +1,110 @@
+"""Versioned storage of the fitted clustering model.
+
+Every save writes a new joblib artifact to the default storage backend
+(filesystem or S3/R2) and records it as a ClusteringModel row, so any worker
+can find the current version with a single query. The loaded model is kept in
+memory per process and only read from storage again when a newer version has
+been saved.
+
+Older versions saved the model to the `CLASSIFIER_MODEL_PATH` file, it is
+imported as the first version when no version has been saved yet.
+"""
+
+import io
+import logging
+import os
+import threading
+
+import joblib
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .models import ClusteringModel
+
+
+_lock = threading.Lock()
+_cached: tuple = (None, None)  # (version, payload)
+
+
+def current_version():
+    """Return the pk of the newest saved model, or None if there is none."""
+    version = _newest_version()
+    if version is None and import_legacy_model():
+        version = _newest_version()
+    return version
+
+
+def _newest_version():
+    return (
+        ClusteringModel.objects.order_by("-created_at")
+        .values_list("pk", flat=True)
+        .first()
+    )
+
+
+def has_model() -> bool:
+    return current_version() is not None
+
+
+def import_legacy_model() -> bool:
+    """Save the model file of older versions as a new version, if there is one.
+
+    The file is renamed to `<path>.imported` afterwards, so that it is not
+    imported again when the saved versions are deleted for a full run.
+    """
+    path = settings.CLASSIFIER_MODEL_PATH
+    if not path or not os.path.exists(path):
+        return False
+    artifact = save_model(joblib.load(path))
+    try:
+        os.replace(path, path + ".imported")
+    except OSError as e:
+        logging.warning("could not rename imported clustering model %s: %s", path, e)
+    logging.info("imported clustering model %s as version %s", path, artifact.pk)
+    return True
+
+
+def load_model():
+    """Return the payload of the current model, or None if no model has been saved.
+
+    The payload is read from storage only when this process has not loaded the
+    current version yet.
+    """
+    global _cached
+    version = current_version()
+    if version is None:
+        return None
+    with _lock:
+        cached_version, payload = _cached
+        if cached_version == version:
+            return payload
+        artifact = ClusteringModel.objects.get(pk=version)
+        with artifact.file.open("rb") as f:
+            payload = joblib.load(io.BytesIO(f.read()))
+        _cached = (version, payload)
+        return payload
+
+
+def save_model(payload) -> ClusteringModel:
+    """Store `payload` as the new current version and prune old versions."""
+    global _cached
+    buffer = io.BytesIO()
+    joblib.dump(payload, buffer)
+    artifact = ClusteringModel()
+    artifact.file.save(f"{artifact.pk}.joblib", ContentFile(buffer.getvalue()))
+    with _lock:
+        _cached = (artifact.pk, payload)
+
+    stale = ClusteringModel.objects.order_by("-created_at")[settings.CLASSIFIER_MODEL_KEEP_VERSIONS:]
+    for old in ClusteringModel.objects.filter(pk__in=list(stale.values_list("pk", flat=True))):
+        old.delete()  # django-cleanup removes the artifact from storage
+    return artifact
+
+
+def delete_models():
+    """Remove every saved version, the next clustering run will be a full one."""
+    global _cached
+    for artifact in ClusteringModel.objects.all():
+        artifact.delete()
+    with _lock:
+        _cached = (None, None)
@@ -1,17 +1,64 @@
+import hashlib
 import uuid
 
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
-from pgvector.django import VectorField
+from pgvector.django import HnswIndex, VectorField
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIMENSIONS = 512
+
+# bumped whenever embeddings or clusters change, old similar-posts cache entries then expire unused
+SIMILARITY_CACHE_VERSION_KEY = "similarity-cache-version"
+
+
+def similarity_cache_version() -> str:
+    version = cache.get(SIMILARITY_CACHE_VERSION_KEY)
+    if version is None:
+        version = invalidate_similarity_cache()
+    return version
+
+
+def invalidate_similarity_cache() -> str:
+    version = uuid.uuid4().hex
+    cache.set(SIMILARITY_CACHE_VERSION_KEY, version, timeout=None)
+    return version
 
 
 class DocumentEmbedding(models.Model):
     """Stores text and its embedding."""
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     text = models.TextField()
-    embedding = VectorField(dimensions=512, null=True)
+    embedding = VectorField(dimensions=EMBEDDING_DIMENSIONS, null=True)
+    # hash of the model, dimensions and text the embedding was computed from
+    content_hash = models.CharField(max_length=64, null=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # when the current embedding was last run through the saved clustering model
+    clustered_at = models.DateTimeField(null=True)
+
+    @staticmethod
+    def compute_content_hash(text: str) -> str:
+        key = f"{EMBEDDING_MODEL}\n{EMBEDDING_DIMENSIONS}\n{text}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @property
+    def is_up_to_date(self):
+        return self.embedding is not None and self.content_hash == self.compute_content_hash(self.text)
+
+    class Meta:
+        indexes = [
+            HnswIndex(
+                name="classifier_doc_embedding_hnsw",
+                fields=["embedding"],
+                m=16,
+                ef_construction=64,
+                opclasses=["vector_cosine_ops"],
+            ),
+        ]
 
     def __str__(self):
         return f"Doc {self.pk} ({len(self.text)} chars)"
@@ -30,3 +77,22 @@ class Cluster(models.Model):
 
     def __str__(self):
         return f"Cluster {self.pk}: {self.label or '<unlabeled>'}"
+
+
+class ClusteringModel(models.Model):
+    """A saved version of the fitted clustering model, the newest one is current."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.FileField(upload_to="classifier/models/", max_length=1024)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Clustering model {self.pk} ({self.created_at:%Y-%m-%d %H:%M})"
+
+
+@receiver(post_save, sender=DocumentEmbedding)
+@receiver(post_delete, sender=DocumentEmbedding)
+@receiver(post_save, sender=Cluster)
+@receiver(post_delete, sender=Cluster)
+@receiver(m2m_changed, sender=Cluster.members.through)
+def similarity_inputs_changed(sender, **kwargs):
+    invalidate_similarity_cache()
@@ -1,23 +1,52 @@
+import functools
 import os
+import random
+import time
+import tracemalloc
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any, List
 
 import numpy as np
 import openai
 import hdbscan
-import joblib
+from sklearn.decomposition import PCA
 
 from celery import shared_task
 from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
 
-from .models import DocumentEmbedding, Cluster
+from obstracts.server import metrics
+
+from . import model_store
+from .models import (
+    EMBEDDING_DIMENSIONS,
+    EMBEDDING_MODEL,
+    Cluster,
+    DocumentEmbedding,
+    invalidate_similarity_cache,
+)
+
+
+# rows fetched per round trip when streaming embeddings from the database
+EMBEDDING_LOAD_CHUNK_SIZE = 2000
 
 
 class ClusteringCancelled(Exception):
     pass
 
 
+# errors worth retrying with backoff, anything else fails straight away
+RETRYABLE_OPENAI_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+@functools.cache
 def _openai_client():
+    """Return a process-wide client so all requests share its connection pool."""
     openai.api_key = os.getenv("OPENAI_API_KEY")
     return openai.Client()
 
@@ -27,19 +56,150 @@ def compute_embedding_for_document(doc: DocumentEmbedding):
     if not doc.text:
         raise ValueError("Document text is empty, cannot compute embedding")
 
-    client = _openai_client()
+    failures = compute_embeddings_for_documents([doc])
+    if failures:
+        raise ValueError(failures[doc.pk])
+
+
+def compute_embeddings_for_documents(
+    docs: list[DocumentEmbedding],
+    batch_size: int = settings.CLASSIFIER_EMBEDDING_BATCH_SIZE,
+    max_batch_tokens: int = settings.CLASSIFIER_EMBEDDING_BATCH_MAX_TOKENS,
+) -> dict[Any, str]:
+    """Compute embeddings for many documents using as few requests as possible.
+
+    Documents whose `content_hash` shows their embedding is already up to date
+    are skipped, and a vector already computed for the same text (by any
+    document) is copied instead of requested again. The remaining texts are
+    packed into requests of up to `batch_size` inputs and roughly
+    `max_batch_tokens` tokens. When the provider rejects a request, its inputs
+    are retried one by one so that a single bad document does not fail the
+    whole batch. All computed vectors are written back with one `bulk_update`.
+
+    Returns a mapping of document pk to error message for the documents that
+    could not be embedded.
+    """
+    failures: dict[Any, str] = {}
+    embedded: list[DocumentEmbedding] = []
+
+    # documents waiting for a vector, grouped by content hash
+    pending: dict[str, list[DocumentEmbedding]] = {}
+    for doc in docs:
+        if not doc.text:
+            failures[doc.pk] = "Document text is empty, cannot compute embedding"
+        elif not doc.is_up_to_date:
+            pending.setdefault(doc.compute_content_hash(doc.text), []).append(doc)
+
+    known_vectors = DocumentEmbedding.objects.filter(
+        content_hash__in=list(pending), embedding__isnull=False
+    ).values_list("content_hash", "embedding")
+    for content_hash, vec in known_vectors:
+        for doc in pending.pop(content_hash, []):
+            _set_embedding(doc, vec, content_hash)
+            embedded.append(doc)
+
     try:
-        resp = client.embeddings.create(
-            input=doc.text, model="text-embedding-3-small", dimensions=512
-        )
-        vec = resp.data[0].embedding  # list of floats
-        # store as list of floats; `updated_at` is auto-updated by the model
-        doc.embedding = vec
-        doc.save(update_fields=["embedding", "updated_at"])
-        print(f"Saved embedding for doc {doc.pk}")
+        if pending:
+            _request_embeddings(pending, batch_size, max_batch_tokens, embedded, failures)
     except Exception as e:
-        print(f"Embedding failed for {doc.pk}: {e}")
+        print(f"Embedding failed after {len(embedded)} documents: {e}")
         raise
+    finally:
+        if embedded:
+            DocumentEmbedding.objects.bulk_update(
+                embedded, ["embedding", "content_hash", "updated_at"], batch_size=batch_size
+            )
+            # bulk_update sends no post_save signals
+            invalidate_similarity_cache()
+            print(f"Saved embeddings for {len(embedded)} docs")
+    return failures
+
+
+def _request_embeddings(
+    pending: dict[str, list[DocumentEmbedding]],
+    batch_size: int,
+    max_batch_tokens: int,
+    embedded: list[DocumentEmbedding],
+    failures: dict[Any, str],
+):
+    """Request one vector per distinct text and assign it to every document sharing that text."""
+    client = _openai_client()
+    batches = _pack_embedding_batches(
+        [group[0] for group in pending.values()], batch_size, max_batch_tokens
+    )
+    for batch in batches:
+        try:
+            vectors = _create_embeddings(client, [doc.text for doc in batch])
+        except openai.BadRequestError as e:
+            if len(batch) == 1:
+                failures[batch[0].pk] = str(e)
+                vectors = [None]
+            else:
+                print(f"Embedding batch of {len(batch)} rejected, retrying inputs one by one: {e}")
+                vectors = [_create_single_embedding(client, doc, failures) for doc in batch]
+        for doc, vec in zip(batch, vectors):
+            content_hash = doc.compute_content_hash(doc.text)
+            for same_text_doc in pending[content_hash]:
+                if vec is None:
+                    failures[same_text_doc.pk] = failures[doc.pk]
+                    continue
+                _set_embedding(same_text_doc, vec, content_hash)
+                embedded.append(same_text_doc)
+
+
+def _create_single_embedding(client, doc: DocumentEmbedding, failures: dict[Any, str]):
+    try:
+        return _create_embeddings(client, [doc.text])[0]
+    except openai.BadRequestError as e:
+        failures[doc.pk] = str(e)
+        return None
+
+
+def _set_embedding(doc: DocumentEmbedding, vec, content_hash: str):
+    doc.embedding = vec
+    doc.content_hash = content_hash
+    # `updated_at` is not auto-updated by bulk_update
+    doc.updated_at = timezone.now()
+
+
+def _estimate_tokens(text: str) -> int:
+    # deliberately pessimistic, english text averages ~4 characters per token
+    return len(text) // 3 + 1
+
+
+def _pack_embedding_batches(docs: list[DocumentEmbedding], batch_size: int, max_batch_tokens: int):
+    batch, batch_tokens = [], 0
+    for doc in docs:
+        tokens = _estimate_tokens(doc.text)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_batch_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(doc)
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def _create_embeddings(client, texts: list[str], max_retries: int = settings.CLASSIFIER_EMBEDDING_MAX_RETRIES):
+    """Embed `texts` in one request, retrying transient errors with exponential backoff."""
+    with metrics.embedding_request_seconds.time():
+        for attempt in range(max_retries + 1):
+            try:
+                resp = client.embeddings.create(
+                    input=texts, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS
+                )
+                break
+            except RETRYABLE_OPENAI_ERRORS as e:
+                if attempt >= max_retries:
+                    raise
+                delay = min(2**attempt, 60) + random.random()
+                print(f"Embedding request failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    vectors = [item.embedding for item in resp.data]
+    if len(vectors) != len(texts):
+        raise ValueError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+    return vectors
 
 
 def create_embedding_text(*texts: List[str]) -> str:
@@ -57,28 +217,100 @@ def run_clustering(
 ):
     """Cluster all documents with embeddings, create clusters, and label them.
 
-    Full run (no saved model): fits HDBSCAN on all embeddings, saves the model
-    and label→cluster-UUID mapping to joblib, then recreates all clusters in DB.
+    Full run (no saved model): fits HDBSCAN on all embeddings, first reduced
+    with PCA when CLASSIFIER_REDUCTION_DIMENSIONS is set, saves the model, the
+    reducer and label→cluster-UUID mapping as a new version in the model
+    store, then recreates all clusters in DB.
 
     Incremental run (model already saved): loads the model, runs
     approximate_predict on only the new embeddings (updated since the last
-    cluster was created), and adds those embeddings to the appropriate existing
-    Cluster objects without touching existing labels or IDs.
-    """
-    model_path = settings.CLASSIFIER_MODEL_PATH
+    cluster was created) after applying the saved reducer, and adds those
+    embeddings to the appropriate existing Cluster objects without touching
+    existing labels or IDs.
 
-    full_run = force or not os.path.exists(model_path)
+    Returns a dict of metrics about the run, e.g. how long loading the
+    embeddings took and how much memory it used.
+    """
+    full_run = force or not model_store.has_model()
 
     if should_cancel and should_cancel():
         raise ClusteringCancelled("clustering cancelled before start")
 
-    if full_run:
-        _run_full_clustering(model_path, min_cluster_size, workers, should_cancel)
-    else:
-        _run_incremental_clustering(model_path, workers, should_cancel)
+    with metrics.clustering_seconds.labels("full" if full_run else "incremental").time():
+        if full_run:
+            return _run_full_clustering(min_cluster_size, workers, should_cancel)
+        else:
+            return _run_incremental_clustering(workers, should_cancel)
 
 
-def _run_full_clustering(model_path: str, min_cluster_size: int, workers: int, should_cancel=None):
+def load_embeddings(qs) -> tuple[np.ndarray, np.ndarray, dict]:
+    """Stream the embeddings in `qs` into a single preallocated float32 matrix.
+
+    Rows are read through a server-side cursor in chunks and copied straight
+    into the matrix, so no model instance or intermediate list is kept per row.
+    Returns the matrix, a parallel array of document ids and load metrics.
+    """
+    started_at = time.monotonic()
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    count = qs.count()
+    X = np.empty((count, EMBEDDING_DIMENSIONS), dtype=np.float32)
+    ids = np.empty(count, dtype=object)
+    n = 0
+    rows = qs.order_by("pk").values_list("pk", "embedding").iterator(
+        chunk_size=EMBEDDING_LOAD_CHUNK_SIZE
+    )
+    for pk, vec in rows:
+        if n == count:
+            # rows added after counting are left for the next run
+            break
+        X[n] = vec
+        ids[n] = pk
+        n += 1
+
+    _, peak_memory = tracemalloc.get_traced_memory()
+    if not was_tracing:
+        tracemalloc.stop()
+    metrics = dict(
+        documents=n,
+        load_seconds=round(time.monotonic() - started_at, 3),
+        load_peak_memory_bytes=peak_memory,
+        matrix_bytes=X[:n].nbytes,
+    )
+    print(
+        f"Loaded {n} embeddings in {metrics['load_seconds']}s, "
+        f"peak memory {peak_memory / 2**20:.1f} MiB"
+    )
+    return X[:n], ids[:n], metrics
+
+
+def fit_reducer(X: np.ndarray, dimensions: int):
+    """Fit a PCA that projects `X` down to `dimensions`.
+
+    Returns None when reduction is disabled or would not reduce anything.
+    """
+    n_components = min(dimensions or 0, *X.shape)
+    if n_components <= 0 or n_components >= X.shape[1]:
+        return None
+    return PCA(n_components=n_components, random_state=0).fit(X)
+
+
+def reduce_embeddings(reducer, X: np.ndarray) -> np.ndarray:
+    """Apply a reducer from `fit_reducer`, `None` leaves `X` unchanged."""
+    if reducer is None:
+        return X
+    return reducer.transform(X).astype(np.float32, copy=False)
+
+
+def _run_full_clustering(
+    min_cluster_size: int,
+    workers: int,
+    should_cancel=None,
+    reduction_dimensions: int = settings.CLASSIFIER_REDUCTION_DIMENSIONS,
+):
     """Fit HDBSCAN on all embeddings, persist model, recreate clusters."""
     qs = DocumentEmbedding.objects.exclude(embedding__isnull=True)
     count = qs.count()
@@ -86,24 +318,25 @@ def _run_full_clustering(model_path: str, min_cluster_size: int, workers: int, s
 
     if count == 0:
         print("No embeddings available for clustering — skipping.")
-        return
+        return dict(mode="full", documents=0)
 
     if should_cancel and should_cancel():
         raise ClusteringCancelled("clustering cancelled before fit")
 
-    vecs = []
-    ids = []
-    for d in qs:
-        vecs.append(np.array(d.embedding, dtype=float))
-        ids.append(d.pk)
-
-    X = np.vstack(vecs)
+    X, ids, metrics = load_embeddings(qs)
+    started_at = time.monotonic()
     try:
+        reducer = fit_reducer(X, reduction_dimensions)
+        X = reduce_embeddings(reducer, X)
         clusterer = hdbscan.HDBSCAN(min_cluster_size=min_cluster_size, prediction_data=True)
         labels = clusterer.fit_predict(X)
     except Exception as e:
         print(f"HDBSCAN failed: {e}")
         raise
+    metrics.update(
+        fit_seconds=round(time.monotonic() - started_at, 3),
+        dimensions=X.shape[1],
+    )
 
     label_to_members: dict[int, list] = {}
     for doc_id, label in zip(ids, labels):
@@ -125,15 +358,15 @@ def _run_full_clustering(model_path: str, min_cluster_size: int, workers: int, s
     _label_clusters(clusters, workers, should_cancel)
 
     # Persist the fitted model and label→UUID map
-    joblib.dump(
-        {"clusterer": clusterer, "label_to_cluster_id": label_to_cluster_id},
-        model_path,
+    artifact = model_store.save_model(
+        {"clusterer": clusterer, "reducer": reducer, "label_to_cluster_id": label_to_cluster_id},
     )
-    print(f"Saved clusterer to {model_path}")
+    print(f"Saved clusterer as version {artifact.pk}")
 
     # Remove old clusters now that the new ones are fully set up
     Cluster.objects.filter(pk__in=old_cluster_ids).delete()
     print(f"Full clustering complete: {len(label_to_members)} clusters created")
+    return dict(mode="full", clusters=len(label_to_members), **metrics)
 
 def _label_clusters(clusters: list[Cluster], workers: int, should_cancel=None):
     with ThreadPoolExecutor(max_workers=workers) as executor:
@@ -162,53 +395,52 @@ def new_cluster(member_ids: list) -> Cluster:
     cluster.members.add(*DocumentEmbedding.objects.filter(pk__in=member_ids))
     return cluster
 
-def _run_incremental_clustering(model_path: str, workers: int, should_cancel=None):
+def _run_incremental_clustering(workers: int, should_cancel=None):
     """Assign new embeddings to existing clusters using approximate_predict."""
     last_cluster = Cluster.objects.order_by("-created_at").first()
 
     new_qs = DocumentEmbedding.objects.exclude(embedding__isnull=True)
     if last_cluster is not None:
         new_qs = new_qs.filter(updated_at__gt=last_cluster.created_at)
+    # skip embeddings already assigned by assign_to_cluster since their last update
+    new_qs = new_qs.exclude(clustered_at__gte=F("updated_at"))
 
     new_count = new_qs.count()
     print(f"Incremental clustering: {new_count} new embeddings since last run")
 
     if new_count == 0:
         print("No new embeddings — skipping incremental update.")
-        return
+        return dict(mode="incremental", documents=0)
 
     if should_cancel and should_cancel():
         raise ClusteringCancelled("clustering cancelled before incremental predict")
 
-    saved = joblib.load(model_path)
+    saved = model_store.load_model()
     clusterer: hdbscan.HDBSCAN = saved["clusterer"]
-    label_to_cluster_id: dict[int, str] = saved["label_to_cluster_id"]
-
-    vecs = []
-    docs = []
-    for d in new_qs:
-        vecs.append(np.array(d.embedding, dtype=float))
-        docs.append(d)
+    # copied so the cached model is not changed unless the new version is saved
+    label_to_cluster_id: dict[int, str] = dict(saved["label_to_cluster_id"])
+    reducer = saved.get("reducer")
 
-    X_new = np.vstack(vecs)
+    X_new, ids, metrics = load_embeddings(new_qs)
     try:
+        X_new = reduce_embeddings(reducer, X_new)
         labels, _ = hdbscan.approximate_predict(clusterer, X_new)
     except Exception as e:
         print(f"approximate_predict failed: {e}")
         raise
 
     label_to_new_members: dict[int, list] = {}
-    for doc, label in zip(docs, labels):
+    for doc_id, label in zip(ids, labels):
         if label == -1:
             continue
-        label_to_new_members.setdefault(int(label), []).append(doc)
+        label_to_new_members.setdefault(int(label), []).append(doc_id)
 
     updated = False
     new_clusters = []
     for label, new_docs in label_to_new_members.items():
         cluster_id = label_to_cluster_id.get(label)
         if cluster_id is None:
-            cluster = new_cluster([d.pk for d in new_docs])
+            cluster = new_cluster(new_docs)
             label_to_cluster_id[label] = str(cluster.pk)
             updated = True
             new_clusters.append(cluster)
@@ -221,14 +453,51 @@ def _run_incremental_clustering(model_path: str, workers: int, should_cancel=Non
     if new_clusters:
             _label_clusters(new_clusters, workers=workers, should_cancel=should_cancel)
 
+    DocumentEmbedding.objects.filter(pk__in=list(ids)).update(clustered_at=timezone.now())
+
     if updated:
-        joblib.dump(
-            {"clusterer": clusterer, "label_to_cluster_id": label_to_cluster_id},
-            model_path,
+        artifact = model_store.save_model(
+            {"clusterer": clusterer, "reducer": reducer, "label_to_cluster_id": label_to_cluster_id},
         )
-        print(f"Updated model saved to {model_path}")
+        print(f"Updated model saved as version {artifact.pk}")
 
     print(f"Incremental clustering complete: updated {len(label_to_new_members)} clusters")
+    return dict(mode="incremental", clusters=len(label_to_new_members), **metrics)
+
+
+def assign_to_cluster(doc: DocumentEmbedding) -> Cluster | None:
+    """Add a single freshly embedded document to its cluster in the current model.
+
+    Uses approximate_predict against the cached model, so a post joins its
+    topic as soon as it is embedded. Returns the cluster, or None when there is
+    no model yet, the document is noise or its label has no cluster; the next
+    incremental run handles the latter.
+    """
+    if doc.embedding is None:
+        return None
+    if doc.clustered_at and doc.updated_at and doc.clustered_at >= doc.updated_at:
+        return None
+
+    saved = model_store.load_model()
+    if saved is None:
+        return None
+
+    X = np.asarray([doc.embedding], dtype=np.float32)
+    labels, _ = hdbscan.approximate_predict(
+        saved["clusterer"], reduce_embeddings(saved.get("reducer"), X)
+    )
+    label = int(labels[0])
+    cluster = None
+    if label != -1:
+        cluster_id = saved["label_to_cluster_id"].get(label)
+        cluster = Cluster.objects.filter(pk=cluster_id).first() if cluster_id else None
+        if cluster is None:
+            return None
+        cluster.members.add(doc)
+
+    doc.clustered_at = timezone.now()
+    DocumentEmbedding.objects.filter(pk=doc.pk).update(clustered_at=doc.clustered_at)
+    return cluster
 
 
 def _label_cluster(sample_texts: List[str]) -> dict:
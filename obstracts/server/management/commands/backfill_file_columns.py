@@ -0,0 +1,54 @@
+# this script copies the txt2stix_data fields posts are filtered and sorted on into their File columns
+# python manage.py backfill_file_columns --help
+
+from django.core.management.base import BaseCommand
+from django.db import models
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast
+
+from obstracts.server import models as ob_models
+
+
+class Command(BaseCommand):
+    help = """
+    Copy `txt2stix_data.content_check.threat_score` into the `ai_threat_score` column of posts.
+    `File.set_txt2stix_data()` keeps it up to date, this is for posts whose txt2stix_data was written any other way.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--feed_id",
+            help="Only run for posts under these feed_ids",
+            nargs="+",
+            default=None,
+        )
+        parser.add_argument("--post_id", help="Only run for these post_ids", nargs="+")
+        parser.add_argument(
+            "--batch-size",
+            dest="batch_size",
+            type=int,
+            default=5000,
+            help="Number of posts updated per query",
+        )
+        parser.add_argument("--force", help="Also update posts that already have an ai_threat_score", action="store_true")
+
+    def handle(self, *args, **options):
+        threat_score = KT("txt2stix_data__content_check__threat_score")
+        qs = ob_models.File.objects.alias(threat_score=threat_score).filter(threat_score__isnull=False)
+        if options["feed_id"]:
+            qs = qs.filter(feed_id__in=options["feed_id"])
+        if options["post_id"]:
+            qs = qs.filter(post_id__in=options["post_id"])
+        if not options["force"]:
+            qs = qs.filter(ai_threat_score__isnull=True)
+
+        post_ids = list(qs.order_by("post_id").values_list("post_id", flat=True))
+        self.stdout.write(f"Found {len(post_ids)} posts to update")
+        updated = 0
+        for i in range(0, len(post_ids), options["batch_size"]):
+            batch = post_ids[i : i + options["batch_size"]]
+            updated += ob_models.File.objects.filter(post_id__in=batch).update(
+                ai_threat_score=Cast(threat_score, models.IntegerField())
+            )
+            self.stdout.write(f"Updated {updated}/{len(post_ids)} posts")
+        self.stdout.write(self.style.SUCCESS(f"Done. updated={updated}"))
@@ -1,9 +1,7 @@
-import os
-
 from django.core.management.base import BaseCommand
-from django.conf import settings
 
 from obstracts.cjob import tasks as cjob_tasks
+from obstracts.classifier import model_store
 from obstracts.server import models
 import uuid
 
@@ -33,10 +31,8 @@ class Command(BaseCommand):
         workers = options["workers"]
 
         if force:
-            model_path = settings.CLASSIFIER_MODEL_PATH
-            if os.path.exists(model_path):
-                os.remove(model_path)
-                self.stdout.write(f"Removed existing model: {model_path}")
+            model_store.delete_models()
+            self.stdout.write("Removed existing clustering models")
 
         self.stdout.write("Running clustering once...")
         job = models.Job.objects.create(
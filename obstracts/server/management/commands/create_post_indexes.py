@@ -0,0 +1,34 @@
+# this script creates the persistent post id indexes on collections of feeds created before they were added
+# python manage.py create_post_indexes --help
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from obstracts.server import models
+from dogesec_commons.objects.helpers import ArangoDBHelper
+
+
+class Command(BaseCommand):
+    help = "Create the persistent _obstracts_post_id and _stixify_report_id indexes in every feed's ArangoDB collections."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--feed_id",
+            help="Only run for these feed_ids",
+            nargs="+",
+            default=None,
+        )
+
+    def handle(self, *args, **options):
+        feeds = models.FeedProfile.objects.all()
+        if options["feed_id"]:
+            feeds = feeds.filter(pk__in=options["feed_id"])
+
+        db = ArangoDBHelper(settings.VIEW_NAME, None).db
+        for feed in feeds:
+            if not db.has_collection(feed.vertex_collection):
+                self.stdout.write(self.style.WARNING(f"Skipping feed {feed.id}: no collections"))
+                continue
+            models.create_post_indexes(db, feed)
+            self.stdout.write(f"Indexed collections of feed {feed.id}")
+        self.stdout.write(self.style.SUCCESS("Done."))
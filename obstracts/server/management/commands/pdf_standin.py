@@ -0,0 +1,99 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+PDF_BYTES = b"""%PDF-1.4
+1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj
+2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj
+3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >> endobj
+trailer << /Root 1 0 R >>
+%%EOF
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve a stand-in for the PDFShift convert API, to load test PDF generation. "
+        "Point PDFSHIFT_API_URL at http://<host>:<port>/v3/convert/pdf."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="0.0.0.0")
+        parser.add_argument("--port", type=int, default=8090)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=1.0,
+            help="Seconds each conversion takes. Defaults to 1.",
+        )
+        parser.add_argument(
+            "--rate-limit",
+            type=int,
+            default=0,
+            help="Answer 429 to conversions above this many per minute, like PDFShift does. Defaults to no limit.",
+        )
+        parser.add_argument(
+            "--error-rate",
+            type=float,
+            default=0.0,
+            help="Fraction of conversions that fail with a 500. Defaults to 0.",
+        )
+
+    def handle(self, *args, **options):
+        stats = dict(converted=0, rate_limited=0, failed=0)
+        started = []
+        lock = threading.Lock()
+        command = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    source = json.loads(body or b"{}").get("source")
+                except ValueError:
+                    source = None
+                if not source:
+                    return self.reply(400, b'{"error": "source is required"}')
+
+                with lock:
+                    now = time.monotonic()
+                    started[:] = [t for t in started if t > now - 60]
+                    if options["rate_limit"] and len(started) >= options["rate_limit"]:
+                        stats["rate_limited"] += 1
+                        retry_after = int(started[0] + 60 - now) + 1
+                        return self.reply(429, b'{"error": "rate limited"}', {"Retry-After": str(retry_after)})
+                    started.append(now)
+
+                time.sleep(options["latency"])
+                if random.random() < options["error_rate"]:
+                    stats["failed"] += 1
+                    return self.reply(500, b'{"error": "conversion failed"}')
+                stats["converted"] += 1
+                self.reply(200, PDF_BYTES, {"Content-Type": "application/pdf"})
+
+            def reply(self, status, body, headers=None):
+                self.send_response(status)
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                command.stdout.write(f"{format % args} {stats}")
+
+        server = ThreadingHTTPServer((options["host"], options["port"]), Handler)
+        self.stdout.write(
+            self.style.SUCCESS(f"PDFShift stand-in listening on http://{options['host']}:{options['port']}/v3/convert/pdf")
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"{stats}")
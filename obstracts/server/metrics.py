@@ -0,0 +1,213 @@
+"""
+Prometheus metrics.
+
+Counters and histograms are recorded by whichever process does the work (API
+workers, celery workers). When `PROMETHEUS_MULTIPROC_DIR` is set, every
+process of a container writes its samples there and they are added up when
+scraped: `/api/metrics/` for the API and, for celery, the exporter that each
+worker starts on `CELERY_METRICS_PORT`.
+
+Job, feed lock and cache gauges are read from the database and redis when the
+API endpoint is scraped, so they are only exported once whatever the number
+of processes.
+"""
+
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils import timezone
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+LONG_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 3600, float("inf"))
+
+posts_processed = Counter(
+    "obstracts_posts_processed",
+    "Posts processed by extraction jobs",
+    ["feed_id", "profile_id", "status"],
+)
+post_processing_seconds = Histogram(
+    "obstracts_post_processing_seconds",
+    "Seconds spent processing a post, per stage (`total` for the whole post)",
+    ["stage"],
+    buckets=LONG_BUCKETS,
+)
+feed_lock_wait_seconds = Histogram(
+    "obstracts_feed_lock_wait_seconds",
+    "Seconds jobs waited for their feed's processing lock",
+    buckets=LONG_BUCKETS,
+)
+embedding_request_seconds = Histogram(
+    "obstracts_embedding_request_seconds",
+    "Seconds taken by embedding requests, including retries",
+)
+clustering_seconds = Histogram(
+    "obstracts_clustering_seconds",
+    "Seconds taken by topic clustering runs",
+    ["mode"],
+    buckets=LONG_BUCKETS,
+)
+object_values_ingested = Counter(
+    "obstracts_object_values_ingested",
+    "ObjectValue rows written from uploaded objects",
+    ["result"],
+)
+http_request_seconds = Histogram(
+    "obstracts_http_request_seconds",
+    "API request latency",
+    ["view", "method", "status"],
+)
+
+
+def _multiprocess_registry():
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def _registry():
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = _multiprocess_registry()
+    else:
+        registry = CollectorRegistry()
+        registry.register(_ProcessCollector())
+    registry.register(StateCollector())
+    return registry
+
+
+class _ProcessCollector:
+    # samples of this process only, without the default registry's own
+    # copy of StateCollector's gauges
+    def collect(self):
+        return REGISTRY.collect()
+
+
+class StateCollector:
+    """Gauges computed from the current state of jobs, feed locks, queues and caches."""
+
+    ACTIVE_JOB_STATES = ["retrieving", "queued", "processing", "cancelling"]
+
+    def collect(self):
+        for collect in [self._jobs, self._feed_locks, self._celery_queues, self._statistics_cache]:
+            try:
+                yield from collect()
+            except Exception:
+                logging.exception("could not collect %s metrics", collect.__name__)
+
+    def _jobs(self):
+        from django.db.models import Count, Min
+
+        from obstracts.server.models import Job
+
+        jobs = GaugeMetricFamily("obstracts_jobs", "Jobs not finished yet", labels=["state", "type"])
+        oldest = GaugeMetricFamily(
+            "obstracts_job_oldest_age_seconds",
+            "Age of the oldest job not finished yet",
+            labels=["state"],
+        )
+        now = timezone.now()
+        rows = (
+            Job.objects.filter(state__in=self.ACTIVE_JOB_STATES)
+            .values("state", "type")
+            .annotate(count=Count("pk"), oldest=Min("created"))
+        )
+        oldest_by_state = {}
+        for row in rows:
+            jobs.add_metric([row["state"], row["type"]], row["count"])
+            oldest_by_state[row["state"]] = min(row["oldest"], oldest_by_state.get(row["state"], now))
+        for state, created in oldest_by_state.items():
+            oldest.add_metric([state], (now - created).total_seconds())
+        yield jobs
+        yield oldest
+
+    def _feed_locks(self):
+        from django.db.models import Min
+
+        from obstracts.server.models import FeedLock
+
+        waiting = FeedLock.objects.filter(acquired_at__isnull=True)
+        yield GaugeMetricFamily(
+            "obstracts_feed_lock_waiting_jobs",
+            "Jobs waiting for their feed's processing lock",
+            value=waiting.count(),
+        )
+        longest = waiting.aggregate(created=Min("created"))["created"]
+        yield GaugeMetricFamily(
+            "obstracts_feed_lock_longest_wait_seconds",
+            "Seconds the longest waiting job has been waiting for its feed lock",
+            value=(timezone.now() - longest).total_seconds() if longest else 0,
+        )
+
+    def _celery_queues(self):
+        from obstracts.cjob import queues
+        from obstracts.cjob.celery import app
+
+        depth = GaugeMetricFamily(
+            "obstracts_celery_queue_length",
+            "Messages waiting in each celery queue",
+            labels=["queue"],
+        )
+        with app.connection_for_read() as conn:
+            channel = conn.default_channel
+            for queue in queues.ALL:
+                try:
+                    _, message_count, _ = channel.queue_declare(queue, passive=True)
+                except Exception:
+                    # the queue does not exist until a task is sent to it
+                    message_count = 0
+                depth.add_metric([queue], message_count)
+        yield depth
+
+    def _statistics_cache(self):
+        from django.core.cache import cache
+
+        from obstracts.server.statistics import CACHE_KEY
+
+        data = cache.get(CACHE_KEY)
+        if data:
+            yield GaugeMetricFamily(
+                "obstracts_statistics_cache_age_seconds",
+                "Age of the cached statistics data",
+                value=time.time() - data["time"],
+            )
+
+
+def metrics_view(request):
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+class RequestLatencyMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started_at = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        if view != "metrics":
+            http_request_seconds.labels(view, request.method, response.status_code).observe(
+                time.perf_counter() - started_at
+            )
+        return response
+
+
+def start_celery_exporter():
+    """Serve this celery worker's metrics (all its pool processes) on `CELERY_METRICS_PORT`."""
+    if not settings.CELERY_METRICS_PORT:
+        return
+    registry = _multiprocess_registry() if os.getenv("PROMETHEUS_MULTIPROC_DIR") else REGISTRY
+    start_http_server(settings.CELERY_METRICS_PORT, registry=registry)
+    logging.info("serving celery metrics on port %d", settings.CELERY_METRICS_PORT)
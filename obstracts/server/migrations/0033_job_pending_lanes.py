@@ -0,0 +1,18 @@
+# Generated by Django 5.2.11 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('obstracts', '0032_file_obstracts_file_feed_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='pending_lanes',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
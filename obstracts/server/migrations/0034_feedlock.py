@@ -0,0 +1,30 @@
+# Generated by Django 5.2.11 on 2026-10-17 11:40
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('obstracts', '0033_job_pending_lanes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedLock',
+            fields=[
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='feed_lock', serialize=False, to='obstracts.job')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('acquired_at', models.DateTimeField(default=None, null=True)),
+                ('lease_expires_at', models.DateTimeField(default=None, null=True)),
+                ('continuation', models.JSONField(default=None, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('feed', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='locks', to='obstracts.feedprofile')),
+            ],
+            options={
+                'ordering': ['created'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('acquired_at__isnull', False)), fields=('feed',), name='obstracts_feedlock_one_holder')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.11 on 2026-10-17 15:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dogesec_stixifier', '0001_initial'),
+        ('obstracts', '0035_job_checkpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostProcessingMetrics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.UUIDField()),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('succeeded', models.BooleanField()),
+                ('total_seconds', models.FloatField()),
+                ('stages', models.JSONField(default=dict)),
+                ('db_queries', models.IntegerField(default=0)),
+                ('arango_requests', models.IntegerField(default=0)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_metrics', to='obstracts.job')),
+                ('profile', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='dogesec_stixifier.profile')),
+            ],
+        ),
+    ]
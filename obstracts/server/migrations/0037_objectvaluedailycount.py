@@ -0,0 +1,172 @@
+# Generated by Django 5.2.11 on 2026-10-17 16:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('obstracts', '0036_postprocessingmetrics'),
+        ('history4feed', '0012_post_h4f_feed_pk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectValueDailyCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('knowledgebase', models.CharField(max_length=64)),
+                ('stix_id', models.CharField(max_length=256)),
+                ('post_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('post_count__lte', 0)), fields=['post_count'], name='obstracts_ovdc_empty_idx')],
+                'constraints': [models.UniqueConstraint(fields=('knowledgebase', 'day', 'stix_id'), name='obstracts_ovdc_kb_day_stix_id')],
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+            -- adds `deltas` posts to the (day, knowledgebase, stix_id) of each
+            -- object value, the day being its post's pubdate, hidden posts don't count
+            CREATE OR REPLACE FUNCTION obstracts_ovdc_add(
+                file_ids uuid[], knowledgebases text[], stix_ids text[], deltas integer[]
+            )
+            RETURNS void
+            LANGUAGE sql
+            AS $$
+                INSERT INTO obstracts_objectvaluedailycount AS c (day, knowledgebase, stix_id, post_count)
+                SELECT (p.pubdate AT TIME ZONE 'UTC')::date, ch.knowledgebase, ch.stix_id, SUM(ch.delta)
+                FROM unnest(file_ids, knowledgebases, stix_ids, deltas) AS ch(file_id, knowledgebase, stix_id, delta)
+                JOIN history4feed_post p ON p.id = ch.file_id
+                WHERE ch.knowledgebase IS NOT NULL AND NOT p.deleted_manually
+                GROUP BY 1, 2, 3
+                HAVING SUM(ch.delta) <> 0
+                -- same lock order in every transaction, so concurrent uploads don't deadlock
+                ORDER BY 1, 2, 3
+                ON CONFLICT (knowledgebase, day, stix_id) DO UPDATE
+                SET post_count = c.post_count + EXCLUDED.post_count;
+
+                DELETE FROM obstracts_objectvaluedailycount WHERE post_count <= 0;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_ovdc_objectvalue_inserted()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_ovdc_add(
+                    array_agg(file_id), array_agg(knowledgebase::text), array_agg(stix_id::text), array_agg(1)
+                ) FROM new_rows;
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_ovdc_objectvalue_deleted()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_ovdc_add(
+                    array_agg(file_id), array_agg(knowledgebase::text), array_agg(stix_id::text), array_agg(-1)
+                ) FROM old_rows;
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_ovdc_objectvalue_updated()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                -- most updates (values, is_dupe) don't move the row to another count
+                PERFORM obstracts_ovdc_add(
+                    array_agg(ch.file_id), array_agg(ch.knowledgebase), array_agg(ch.stix_id), array_agg(ch.delta)
+                )
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                CROSS JOIN LATERAL (
+                    VALUES (o.file_id, o.knowledgebase::text, o.stix_id::text, -1),
+                           (n.file_id, n.knowledgebase::text, n.stix_id::text, 1)
+                ) AS ch(file_id, knowledgebase, stix_id, delta)
+                WHERE (o.file_id, o.knowledgebase, o.stix_id) IS DISTINCT FROM (n.file_id, n.knowledgebase, n.stix_id);
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_ovdc_post_updated()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                IF NOT OLD.deleted_manually THEN
+                    UPDATE obstracts_objectvaluedailycount c
+                    SET post_count = c.post_count - ov.posts
+                    FROM (
+                        SELECT knowledgebase, stix_id, count(*) AS posts
+                        FROM obstracts_objectvalue
+                        WHERE file_id = OLD.id AND knowledgebase IS NOT NULL
+                        GROUP BY 1, 2
+                    ) ov
+                    WHERE c.day = (OLD.pubdate AT TIME ZONE 'UTC')::date
+                    AND c.knowledgebase = ov.knowledgebase
+                    AND c.stix_id = ov.stix_id;
+                    DELETE FROM obstracts_objectvaluedailycount WHERE post_count <= 0;
+                END IF;
+                IF NOT NEW.deleted_manually THEN
+                    PERFORM obstracts_ovdc_add(
+                        array_agg(file_id), array_agg(knowledgebase::text), array_agg(stix_id::text), array_agg(1)
+                    ) FROM obstracts_objectvalue WHERE file_id = NEW.id;
+                END IF;
+                RETURN NULL;
+            END;
+            $$;
+
+            DROP TRIGGER IF EXISTS obstracts_ovdc_insert_trigger ON obstracts_objectvalue;
+            CREATE TRIGGER obstracts_ovdc_insert_trigger
+            AFTER INSERT ON obstracts_objectvalue
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION obstracts_ovdc_objectvalue_inserted();
+
+            DROP TRIGGER IF EXISTS obstracts_ovdc_delete_trigger ON obstracts_objectvalue;
+            CREATE TRIGGER obstracts_ovdc_delete_trigger
+            AFTER DELETE ON obstracts_objectvalue
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION obstracts_ovdc_objectvalue_deleted();
+
+            DROP TRIGGER IF EXISTS obstracts_ovdc_update_trigger ON obstracts_objectvalue;
+            CREATE TRIGGER obstracts_ovdc_update_trigger
+            AFTER UPDATE ON obstracts_objectvalue
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION obstracts_ovdc_objectvalue_updated();
+
+            DROP TRIGGER IF EXISTS obstracts_ovdc_post_trigger ON history4feed_post;
+            CREATE TRIGGER obstracts_ovdc_post_trigger
+            AFTER UPDATE OF pubdate, deleted_manually ON history4feed_post
+            FOR EACH ROW
+            WHEN (OLD.pubdate IS DISTINCT FROM NEW.pubdate OR OLD.deleted_manually IS DISTINCT FROM NEW.deleted_manually)
+            EXECUTE FUNCTION obstracts_ovdc_post_updated();
+
+            INSERT INTO obstracts_objectvaluedailycount (day, knowledgebase, stix_id, post_count)
+            SELECT (p.pubdate AT TIME ZONE 'UTC')::date, ov.knowledgebase, ov.stix_id, count(*)
+            FROM obstracts_objectvalue ov
+            JOIN history4feed_post p ON p.id = ov.file_id
+            WHERE ov.knowledgebase IS NOT NULL AND NOT p.deleted_manually
+            GROUP BY 1, 2, 3;
+            """,
+            reverse_sql="""
+            DROP TRIGGER IF EXISTS obstracts_ovdc_insert_trigger ON obstracts_objectvalue;
+            DROP TRIGGER IF EXISTS obstracts_ovdc_delete_trigger ON obstracts_objectvalue;
+            DROP TRIGGER IF EXISTS obstracts_ovdc_update_trigger ON obstracts_objectvalue;
+            DROP TRIGGER IF EXISTS obstracts_ovdc_post_trigger ON history4feed_post;
+            DROP FUNCTION IF EXISTS obstracts_ovdc_objectvalue_inserted();
+            DROP FUNCTION IF EXISTS obstracts_ovdc_objectvalue_deleted();
+            DROP FUNCTION IF EXISTS obstracts_ovdc_objectvalue_updated();
+            DROP FUNCTION IF EXISTS obstracts_ovdc_post_updated();
+            DROP FUNCTION IF EXISTS obstracts_ovdc_add(uuid[], text[], text[], integer[]);
+            """,
+        ),
+    ]
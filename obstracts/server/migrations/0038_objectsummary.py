@@ -0,0 +1,280 @@
+# Generated by Django 5.2.11 on 2026-10-17 17:25
+
+import django.contrib.postgres.fields
+import django.db.models.fields.json
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+SUMMARY_SELECT = """
+    WITH seen AS (
+        SELECT ov.stix_id,
+            count(*) AS post_count,
+            count(DISTINCT f.feed_id) AS feed_count,
+            min(p.pubdate) AS first_seen,
+            max(p.pubdate) AS last_seen
+        FROM obstracts_objectvalue ov
+        JOIN obstracts_file f ON f.post_id = ov.file_id
+        JOIN history4feed_post p ON p.id = ov.file_id
+        WHERE {where}
+        GROUP BY ov.stix_id
+    ),
+    canonical AS (
+        SELECT DISTINCT ON (ov.stix_id) ov.stix_id, ov.type, ov.knowledgebase, ov."values", ov.created, ov.modified
+        FROM obstracts_objectvalue ov
+        JOIN history4feed_post p ON p.id = ov.file_id
+        WHERE {where}
+        ORDER BY ov.stix_id, p.pubdate DESC NULLS LAST, ov.id DESC
+    )
+    SELECT c.stix_id, c.type, c.knowledgebase, c."values", c.created, c.modified,
+        s.first_seen, s.last_seen, s.post_count, s.feed_count
+    FROM canonical c
+    JOIN seen s ON s.stix_id = c.stix_id
+"""
+
+SUMMARY_COLUMNS = 'stix_id, type, knowledgebase, "values", created, modified, first_seen, last_seen, post_count, feed_count'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('obstracts', '0037_objectvaluedailycount'),
+        ('history4feed', '0012_post_h4f_feed_pk'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectSummary',
+            fields=[
+                ('stix_id', models.CharField(max_length=256, primary_key=True, serialize=False)),
+                ('type', models.CharField(max_length=256)),
+                ('knowledgebase', models.CharField(blank=True, max_length=64, null=True)),
+                ('values', models.JSONField()),
+                ('created', models.DateTimeField(default=None, null=True)),
+                ('modified', models.DateTimeField(default=None, null=True)),
+                ('first_seen', models.DateTimeField(null=True)),
+                ('last_seen', models.DateTimeField(null=True)),
+                ('post_count', models.IntegerField(default=0)),
+                ('feed_count', models.IntegerField(default=0)),
+                ('values_concat', models.GeneratedField(blank=True, db_persist=True, expression=django.db.models.functions.text.Lower(models.Func(models.F('values'), function='jsonb_values_concat')), null=True, output_field=models.TextField())),
+                ('values_list', models.GeneratedField(blank=True, db_persist=True, expression=models.Func(models.F('values'), function='jsonb_values_list'), null=True, output_field=django.contrib.postgres.fields.ArrayField(base_field=models.TextField(), size=None))),
+                ('values_sort', models.GeneratedField(blank=True, db_persist=True, expression=models.Func(models.F('values'), models.F('stix_id'), function='jsonb_sort_value'), null=True, output_field=models.CharField(max_length=300))),
+            ],
+            options={
+                'indexes': [
+                    models.Index(fields=['created', 'stix_id', 'knowledgebase'], name='obstracts_os_kbase_c_idx'),
+                    models.Index(fields=['modified', 'stix_id', 'knowledgebase'], name='obstracts_os_kbase_m_idx'),
+                    models.Index(fields=['created', 'stix_id', 'type'], name='obstracts_os_created_type_idx'),
+                    models.Index(fields=['modified', 'stix_id', 'type'], name='obstracts_os_modified_type_idx'),
+                    models.Index(fields=['post_count', 'stix_id', 'type'], name='obstracts_os_posts_type_idx'),
+                    models.Index(fields=['last_seen', 'stix_id', 'type'], name='obstracts_os_seen_type_idx'),
+                    models.Index(django.db.models.fields.json.KeyTextTransform('kb_type', 'values'), models.F('type'), name='obstracts_os_kb_type_idx'),
+                    models.Index(django.db.models.functions.text.Upper(django.db.models.fields.json.KeyTextTransform('kb_id', 'values')), models.F('type'), name='obstracts_os_kb_id_idx'),
+                    models.Index(models.F('values_sort'), models.F('type'), name='obstracts_os_values_sort_idx'),
+                    models.Index(models.F('values_sort'), models.F('knowledgebase'), name='obstracts_os_values_s_kbidx'),
+                ],
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+            CREATE INDEX obstracts_os_values_list_idx
+            ON obstracts_objectsummary
+            USING gin (values_list array_ops, type gin_trgm_ops, knowledgebase gin_trgm_ops);
+
+            CREATE INDEX obstracts_os_values_concat_idx
+            ON obstracts_objectsummary
+            USING gin (values_concat gin_trgm_ops, type gin_trgm_ops, knowledgebase gin_trgm_ops);
+            """,
+            reverse_sql="""
+            DROP INDEX IF EXISTS obstracts_os_values_list_idx;
+            DROP INDEX IF EXISTS obstracts_os_values_concat_idx;
+            """,
+        ),
+        migrations.RunSQL(
+            sql=f"""
+            -- recomputes the summary of each of `stix_ids` from its object values,
+            -- the canonical values being those of its most recently published post
+            CREATE OR REPLACE FUNCTION obstracts_os_refresh(stix_ids text[])
+            RETURNS void
+            LANGUAGE sql
+            AS $$
+                INSERT INTO obstracts_objectsummary AS s ({SUMMARY_COLUMNS})
+                {SUMMARY_SELECT.format(where="ov.stix_id = ANY(stix_ids)")}
+                -- same lock order in every transaction, so concurrent uploads don't deadlock
+                ORDER BY c.stix_id
+                ON CONFLICT (stix_id) DO UPDATE
+                SET type = EXCLUDED.type,
+                    knowledgebase = EXCLUDED.knowledgebase,
+                    "values" = EXCLUDED."values",
+                    created = EXCLUDED.created,
+                    modified = EXCLUDED.modified,
+                    first_seen = EXCLUDED.first_seen,
+                    last_seen = EXCLUDED.last_seen,
+                    post_count = EXCLUDED.post_count,
+                    feed_count = EXCLUDED.feed_count
+                WHERE (s.type, s.knowledgebase, s."values", s.created, s.modified, s.first_seen, s.last_seen, s.post_count, s.feed_count)
+                    IS DISTINCT FROM
+                    (EXCLUDED.type, EXCLUDED.knowledgebase, EXCLUDED."values", EXCLUDED.created, EXCLUDED.modified, EXCLUDED.first_seen, EXCLUDED.last_seen, EXCLUDED.post_count, EXCLUDED.feed_count);
+
+                DELETE FROM obstracts_objectsummary s
+                WHERE s.stix_id = ANY(stix_ids)
+                AND NOT EXISTS (SELECT 1 FROM obstracts_objectvalue ov WHERE ov.stix_id = s.stix_id);
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_objectvalue_inserted()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_refresh(array_agg(DISTINCT stix_id::text)) FROM new_rows;
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_objectvalue_deleted()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_refresh(array_agg(DISTINCT stix_id::text)) FROM old_rows;
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_objectvalue_updated()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_refresh(array_agg(DISTINCT ch.stix_id))
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                CROSS JOIN LATERAL (VALUES (o.stix_id::text), (n.stix_id::text)) AS ch(stix_id)
+                WHERE (o.stix_id, o.file_id, o.type, o.knowledgebase, o."values", o.created, o.modified)
+                    IS DISTINCT FROM
+                    (n.stix_id, n.file_id, n.type, n.knowledgebase, n."values", n.created, n.modified);
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_post_updated()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_refresh(array_agg(stix_id::text))
+                FROM obstracts_objectvalue WHERE file_id = NEW.id;
+                RETURN NULL;
+            END;
+            $$;
+
+            DROP TRIGGER IF EXISTS obstracts_os_insert_trigger ON obstracts_objectvalue;
+            CREATE TRIGGER obstracts_os_insert_trigger
+            AFTER INSERT ON obstracts_objectvalue
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION obstracts_os_objectvalue_inserted();
+
+            DROP TRIGGER IF EXISTS obstracts_os_delete_trigger ON obstracts_objectvalue;
+            CREATE TRIGGER obstracts_os_delete_trigger
+            AFTER DELETE ON obstracts_objectvalue
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION obstracts_os_objectvalue_deleted();
+
+            DROP TRIGGER IF EXISTS obstracts_os_update_trigger ON obstracts_objectvalue;
+            CREATE TRIGGER obstracts_os_update_trigger
+            AFTER UPDATE ON obstracts_objectvalue
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION obstracts_os_objectvalue_updated();
+
+            DROP TRIGGER IF EXISTS obstracts_os_post_trigger ON history4feed_post;
+            CREATE TRIGGER obstracts_os_post_trigger
+            AFTER UPDATE OF pubdate ON history4feed_post
+            FOR EACH ROW
+            WHEN (OLD.pubdate IS DISTINCT FROM NEW.pubdate)
+            EXECUTE FUNCTION obstracts_os_post_updated();
+
+            INSERT INTO obstracts_objectsummary ({SUMMARY_COLUMNS})
+            {SUMMARY_SELECT.format(where="true")};
+            """,
+            reverse_sql="""
+            DROP TRIGGER IF EXISTS obstracts_os_insert_trigger ON obstracts_objectvalue;
+            DROP TRIGGER IF EXISTS obstracts_os_delete_trigger ON obstracts_objectvalue;
+            DROP TRIGGER IF EXISTS obstracts_os_update_trigger ON obstracts_objectvalue;
+            DROP TRIGGER IF EXISTS obstracts_os_post_trigger ON history4feed_post;
+            DROP FUNCTION IF EXISTS obstracts_os_objectvalue_inserted();
+            DROP FUNCTION IF EXISTS obstracts_os_objectvalue_deleted();
+            DROP FUNCTION IF EXISTS obstracts_os_objectvalue_updated();
+            DROP FUNCTION IF EXISTS obstracts_os_post_updated();
+            DROP FUNCTION IF EXISTS obstracts_os_refresh(text[]);
+            """,
+        ),
+        # the values endpoints no longer read ObjectValue, so it doesn't need
+        # a canonical row per stix_id nor the indexes to search and sort them
+        migrations.RunSQL(
+            sql="DROP INDEX IF EXISTS obstracts_ov_values_list_idx;",
+            reverse_sql="""
+            CREATE INDEX obstracts_ov_values_list_idx
+            ON obstracts_objectvalue
+            USING gin (values_list array_ops, type gin_trgm_ops, knowledgebase gin_trgm_ops) WHERE NOT is_dupe;
+            """,
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_type_stix_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_kbase_c_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_kbase_m_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_created_type_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_modified_type_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_kb_type_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_kb_id_cidx',
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_kb_id_midx',
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_values_concat_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='objectvalue',
+            name='obstracts_ov_values_c_kbidx',
+        ),
+        migrations.RemoveField(
+            model_name='objectvalue',
+            name='values_sort',
+        ),
+        migrations.RemoveField(
+            model_name='objectvalue',
+            name='values_list',
+        ),
+        migrations.RemoveField(
+            model_name='objectvalue',
+            name='values_concat',
+        ),
+        migrations.RemoveField(
+            model_name='objectvalue',
+            name='is_dupe',
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.11 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('obstracts', '0038_objectsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectSummaryValue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stix_id', models.CharField(db_index=True, max_length=256)),
+                ('value', models.TextField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['value'], name='obstracts_osv_value_idx', opclasses=['text_pattern_ops'])],
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+            CREATE OR REPLACE FUNCTION obstracts_osv_sync()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                IF TG_OP <> 'INSERT' THEN
+                    DELETE FROM obstracts_objectsummaryvalue WHERE stix_id = OLD.stix_id;
+                END IF;
+                IF TG_OP <> 'DELETE' THEN
+                    INSERT INTO obstracts_objectsummaryvalue (stix_id, value)
+                    SELECT DISTINCT NEW.stix_id, left(v, 512)
+                    FROM unnest(jsonb_values_list(NEW."values")) AS v
+                    WHERE v IS NOT NULL;
+                END IF;
+                RETURN NULL;
+            END;
+            $$;
+
+            DROP TRIGGER IF EXISTS obstracts_osv_insert_delete_trigger ON obstracts_objectsummary;
+            CREATE TRIGGER obstracts_osv_insert_delete_trigger
+            AFTER INSERT OR DELETE ON obstracts_objectsummary
+            FOR EACH ROW
+            EXECUTE FUNCTION obstracts_osv_sync();
+
+            DROP TRIGGER IF EXISTS obstracts_osv_update_trigger ON obstracts_objectsummary;
+            CREATE TRIGGER obstracts_osv_update_trigger
+            AFTER UPDATE OF "values" ON obstracts_objectsummary
+            FOR EACH ROW
+            WHEN (OLD."values" IS DISTINCT FROM NEW."values")
+            EXECUTE FUNCTION obstracts_osv_sync();
+
+            INSERT INTO obstracts_objectsummaryvalue (stix_id, value)
+            SELECT DISTINCT s.stix_id, left(v, 512)
+            FROM obstracts_objectsummary s
+            CROSS JOIN LATERAL unnest(s.values_list) AS v
+            WHERE v IS NOT NULL;
+            """,
+            reverse_sql="""
+            DROP TRIGGER IF EXISTS obstracts_osv_insert_delete_trigger ON obstracts_objectsummary;
+            DROP TRIGGER IF EXISTS obstracts_osv_update_trigger ON obstracts_objectsummary;
+            DROP FUNCTION IF EXISTS obstracts_osv_sync();
+            """,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.11 on 2026-10-17 20:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('obstracts', '0039_objectsummaryvalue'),
+        ('history4feed', '0012_post_h4f_feed_pk'),
+    ]
+
+    operations = [
+        # keyset pagination of posts seeks on (pubdate, id)
+        migrations.RunSQL(
+            sql="""
+            CREATE INDEX IF NOT EXISTS obstracts_post_pubdate_id_idx
+            ON history4feed_post (pubdate, id)
+            WHERE NOT deleted_manually;
+            """,
+            reverse_sql="DROP INDEX IF EXISTS obstracts_post_pubdate_id_idx;",
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.11 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('obstracts', '0040_post_pubdate_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='file',
+            name='ai_threat_score',
+            field=models.IntegerField(default=None, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='file',
+            index=models.Index(models.OrderBy(models.F('ai_threat_score'), descending=True, nulls_last=True), models.OrderBy(models.F('post_id'), descending=True), name='obstracts_file_threat_score_idx'),
+        ),
+        migrations.RunSQL(
+            sql="""
+            UPDATE obstracts_file
+            SET ai_threat_score = (txt2stix_data #>> '{content_check,threat_score}')::integer
+            WHERE txt2stix_data #>> '{content_check,threat_score}' IS NOT NULL;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.11 on 2026-10-17 22:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('obstracts', '0041_file_ai_threat_score'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            ALTER FUNCTION obstracts_os_refresh(text[]) RENAME TO obstracts_os_recompute;
+
+            -- Summaries are recomputed from the object values, so two transactions
+            -- adding values of the same object must not recompute it at the same
+            -- time: each would miss the other's uncommitted rows and the last
+            -- commit would win. The lock is held until commit, and the recompute
+            -- is a later statement, so it sees the rows of whoever held it before.
+            CREATE OR REPLACE FUNCTION obstracts_os_refresh(stix_ids text[])
+            RETURNS void
+            LANGUAGE sql
+            AS $$
+                -- same lock order in every transaction, so concurrent uploads don't deadlock
+                SELECT pg_advisory_xact_lock(hashtext(ids.stix_id))
+                FROM (SELECT DISTINCT unnest(stix_ids) AS stix_id ORDER BY 1) ids;
+
+                SELECT obstracts_os_recompute(stix_ids);
+            $$;
+            """,
+            reverse_sql="""
+            DROP FUNCTION IF EXISTS obstracts_os_refresh(text[]);
+            ALTER FUNCTION obstracts_os_recompute(text[]) RENAME TO obstracts_os_refresh;
+            """,
+        ),
+    ]
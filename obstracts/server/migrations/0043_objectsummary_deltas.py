@@ -0,0 +1,335 @@
+# Generated by Django 5.2.11 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('obstracts', '0042_objectsummary_refresh_lock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='objectsummary',
+            name='canonical_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.CreateModel(
+            name='ObjectSummaryFeed',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stix_id', models.CharField(max_length=256)),
+                ('feed_id', models.UUIDField()),
+                ('post_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('post_count__lte', 0)), fields=['post_count'], name='obstracts_osf_empty_idx')],
+                'constraints': [models.UniqueConstraint(fields=('stix_id', 'feed_id'), name='obstracts_osf_stix_id_feed')],
+            },
+        ),
+        migrations.RunSQL(
+            sql="""
+            DROP FUNCTION IF EXISTS obstracts_os_refresh(text[]);
+
+            -- recomputes every row of `stix_ids` from all of its object values,
+            -- only needed when a removed value was one of its bounds
+            CREATE OR REPLACE FUNCTION obstracts_os_rebuild(stix_ids text[])
+            RETURNS void
+            LANGUAGE sql
+            AS $$
+                DELETE FROM obstracts_objectsummaryfeed WHERE stix_id = ANY(stix_ids);
+                INSERT INTO obstracts_objectsummaryfeed (stix_id, feed_id, post_count)
+                SELECT ov.stix_id, f.feed_id, count(*)
+                FROM obstracts_objectvalue ov
+                JOIN obstracts_file f ON f.post_id = ov.file_id
+                WHERE ov.stix_id = ANY(stix_ids)
+                GROUP BY 1, 2
+                ORDER BY 1, 2;
+
+                SELECT obstracts_os_recompute(stix_ids);
+
+                UPDATE obstracts_objectsummary s
+                SET canonical_id = c.id
+                FROM (
+                    SELECT DISTINCT ON (ov.stix_id) ov.stix_id, ov.id
+                    FROM obstracts_objectvalue ov
+                    JOIN history4feed_post p ON p.id = ov.file_id
+                    WHERE ov.stix_id = ANY(stix_ids)
+                    ORDER BY ov.stix_id, p.pubdate DESC NULLS LAST, ov.id DESC
+                ) c
+                WHERE s.stix_id = c.stix_id AND s.canonical_id IS DISTINCT FROM c.id;
+            $$;
+
+            -- applies one statement's changes to the summaries: `removed_*` describe
+            -- the object values that went away (with the feed and pubdate they
+            -- were counted under), `added_ids` those that appeared and
+            -- `updated_ids` those whose values changed in place. Counts are moved
+            -- by the change alone, only the objects that lost their first, last
+            -- or canonical value are rebuilt from all of their values.
+            CREATE OR REPLACE FUNCTION obstracts_os_apply(
+                removed_ids bigint[], removed_stix_ids text[], removed_feed_ids uuid[], removed_pubdates timestamptz[],
+                added_ids bigint[], updated_ids bigint[]
+            )
+            RETURNS void
+            LANGUAGE plpgsql
+            AS $$
+            DECLARE
+                rebuilt text[];
+            BEGIN
+                -- every summary the statement touches is locked in one sorted step, before
+                -- any of its rows or feed counts is written, so concurrent uploads don't deadlock
+                PERFORM 1 FROM obstracts_objectsummary
+                WHERE stix_id IN (
+                    SELECT unnest(removed_stix_ids)
+                    UNION SELECT stix_id FROM obstracts_objectvalue WHERE id = ANY(added_ids) OR id = ANY(updated_ids)
+                )
+                ORDER BY stix_id
+                FOR UPDATE;
+
+                SELECT coalesce(array_agg(DISTINCT r.stix_id), '{}') INTO rebuilt
+                FROM unnest(removed_ids, removed_stix_ids, removed_feed_ids, removed_pubdates) AS r(id, stix_id, feed_id, pubdate)
+                LEFT JOIN obstracts_objectsummary s ON s.stix_id = r.stix_id
+                WHERE s.stix_id IS NULL OR r.feed_id IS NULL
+                    OR r.id = s.canonical_id OR r.pubdate <= s.first_seen OR r.pubdate >= s.last_seen;
+
+                WITH deltas AS (
+                    SELECT ch.stix_id, ch.feed_id, sum(ch.delta)::integer AS delta
+                    FROM (
+                        SELECT r.stix_id, r.feed_id, -1 AS delta
+                        FROM unnest(removed_stix_ids, removed_feed_ids) AS r(stix_id, feed_id)
+                        UNION ALL
+                        SELECT ov.stix_id, f.feed_id, 1
+                        FROM obstracts_objectvalue ov
+                        JOIN obstracts_file f ON f.post_id = ov.file_id
+                        WHERE ov.id = ANY(added_ids)
+                    ) ch
+                    WHERE ch.stix_id <> ALL(rebuilt)
+                    GROUP BY 1, 2
+                    HAVING sum(ch.delta) <> 0
+                ),
+                feed_counts AS (
+                    INSERT INTO obstracts_objectsummaryfeed AS c (stix_id, feed_id, post_count)
+                    SELECT stix_id, feed_id, delta FROM deltas
+                    ORDER BY 1, 2
+                    ON CONFLICT (stix_id, feed_id) DO UPDATE
+                    SET post_count = c.post_count + EXCLUDED.post_count
+                    RETURNING c.stix_id, c.feed_id, c.post_count
+                ),
+                counts AS (
+                    SELECT d.stix_id,
+                        sum(d.delta) AS post_count,
+                        -- feeds the object appeared in or disappeared from
+                        sum(
+                            CASE
+                                WHEN fc.post_count > 0 AND fc.post_count - d.delta <= 0 THEN 1
+                                WHEN fc.post_count <= 0 AND fc.post_count - d.delta > 0 THEN -1
+                                ELSE 0
+                            END
+                        ) AS feed_count
+                    FROM deltas d
+                    JOIN feed_counts fc ON (fc.stix_id, fc.feed_id) = (d.stix_id, d.feed_id)
+                    GROUP BY 1
+                ),
+                added AS (
+                    SELECT DISTINCT ON (ov.stix_id) ov.stix_id, ov.id, ov.type, ov.knowledgebase, ov."values", ov.created, ov.modified,
+                        min(p.pubdate) OVER w AS first_seen,
+                        max(p.pubdate) OVER w AS last_seen
+                    FROM obstracts_objectvalue ov
+                    JOIN history4feed_post p ON p.id = ov.file_id
+                    WHERE ov.id = ANY(added_ids) AND ov.stix_id <> ALL(rebuilt)
+                    WINDOW w AS (PARTITION BY ov.stix_id)
+                    ORDER BY ov.stix_id, p.pubdate DESC NULLS LAST, ov.id DESC
+                )
+                INSERT INTO obstracts_objectsummary AS s (stix_id, type, knowledgebase, "values", created, modified, first_seen, last_seen, post_count, feed_count, canonical_id)
+                -- an object with no added value already has a summary, the placeholders
+                -- only satisfy NOT NULL, which is checked before the conflict
+                SELECT stix_id, coalesce(a.type, ''), a.knowledgebase, coalesce(a."values", '{}'), a.created, a.modified,
+                    a.first_seen, a.last_seen, coalesce(c.post_count, 0), coalesce(c.feed_count, 0), a.id
+                FROM counts c
+                FULL JOIN added a USING (stix_id)
+                ORDER BY stix_id
+                ON CONFLICT (stix_id) DO UPDATE
+                SET post_count = s.post_count + EXCLUDED.post_count,
+                    feed_count = s.feed_count + EXCLUDED.feed_count,
+                    first_seen = least(s.first_seen, EXCLUDED.first_seen),
+                    last_seen = greatest(s.last_seen, EXCLUDED.last_seen),
+                    -- the added value of the latest post replaces the canonical one if it is newer
+                    (canonical_id, type, knowledgebase, "values", created, modified) = (
+                        SELECT v.id, v.type, v.knowledgebase, v."values", v.created, v.modified
+                        FROM (
+                            VALUES (s.canonical_id, s.type, s.knowledgebase, s."values", s.created, s.modified, s.last_seen),
+                                (EXCLUDED.canonical_id, EXCLUDED.type, EXCLUDED.knowledgebase, EXCLUDED."values", EXCLUDED.created, EXCLUDED.modified, EXCLUDED.last_seen)
+                        ) AS v(id, type, knowledgebase, "values", created, modified, pubdate)
+                        WHERE v.id IS NOT NULL
+                        ORDER BY v.pubdate DESC NULLS LAST, v.id DESC
+                        LIMIT 1
+                    );
+
+                DELETE FROM obstracts_objectsummaryfeed WHERE post_count <= 0;
+
+                UPDATE obstracts_objectsummary s
+                SET type = ov.type,
+                    knowledgebase = ov.knowledgebase,
+                    "values" = ov."values",
+                    created = ov.created,
+                    modified = ov.modified
+                FROM obstracts_objectvalue ov
+                WHERE ov.id = ANY(updated_ids) AND s.stix_id = ov.stix_id AND s.canonical_id = ov.id;
+
+                IF cardinality(rebuilt) > 0 THEN
+                    PERFORM obstracts_os_rebuild(rebuilt);
+                END IF;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_objectvalue_inserted()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_apply('{}', '{}', '{}', '{}', array_agg(id), '{}') FROM new_rows;
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_objectvalue_deleted()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_apply(
+                    array_agg(o.id), array_agg(o.stix_id::text), array_agg(f.feed_id), array_agg(p.pubdate), '{}', '{}'
+                )
+                FROM old_rows o
+                LEFT JOIN obstracts_file f ON f.post_id = o.file_id
+                LEFT JOIN history4feed_post p ON p.id = o.file_id;
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_objectvalue_updated()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                -- a value moved to another object or post is removed and added,
+                -- one changed in place (an upload rewriting it) only matters if canonical
+                PERFORM obstracts_os_apply(
+                    array_agg(o.id) FILTER (WHERE m.moved),
+                    array_agg(o.stix_id::text) FILTER (WHERE m.moved),
+                    array_agg(f.feed_id) FILTER (WHERE m.moved),
+                    array_agg(p.pubdate) FILTER (WHERE m.moved),
+                    array_agg(n.id) FILTER (WHERE m.moved),
+                    array_agg(n.id) FILTER (WHERE NOT m.moved)
+                )
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                LEFT JOIN obstracts_file f ON f.post_id = o.file_id
+                LEFT JOIN history4feed_post p ON p.id = o.file_id
+                CROSS JOIN LATERAL (
+                    SELECT (o.stix_id, o.file_id) IS DISTINCT FROM (n.stix_id, n.file_id) AS moved
+                ) m
+                WHERE (o.stix_id, o.file_id, o.type, o.knowledgebase, o."values", o.created, o.modified)
+                    IS DISTINCT FROM
+                    (n.stix_id, n.file_id, n.type, n.knowledgebase, n."values", n.created, n.modified);
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_post_updated()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                -- the post's values are removed at their old pubdate and added at the new one
+                PERFORM obstracts_os_apply(
+                    array_agg(ov.id), array_agg(ov.stix_id::text), array_agg(f.feed_id), array_agg(OLD.pubdate),
+                    array_agg(ov.id), '{}'
+                )
+                FROM obstracts_objectvalue ov
+                JOIN obstracts_file f ON f.post_id = ov.file_id
+                WHERE ov.file_id = NEW.id;
+                RETURN NULL;
+            END;
+            $$;
+
+            INSERT INTO obstracts_objectsummaryfeed (stix_id, feed_id, post_count)
+            SELECT ov.stix_id, f.feed_id, count(*)
+            FROM obstracts_objectvalue ov
+            JOIN obstracts_file f ON f.post_id = ov.file_id
+            GROUP BY 1, 2;
+
+            UPDATE obstracts_objectsummary s
+            SET canonical_id = c.id
+            FROM (
+                SELECT DISTINCT ON (ov.stix_id) ov.stix_id, ov.id
+                FROM obstracts_objectvalue ov
+                JOIN history4feed_post p ON p.id = ov.file_id
+                ORDER BY ov.stix_id, p.pubdate DESC NULLS LAST, ov.id DESC
+            ) c
+            WHERE s.stix_id = c.stix_id;
+            """,
+            reverse_sql="""
+            CREATE OR REPLACE FUNCTION obstracts_os_refresh(stix_ids text[])
+            RETURNS void
+            LANGUAGE sql
+            AS $$
+                SELECT pg_advisory_xact_lock(hashtext(ids.stix_id))
+                FROM (SELECT DISTINCT unnest(stix_ids) AS stix_id ORDER BY 1) ids;
+
+                SELECT obstracts_os_recompute(stix_ids);
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_objectvalue_inserted()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_refresh(array_agg(DISTINCT stix_id::text)) FROM new_rows;
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_objectvalue_deleted()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_refresh(array_agg(DISTINCT stix_id::text)) FROM old_rows;
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_objectvalue_updated()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_refresh(array_agg(DISTINCT ch.stix_id))
+                FROM old_rows o
+                JOIN new_rows n ON n.id = o.id
+                CROSS JOIN LATERAL (VALUES (o.stix_id::text), (n.stix_id::text)) AS ch(stix_id)
+                WHERE (o.stix_id, o.file_id, o.type, o.knowledgebase, o."values", o.created, o.modified)
+                    IS DISTINCT FROM
+                    (n.stix_id, n.file_id, n.type, n.knowledgebase, n."values", n.created, n.modified);
+                RETURN NULL;
+            END;
+            $$;
+
+            CREATE OR REPLACE FUNCTION obstracts_os_post_updated()
+            RETURNS trigger
+            LANGUAGE plpgsql
+            AS $$
+            BEGIN
+                PERFORM obstracts_os_refresh(array_agg(stix_id::text))
+                FROM obstracts_objectvalue WHERE file_id = NEW.id;
+                RETURN NULL;
+            END;
+            $$;
+
+            DROP FUNCTION IF EXISTS obstracts_os_apply(bigint[], text[], uuid[], timestamptz[], bigint[], bigint[]);
+            DROP FUNCTION IF EXISTS obstracts_os_rebuild(text[]);
+            """,
+        ),
+    ]
@@ -9,7 +9,7 @@ import typing
 from django.conf import settings
 from django.db import connections, models
 from django.db.models.fields.json import KeyTextTransform
-from django.db.models.functions import Lower, Upper
+from django.db.models.functions import Cast, Lower, Upper
 from django.utils.text import slugify
 from pgvector.django import CosineDistance
 import txt2stix, txt2stix.extractions
@@ -19,6 +19,9 @@ import stix2
 from django.utils import timezone
 from django.db import transaction
 from django.contrib.postgres.search import SearchVectorField
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
 
 from django.db.models.signals import post_delete
 from django.dispatch import receiver
@@ -29,9 +32,13 @@ from django.db.models.signals import post_save
 from django.contrib.postgres.fields import ArrayField
 from stix2arango.stix2arango import Stix2Arango
 from dogesec_commons.objects.db_view_creator import link_one_collection
-from sklearn.metrics.pairwise import cosine_similarity
 
-from obstracts.classifier.models import Cluster, DocumentEmbedding
+from obstracts.classifier.models import (
+    Cluster,
+    DocumentEmbedding,
+    invalidate_similarity_cache,
+    similarity_cache_version,
+)
 from obstracts.classifier.tasks import create_embedding_text, compute_embedding_for_document
 from obstracts.server.values.filters import DictFirstValue
 from django.contrib.postgres import indexes as pg_indexes
@@ -40,6 +47,8 @@ from django.contrib.postgres import indexes as pg_indexes
 if typing.TYPE_CHECKING:
     from .. import settings
 
+SIMILAR_POSTS_CACHE_TIMEOUT = 60 * 60
+
 
 def validate_extractor(types, name):
     extractors = txt2stix.extractions.parse_extraction_config(
@@ -190,6 +199,20 @@ def create_collection(feed: FeedProfile):
     link_one_collection(
         s2a.arango.db, settings.ARANGODB_DATABASE_VIEW, feed.edge_collection
     )
+    create_post_indexes(s2a.arango.db, feed)
+
+
+# per post lookups (post objects, removal on delete and reprocess) filter on these
+POST_INDEX_FIELDS = ["_obstracts_post_id", "_stixify_report_id"]
+
+
+def create_post_indexes(db, feed: FeedProfile):
+    """Create the persistent indexes on post ids in the feed's collections, existing ones are left as is."""
+    for collection in [feed.vertex_collection, feed.edge_collection]:
+        for field in POST_INDEX_FIELDS:
+            db.collection(collection).add_index(
+                dict(type="persistent", fields=[field], sparse=True, name=f"obstracts{field}")
+            )
 
 
 def update_identities(feed: FeedProfile):
@@ -234,7 +257,7 @@ def start_job(sender, instance: h4f_models.Job, **kwargs):
     if instance.is_cancelled():
         job.cancel()
     job.has_h4f_failures = instance.has_failures
-    job.save()
+    job.save(update_fields=["has_h4f_failures"])
 
 
 class File(models.Model):
@@ -267,6 +290,8 @@ class File(models.Model):
         null=True,
         blank=True,
     )
+    # copied from txt2stix_data.content_check so it can be filtered and sorted on
+    ai_threat_score = models.IntegerField(default=None, null=True)
 
     txt2stix_data = models.JSONField(default=None, null=True)
     embedding = models.ForeignKey(DocumentEmbedding, on_delete=models.SET_NULL, null=True, related_name="file")
@@ -276,6 +301,11 @@ class File(models.Model):
             pg_indexes.GinIndex(fields=['text_search'], name='obstracts_file_text_search_idx'),
             models.Index(fields=['feed_id', 'post_id'], name='obstracts_file_feed_id_idx'),
             models.Index(fields=["processed", "ai_describes_incident", "post_id"], name="obstracts_file_processed_idx"),
+            # NULL sorts as the lowest score
+            models.Index(
+                models.F("ai_threat_score").desc(nulls_last=True), models.F("post_id").desc(),
+                name="obstracts_file_threat_score_idx",
+            ),
         ]
     def save(self, *args, **kwargs):
         self.post.save()  # update datetime_updated
@@ -308,6 +338,7 @@ class File(models.Model):
                 txt2stix_data.content_check.incident_classification
             )
             self.summary = txt2stix_data.content_check.summary
+            self.ai_threat_score = txt2stix_data.content_check.threat_score
 
         self.save(
             update_fields=[
@@ -315,6 +346,7 @@ class File(models.Model):
                 "ai_describes_incident",
                 "ai_incident_summary",
                 "ai_incident_classification",
+                "ai_threat_score",
                 "summary",
             ]
         )
@@ -324,45 +356,72 @@ class File(models.Model):
         if not file.embedding:
             return []
 
-        files_qs = (
-                File.objects.exclude(pk=file.pk).filter(embedding__isnull=False).select_related("embedding", "post")
+        cache_key = f"similar-posts:{similarity_cache_version()}:{file.pk}"
+        results = cache.get(cache_key)
+        if results is None:
+            results = file._find_similar_posts()
+            cache.set(cache_key, results, timeout=SIMILAR_POSTS_CACHE_TIMEOUT)
+        return results
+
+    def _find_similar_posts(file):
+        # top 5 most similar posts in one query, ordered by the HNSW index on the embeddings
+        shared_topics = ArraySubquery(
+            Cluster.objects.filter(members=models.OuterRef("embedding_id"))
+            .filter(members=file.embedding_id)
+            .order_by("label")
+            .values("label")[:3]
+        )
+        similar_files = (
+            File.objects.exclude(pk=file.pk)
+            .filter(embedding__embedding__isnull=False)
+            .annotate(
+                distance=CosineDistance("embedding__embedding", file.embedding.embedding),
+                shared_topics=shared_topics,
             )
-        # get top 5 most similar posts based on embedding similarity, excluding self
-        similar_files = files_qs.annotate(
-            distance=CosineDistance("embedding__embedding", file.embedding.embedding)
-        ).order_by("distance")[:5]
+            .order_by("distance")
+            .values(
+                "post_id",
+                "feed_id",
+                "distance",
+                "shared_topics",
+                post_title=models.F("post__title"),
+                pubdate=models.F("post__pubdate"),
+            )[:5]
+        )
         results = []
         for sfile in similar_files:
-            similarity_score = cosine_similarity(file.embedding.embedding.reshape(1, -1), sfile.embedding.embedding.reshape(1, -1))[0][0]
-            shared_topics = list(
-                set(file.embedding.clusters.values_list("id", flat=True))
-                & set(sfile.embedding.clusters.values_list("id", flat=True))
-            )
-            results.append(
-                {
-                    "post_id": sfile.post_id,
-                    "post_title": sfile.post.title,  # or get from related post
-                    "similarity_score": similarity_score,
-                    "shared_topics": list(Cluster.objects.filter(id__in=shared_topics).values_list("label", flat=True))[:3],
-                    "feed_id": sfile.feed_id,
-                    "pubdate": sfile.post.pubdate,
-                }
-            )
+            sfile["similarity_score"] = 1 - sfile.pop("distance")
+            results.append(sfile)
         return results
 
+    @property
+    def embedding_text(self):
+        return create_embedding_text(
+            self.post.title, self.summary, self.ai_incident_summary
+        )
+
     def create_embedding(file, force=False, include_non_incident=False):
         should_embed = file.ai_describes_incident or include_non_incident
         if force or (file.embedding is None and should_embed):
             logging.info(f"creating embedding for post {file.post_id}")
+            text = file.embedding_text
             file.embedding, _ = DocumentEmbedding.objects.get_or_create(
-                text=create_embedding_text(
-                    file.post.title, file.summary, file.ai_incident_summary
-                ),
                 id=file.pk,
+                defaults=dict(text=text),
             )
+            if file.embedding.text != text:
+                file.embedding.text = text
+                file.embedding.save(update_fields=["text"])
             compute_embedding_for_document(file.embedding)
             logging.info(f"created embedding for post {file.post_id}")
             file.save(update_fields=["embedding"])
+            invalidate_similarity_cache()
+
+
+@receiver(post_delete, sender=File)
+def remove_from_similar_posts(sender, instance: File, **kwargs):
+    if instance.embedding_id:
+        invalidate_similarity_cache()
 
 
 @receiver(post_delete, sender=FeedProfile)
@@ -400,7 +459,39 @@ class ObjectValue(models.Model):
     file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='object_values')
     created = models.DateTimeField(default=None, null=True)
     modified = models.DateTimeField(default=None, null=True)
-    is_dupe = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index('file_id', 'knowledgebase', name='obstracts_kb_stats'),
+        ]
+        unique_together = [['stix_id', 'file']]
+
+    def __str__(self):
+        return f'ObjectValue(stix_id={self.stix_id}, knowledgebase={self.knowledgebase})'
+
+
+class ObjectSummary(models.Model):
+    """
+    One row per STIX object, with the values of its most recently published
+    post and how often it has been seen, the values endpoints are served from it.
+
+    Maintained by database triggers on ObjectValue and history4feed's Post
+    (see migrations 0038 and 0043), which move the counts and bounds by each
+    statement's changes, and only recompute an object from all of its values
+    when a removed one was its first, last or canonical value.
+    """
+    stix_id = models.CharField(max_length=256, primary_key=True)
+    type = models.CharField(max_length=256)
+    knowledgebase = models.CharField(max_length=64, null=True, blank=True)
+    values = models.JSONField()
+    created = models.DateTimeField(default=None, null=True)
+    modified = models.DateTimeField(default=None, null=True)
+    first_seen = models.DateTimeField(null=True)
+    last_seen = models.DateTimeField(null=True)
+    post_count = models.IntegerField(default=0)
+    feed_count = models.IntegerField(default=0)
+    # the ObjectValue the values are from
+    canonical_id = models.BigIntegerField(null=True)
     values_concat = models.GeneratedField(
         expression=Lower(models.Func(models.F("values"), function="jsonb_values_concat")),
         output_field=models.TextField(),
@@ -413,33 +504,95 @@ class ObjectValue(models.Model):
         db_persist=True, null=True, blank=True,
     )
     values_sort = models.GeneratedField(
-        expression=models.Func(models.F("values"), models.functions.Cast(models.F('id'), models.TextField()), function="jsonb_sort_value"),
-        output_field=models.CharField(max_length=48),
+        expression=models.Func(models.F("values"), models.F('stix_id'), function="jsonb_sort_value"),
+        output_field=models.CharField(max_length=300),
         db_persist=True, null=True, blank=True,
     )
 
     class Meta:
         indexes = [
-            models.Index(fields=['type', 'stix_id'], name='obstracts_ov_type_stix_idx', condition=models.Q(is_dupe=False)),
-            models.Index(fields=['created', 'id', 'knowledgebase'], name='obstracts_ov_kbase_c_idx', condition=models.Q(is_dupe=False)),
-            models.Index(fields=['modified', 'id', 'knowledgebase'], name='obstracts_ov_kbase_m_idx', condition=models.Q(is_dupe=False)),
-            models.Index(fields=['created', 'id', 'type'], name='obstracts_ov_created_type_idx', condition=models.Q(is_dupe=False)),
-            models.Index(fields=['modified', 'id', 'type'], name='obstracts_ov_modified_type_idx', condition=models.Q(is_dupe=False)),
-            models.Index(KeyTextTransform('kb_type', 'values'), 'type', name='obstracts_ov_kb_type_idx', condition=models.Q(is_dupe=False)),
-            models.Index('created', 'id', Upper(KeyTextTransform('kb_id', 'values')), 'type', name='obstracts_ov_kb_id_cidx', condition=models.Q(is_dupe=False)),
-            models.Index('modified', 'id', Upper(KeyTextTransform('kb_id', 'values')), 'type', name='obstracts_ov_kb_id_midx', condition=models.Q(is_dupe=False)),
-            models.Index('values_sort', 'type', name='obstracts_ov_values_concat_idx', condition=models.Q(is_dupe=False)),
-            models.Index('values_sort', 'knowledgebase', name='obstracts_ov_values_c_kbidx', condition=models.Q(is_dupe=False)),
-            models.Index('file_id', 'knowledgebase', name='obstracts_kb_stats'),
+            models.Index(fields=['created', 'stix_id', 'knowledgebase'], name='obstracts_os_kbase_c_idx'),
+            models.Index(fields=['modified', 'stix_id', 'knowledgebase'], name='obstracts_os_kbase_m_idx'),
+            models.Index(fields=['created', 'stix_id', 'type'], name='obstracts_os_created_type_idx'),
+            models.Index(fields=['modified', 'stix_id', 'type'], name='obstracts_os_modified_type_idx'),
+            models.Index(fields=['post_count', 'stix_id', 'type'], name='obstracts_os_posts_type_idx'),
+            models.Index(fields=['last_seen', 'stix_id', 'type'], name='obstracts_os_seen_type_idx'),
+            models.Index(KeyTextTransform('kb_type', 'values'), 'type', name='obstracts_os_kb_type_idx'),
+            models.Index(Upper(KeyTextTransform('kb_id', 'values')), 'type', name='obstracts_os_kb_id_idx'),
+            models.Index('values_sort', 'type', name='obstracts_os_values_sort_idx'),
+            models.Index('values_sort', 'knowledgebase', name='obstracts_os_values_s_kbidx'),
         ]
-        unique_together = [['stix_id', 'file']]
 
     def __str__(self):
-        return f'ObjectValue(stix_id={self.stix_id}, knowledgebase={self.knowledgebase})'
-    
-    @property
-    def value(self):
-        return self.values_sort
+        return f'ObjectSummary(stix_id={self.stix_id}, post_count={self.post_count})'
+
+
+class ObjectSummaryFeed(models.Model):
+    """
+    Number of posts of `feed_id` that contain the object `stix_id`, so
+    ObjectSummary.feed_count can be moved by a change without counting
+    the feeds of every post of the object.
+
+    Maintained by the ObjectSummary triggers (see migration 0043).
+    """
+    stix_id = models.CharField(max_length=256)
+    feed_id = models.UUIDField()
+    post_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["stix_id", "feed_id"], name="obstracts_osf_stix_id_feed"),
+        ]
+        indexes = [
+            # lets the triggers drop emptied rows without scanning the table
+            models.Index(fields=["post_count"], condition=models.Q(post_count__lte=0), name="obstracts_osf_empty_idx"),
+        ]
+
+
+class ObjectSummaryValue(models.Model):
+    """
+    One row per value of each ObjectSummary, lowercased and cut to
+    `INDEXED_LENGTH` characters, for exact and prefix searches by value.
+
+    Maintained by database triggers on ObjectSummary (see migration 0039).
+    """
+    INDEXED_LENGTH = 512
+
+    stix_id = models.CharField(max_length=256, db_index=True)
+    value = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['value'], opclasses=['text_pattern_ops'], name='obstracts_osv_value_idx'),
+        ]
+
+
+class ObjectValueDailyCount(models.Model):
+    """
+    Number of posts published on `day` that contain the knowledgebase object
+    `stix_id`, the rollup the trending statistics are read from.
+
+    Maintained by database triggers on ObjectValue and history4feed's Post
+    (see migration 0037), so every insert, delete and change of a post's
+    pubdate or visibility updates only the days it touches.
+    """
+    day = models.DateField()
+    knowledgebase = models.CharField(max_length=64)
+    stix_id = models.CharField(max_length=256)
+    post_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["knowledgebase", "day", "stix_id"],
+                name="obstracts_ovdc_kb_day_stix_id",
+            )
+        ]
+        indexes = [
+            # lets the triggers drop emptied rows without scanning the table
+            models.Index(fields=["post_count"], condition=models.Q(post_count__lte=0), name="obstracts_ovdc_empty_idx"),
+        ]
+
 
 class Job(models.Model):
     id = models.UUIDField(primary_key=True, editable=False)
@@ -466,6 +619,10 @@ class Job(models.Model):
     errors = ArrayField(base_field=models.CharField(max_length=1024), default=list)
     completion_time = models.DateTimeField(default=None, null=True)
     has_h4f_failures = models.BooleanField(default=False)
+    pending_lanes = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=256, default=None, null=True)
+    heartbeat_at = models.DateTimeField(default=None, null=True)
+    checkpoint = models.JSONField(default=None, null=True)
 
     def is_cancelled(self):
         obj = Job.objects.get(pk=self.pk)
@@ -497,10 +654,62 @@ class Job(models.Model):
         ]:
             return obj.state
         obj.state = state
-        obj.save()
+        obj.save(update_fields=["state", "completion_time"])
         self.refresh_from_db()
         return obj.state
 
+    def record_progress(self, processed=0, failed=0, error=None):
+        """
+        Add to the job counters and append `error` in a single UPDATE.
+
+        The increments are done by the database so concurrent tasks of the same
+        job never overwrite each other, the in-memory instance is not refreshed.
+        """
+        updates = {}
+        if processed:
+            updates["processed_items"] = models.F("processed_items") + processed
+        if failed:
+            updates["failed_processes"] = models.F("failed_processes") + failed
+        if error:
+            updates["errors"] = models.Func(
+                models.F("errors"),
+                models.Value(str(error)[:1024]),
+                function="array_append",
+                output_field=self._meta.get_field("errors"),
+            )
+        if updates:
+            Job.objects.filter(pk=self.pk).update(**updates)
+
+    def heartbeat(self, worker=None):
+        """Record that `worker` is still processing the job."""
+        updates = dict(heartbeat_at=timezone.now())
+        if worker:
+            updates["worker"] = worker
+        Job.objects.filter(pk=self.pk).update(**updates)
+
+    def record_checkpoint(self, post_index, stride=None):
+        """
+        Move the lane that processed `post_index` past it.
+
+        `checkpoint["lanes"]` maps `post_index % stride` to the next index of
+        that lane, it is updated in place by the database so concurrent lanes
+        never overwrite each other.
+        """
+        stride = stride or 1
+        Job.objects.filter(pk=self.pk, checkpoint__isnull=False).update(
+            checkpoint=models.Func(
+                models.F("checkpoint"),
+                models.Value(["lanes", str(post_index % stride)], output_field=ArrayField(models.TextField())),
+                models.Value(post_index + stride, output_field=models.JSONField()),
+                function="jsonb_set",
+                output_field=models.JSONField(),
+            ),
+            heartbeat_at=timezone.now(),
+        )
+
+    def refresh_progress(self):
+        self.refresh_from_db(fields=["processed_items", "failed_processes", "errors"])
+
     @property
     def feed_id(self):
         if not self.feed:
@@ -516,10 +725,100 @@ class Job(models.Model):
         return self.history4feed_job.state
 
 
+class FeedLock(models.Model):
+    """
+    A job holding or waiting for its feed's processing lock.
+
+    At most one entry per feed holds the lock, its lease is renewed while the
+    job runs. The other entries wait in `created` order with the task chain to
+    resume once the lock is handed to them.
+    """
+    job = models.OneToOneField(Job, primary_key=True, on_delete=models.CASCADE, related_name="feed_lock")
+    feed = models.ForeignKey(FeedProfile, on_delete=models.CASCADE, related_name="locks")
+    created = models.DateTimeField(auto_now_add=True)
+    acquired_at = models.DateTimeField(default=None, null=True)
+    lease_expires_at = models.DateTimeField(default=None, null=True)
+    continuation = models.JSONField(default=None, null=True, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ["created"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["feed"],
+                condition=models.Q(acquired_at__isnull=False),
+                name="obstracts_feedlock_one_holder",
+            )
+        ]
+
+    @property
+    def is_holder(self):
+        return self.acquired_at is not None
+
+
+class PercentileCont(models.Aggregate):
+    function = "PERCENTILE_CONT"
+    template = "%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+    output_field = models.FloatField()
+
+    def __init__(self, expression, percentile, **extra):
+        super().__init__(expression, percentile=float(percentile), **extra)
+
+
+class PostProcessingMetrics(models.Model):
+    """Where the time went while processing one post of a job."""
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="post_metrics")
+    post_id = models.UUIDField()
+    profile = models.ForeignKey(Profile, on_delete=models.SET_NULL, null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    succeeded = models.BooleanField()
+    total_seconds = models.FloatField()
+    stages = models.JSONField(default=dict)  # stage name -> seconds
+    db_queries = models.IntegerField(default=0)
+    arango_requests = models.IntegerField(default=0)
+
+    @staticmethod
+    def _percentiles(expression):
+        return dict(
+            p50=PercentileCont(expression, 0.5),
+            p95=PercentileCont(expression, 0.95),
+        )
+
+    @classmethod
+    def summarize(cls, queryset):
+        """p50/p95 of the total, query counts and every stage over `queryset`."""
+        aggregates = dict(posts=models.Count("pk"), failed=models.Count("pk", filter=models.Q(succeeded=False)))
+        for name in ["total_seconds", "db_queries", "arango_requests"]:
+            for p, agg in cls._percentiles(name).items():
+                aggregates[f"{name}__{p}"] = agg
+        stage_names = sorted(
+            queryset.annotate(stage=models.Func(models.F("stages"), function="jsonb_object_keys"))
+            .values_list("stage", flat=True)
+            .distinct()
+        )
+        for i, name in enumerate(stage_names):
+            seconds = Cast(KeyTextTransform(name, "stages"), models.FloatField())
+            aggregates[f"stage{i}__posts"] = models.Count(seconds)
+            for p, agg in cls._percentiles(seconds).items():
+                aggregates[f"stage{i}__{p}"] = agg
+
+        values = queryset.aggregate(**aggregates)
+        if not values["posts"]:
+            return None
+        summary = dict(posts=values["posts"], failed=values["failed"], stages={})
+        for name in ["total_seconds", "db_queries", "arango_requests"]:
+            summary[name] = dict(p50=values[f"{name}__p50"], p95=values[f"{name}__p95"])
+        for i, name in enumerate(stage_names):
+            summary["stages"][name] = dict(
+                posts=values[f"stage{i}__posts"],
+                p50=values[f"stage{i}__p50"],
+                p95=values[f"stage{i}__p95"],
+            )
+        return summary
+
+
 @receiver(post_save, sender=h4f_models.Job)
 def cancel_obstracts_job(sender, instance: h4f_models.Job, **kwargs):
     if instance.is_cancelled():
         job: Job = instance.obstracts_job
         if job.state not in [JobState.CANCELLED, JobState.CANCELLING]:
             job.cancel()
-            job.save()
@@ -5,7 +5,7 @@ from rest_framework import serializers
 
 from history4feed.app import serializers as h4fserializers
 
-from .models import File, PDFCookieConsentMode, Profile, Job, FileImage
+from .models import File, PDFCookieConsentMode, PostProcessingMetrics, Profile, Job, FileImage
 from obstracts.classifier.models import Cluster
 
 from drf_spectacular.utils import extend_schema_field
@@ -32,7 +32,54 @@ class ObstractsJobSerializer(serializers.ModelSerializer):
     class Meta:
         model = Job
         # fields = "__all__"
-        exclude = ["feed", "profile", "history4feed_job"]
+        exclude = ["feed", "profile", "history4feed_job", "pending_lanes", "checkpoint"]
+
+
+class PercentilesSerializer(serializers.Serializer):
+    p50 = serializers.FloatField()
+    p95 = serializers.FloatField()
+
+
+class StagePercentilesSerializer(PercentilesSerializer):
+    posts = serializers.IntegerField(help_text="number of posts that went through this stage")
+
+
+class ProcessingMetricsSerializer(serializers.Serializer):
+    posts = serializers.IntegerField(help_text="number of posts with metrics")
+    failed = serializers.IntegerField()
+    total_seconds = PercentilesSerializer()
+    db_queries = PercentilesSerializer()
+    arango_requests = PercentilesSerializer()
+    stages = serializers.DictField(
+        child=StagePercentilesSerializer(),
+        help_text="seconds spent in each stage: `markdown`, `extraction` (includes AI calls), `upload_to_arango`, `object_values`, `remove_stale_objects`, `save_images`, `embedding` and `topic_assignment`",
+    )
+
+
+class ObstractsJobDetailSerializer(ObstractsJobSerializer):
+    processing_metrics = serializers.SerializerMethodField()
+
+    @extend_schema_field(ProcessingMetricsSerializer(allow_null=True))
+    def get_processing_metrics(self, job: Job):
+        return PostProcessingMetrics.summarize(job.post_metrics.all())
+
+
+class FeedLockHolderSerializer(serializers.Serializer):
+    job_id = serializers.UUIDField(help_text="id of the job holding the lock")
+    acquired_at = serializers.DateTimeField()
+    lease_expires_at = serializers.DateTimeField(help_text="the lock is handed to the next job if not renewed before then")
+
+
+class FeedLockWaiterSerializer(serializers.Serializer):
+    job_id = serializers.UUIDField(help_text="id of the waiting job")
+    position = serializers.IntegerField(help_text="position in the feed's queue, starting at 1")
+    queued_at = serializers.DateTimeField()
+
+
+class FeedLockSerializer(serializers.Serializer):
+    feed_id = serializers.UUIDField()
+    holder = FeedLockHolderSerializer(allow_null=True)
+    waiting = FeedLockWaiterSerializer(many=True)
 
 
 class ProfileIDField(serializers.PrimaryKeyRelatedField):
@@ -263,7 +310,7 @@ class ObstractsPostSerializer(h4fserializers.PostSerializer):
         allow_null=True,
     )
     ai_threat_score = serializers.IntegerField(
-        source="threat_score",
+        source="obstracts_post.ai_threat_score",
         read_only=True,
         required=False,
         allow_null=True,
@@ -1,15 +1,17 @@
 import logging
 import textwrap
-from datetime import UTC, datetime, timedelta
+import time
+from datetime import UTC, date, datetime, time as dt_time, timedelta
 
+from django.db.models import Sum
 from django.utils import timezone
-from django.db.models import Count, Subquery
 
-from rest_framework import serializers, viewsets, exceptions
+from rest_framework import decorators, serializers, viewsets, exceptions
 from rest_framework.response import Response
 
-from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_serializer
-from obstracts.server.models import ObjectValue, File, h4f_models
+from drf_spectacular.utils import OpenApiParameter, OpenApiResponse, extend_schema, extend_schema_serializer
+from dogesec_commons.utils.serializers import CommonErrorSerializer as ErrorSerializer
+from obstracts.server.models import ObjectSummary, ObjectValueDailyCount
 from obstracts.server import autoschema as api_schema
 from django.core.cache import cache
 
@@ -28,58 +30,129 @@ STATISTICS_KNOWLEDGEBASES = {
     "sector": "Top 10 Sectors",
 }
 CACHE_KEY = "statistics-cache"
-EXPIRE_MINUTES = 60
-MAX_TIME_BEFORE_REFRESH = 45
+REFRESH_LOCK_KEY = "statistics-cache-refresh"
+REFRESH_AFTER_MINUTES = 45  # older snapshots are still served, but rebuilt in the background
+REFRESH_LOCK_MINUTES = 15  # frees the lock if a refresh dies without releasing it
+FIRST_SNAPSHOT_POLL_SECONDS = 0.5  # how often a request waiting for the first snapshot checks for it
+FIRST_SNAPSHOT_WAIT_SECONDS = 5  # how long a request waits for another one to build the first snapshot
 
-def _top10(knowledgebase: str, since: datetime, until: datetime):
-    """Return top 10 stix_ids for a given knowledgebase and time window, ranked by occurrence count."""
-    return (
-        ObjectValue.objects.filter(
+MAX_PERIOD_DAYS = 366
+
+
+def _top10(knowledgebase: str, since: date, until: date):
+    """Return top 10 stix_ids for a given knowledgebase and days (inclusive), ranked by number of posts."""
+    top = list(
+        ObjectValueDailyCount.objects.filter(
             knowledgebase=knowledgebase,
-            file__post__pubdate__gte=since,
-            file__post__pubdate__lt=until,
-            file__post__deleted_manually=False,
+            day__gte=since,
+            day__lte=until,
         )
-        .values("stix_id", "values")
-        .annotate(count=Count("file__post_id", distinct=True))
-        .order_by("-count")[:10]
+        .values("stix_id")
+        .annotate(count=Sum("post_count"))
+        .order_by("-count", "stix_id")[:10]
     )
+    values = dict(
+        ObjectSummary.objects.filter(stix_id__in=[row["stix_id"] for row in top]).values_list("stix_id", "values")
+    )
+    return [dict(row, values=values.get(row["stix_id"])) for row in top]
 
-def _build_category(category_label: str, knowledgebase: str, now: datetime, days: int):
-    since = now - timedelta(days=days)
+def _build_category(category_label: str, knowledgebase: str, since: date, until: date):
     return {
         "label": category_label,
         "knowledgebase": knowledgebase,
         "results": [
             {"stix_id": row["stix_id"], "values": row["values"], "count": row["count"]}
-            for row in _top10(knowledgebase, since, now)
+            for row in _top10(knowledgebase, since, until)
         ],
     }
 
-def _build_categories(now: datetime, days: int, category_labels=STATISTICS_KNOWLEDGEBASES):
-    data = cache.get(CACHE_KEY)
-    if not data:
-        build_data_and_add_to_cache(now)
-        return _build_categories(now, days, category_labels)
-    return data['time'], [
-        data[days][knowledgebase] for knowledgebase in category_labels
-    ]
 
-def ensure_statistics_data(now: datetime):
-    now_ts = now.timestamp()
+class StatisticsNotReady(exceptions.APIException):
+    status_code = 503
+    default_detail = "Statistics are being computed, try again shortly."
+    wait = 60
+
+
+def get_statistics_data():
+    """
+    The last statistics snapshot.
+
+    A snapshot older than `REFRESH_AFTER_MINUTES` is still returned, and a
+    rebuild is queued in the background (stale-while-revalidate). Only when
+    there is no snapshot at all is it built in the request, see
+    `build_first_snapshot()`.
+    """
     data = cache.get(CACHE_KEY)
     if not data:
-        build_data_and_add_to_cache(now)
-        return ensure_statistics_data(now)
-    if data['time'] - now_ts > (60 * MAX_TIME_BEFORE_REFRESH):
-        build_data_and_add_to_cache(now)
-        return ensure_statistics_data(now)
+        return build_first_snapshot()
+    if time.time() - data["time"] > 60 * REFRESH_AFTER_MINUTES:
+        request_refresh()
     return data
-    
+
+
+def build_first_snapshot():
+    """
+    Build the snapshot in this request, or wait for whoever holds the
+    refresh lock to build it, so concurrent requests on a cold cache still
+    build it only once. Waiting requests give up with a 503 after
+    `FIRST_SNAPSHOT_WAIT_SECONDS` rather than hold a worker for the build.
+    """
+    deadline = time.monotonic() + FIRST_SNAPSHOT_WAIT_SECONDS
+    while True:
+        if _acquire_refresh_lock():
+            refresh_statistics_data(timezone.now(), lock_acquired=True)
+            return cache.get(CACHE_KEY)
+        if time.monotonic() >= deadline:
+            raise StatisticsNotReady()
+        time.sleep(FIRST_SNAPSHOT_POLL_SECONDS)
+        if data := cache.get(CACHE_KEY):
+            return data
+
+
+def _acquire_refresh_lock():
+    return cache.add(REFRESH_LOCK_KEY, time.time(), timeout=60 * REFRESH_LOCK_MINUTES)
+
+
+def request_refresh():
+    """Queue a rebuild of the snapshot unless one is already queued or running."""
+    from obstracts.cjob.tasks import auto_refresh_statistics_data
+
+    if not _acquire_refresh_lock():
+        return False
+    try:
+        auto_refresh_statistics_data.delay(lock_acquired=True)
+    except Exception:
+        cache.delete(REFRESH_LOCK_KEY)
+        logging.exception("could not queue statistics refresh")
+        return False
+    return True
+
+
+def refresh_statistics_data(now: datetime, lock_acquired=False):
+    """Rebuild the snapshot, unless another refresh holds the lock."""
+    if not lock_acquired and not _acquire_refresh_lock():
+        logging.info("statistics refresh already running, skipping")
+        return False
+    try:
+        build_data_and_add_to_cache(now)
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+    return True
+
+
+def period_bounds(until: date, days: int):
+    """The first and last day of the `days` days ending with `until`, both inclusive."""
+    return until - timedelta(days=days - 1), until
+
+
+def period_start(since: date):
+    return datetime.combine(since, dt_time.min, tzinfo=UTC)
+
 
 def _build_data_for_categories(now, days, category_labels):
+    since, until = period_bounds(now.date(), days)
     return {
-        knowledgebase: _build_category(STATISTICS_KNOWLEDGEBASES[knowledgebase], knowledgebase, now, days)
+        knowledgebase: _build_category(STATISTICS_KNOWLEDGEBASES[knowledgebase], knowledgebase, since, until)
         for knowledgebase in category_labels
     }
 
@@ -87,8 +160,8 @@ def build_data_and_add_to_cache(now: datetime):
     logging.info("re-Building statistics cache")
     data_7_days = _build_data_for_categories(now, 7, STATISTICS_KNOWLEDGEBASES)
     data_30_days = _build_data_for_categories(now, 30, STATISTICS_KNOWLEDGEBASES)
-    cache.set(CACHE_KEY, {7: data_7_days, 30: data_30_days, "time": now.timestamp()}, timeout=60*EXPIRE_MINUTES)
-    return 
+    # kept until replaced, so there is always a snapshot to serve
+    cache.set(CACHE_KEY, {7: data_7_days, 30: data_30_days, "time": now.timestamp()}, timeout=None)
 
 class TrendingEntrySerializer(serializers.Serializer):
     stix_id = serializers.CharField()
@@ -109,17 +182,63 @@ class PeriodSerializer(serializers.Serializer):
     categories = TrendingCategorySerializer(many=True)
 
 
+class PeriodQuerySerializer(serializers.Serializer):
+    days = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=MAX_PERIOD_DAYS,
+        help_text="Count posts published in the last `days` days, today included. Defaults to 30 when neither `days` nor `since` is set.",
+    )
+    since = serializers.DateField(required=False, help_text="First day to count posts from (e.g. `2025-01-01`).")
+    until = serializers.DateField(required=False, help_text="Last day to count posts from, inclusive. Defaults to today.")
+
+    def validate(self, attrs):
+        today = timezone.now().date()
+        if "days" in attrs and ("since" in attrs or "until" in attrs):
+            raise serializers.ValidationError("use either `days` or `since`/`until`")
+        until = attrs.get("until", today)
+        since = attrs.get("since", period_bounds(until, attrs.get("days", 30))[0])
+        if since > until:
+            raise serializers.ValidationError("`since` must not be after `until`")
+        if (until - since).days + 1 > MAX_PERIOD_DAYS:
+            raise serializers.ValidationError(f"period cannot be longer than {MAX_PERIOD_DAYS} days")
+        return dict(since=since, until=until)
+
+
 @extend_schema_serializer(many=False)
 class StatisticsResponseSerializer(serializers.Serializer):
     last_7_days = PeriodSerializer()
     last_30_days = PeriodSerializer()
 
 
+KNOWLEDGEBASE_PARAMETER = OpenApiParameter(
+    name="knowledgebase",
+    description="Optional filter to return statistics for only a specific knowledgebase category (e.g. `enterprise-attack` or `cve`). If not provided, statistics for all categories will be returned.",
+    required=False,
+    enum=list(STATISTICS_KNOWLEDGEBASES.keys()),
+)
+
+
 class StatisticsView(viewsets.ViewSet):
     openapi_tags = ["Statistics"]
     lookup_url_kwarg = "knowledgebase"
 
+    def handle_exception(self, exc):
+        response = super().handle_exception(exc)
+        # the exception handler rebuilds the response without the Retry-After header DRF sets
+        if getattr(exc, "wait", None):
+            response["Retry-After"] = str(exc.wait)
+        return response
 
+    @staticmethod
+    def get_knowledgebases(request):
+        knowledgebases = list(STATISTICS_KNOWLEDGEBASES.keys())
+        if "knowledgebase" in request.query_params:
+            kb_filter = request.query_params["knowledgebase"]
+            if kb_filter not in knowledgebases:
+                raise exceptions.ValidationError(f"Invalid knowledgebase filter: {kb_filter}")
+            knowledgebases = [kb_filter]
+        return knowledgebases
 
     @extend_schema(
         summary="Get trending TTP statistics",
@@ -137,40 +256,63 @@ class StatisticsView(viewsets.ViewSet):
             * **ICS ATT&CK Techniques** (`ics-attack`)
             * **Locations** (`location`)
             * **CAPECs** (`capec`)
+
+            Periods are whole days (UTC) ending with the day the statistics were computed, so `period_start` is midnight 6 or 29 days before that.
+
+            Statistics are computed in the background and cached, `period_end` is when they were last computed. Once they are older than 45 minutes they are recomputed, and the cached statistics are returned until that completes. If they have never been computed, they are computed in the request, and requests made while that runs wait a few seconds for it before returning a `503` with a `Retry-After` header.
             """
         ),
-        responses={200: StatisticsResponseSerializer, 400: api_schema.DEFAULT_400_ERROR},
-        parameters=[
-            OpenApiParameter(
-                name="knowledgebase",
-                description="Optional filter to return statistics for only a specific knowledgebase category (e.g. `enterprise-attack` or `cve`). If not provided, statistics for all categories will be returned.",
-                required=False,
-                enum=list(STATISTICS_KNOWLEDGEBASES.keys()),
-            )
-        ]
+        responses={
+            200: StatisticsResponseSerializer,
+            400: api_schema.DEFAULT_400_ERROR,
+            503: OpenApiResponse(ErrorSerializer, "The statistics are being computed for the first time"),
+        },
+        parameters=[KNOWLEDGEBASE_PARAMETER],
     )
     def list(self, request):
-        now = timezone.now()
-        knowledgebases = list(STATISTICS_KNOWLEDGEBASES.keys())
-        if "knowledgebase" in request.query_params:
-            kb_filter = request.query_params["knowledgebase"]
-            if kb_filter not in knowledgebases:
-                raise exceptions.ValidationError(f"Invalid knowledgebase filter: {kb_filter}")
-            knowledgebases = [kb_filter]
-
+        knowledgebases = self.get_knowledgebases(request)
+        snapshot = get_statistics_data()
+        built_at = datetime.fromtimestamp(snapshot["time"], tz=UTC)
 
-        def _period(now, days):
-            now, value = _build_categories(now, days, category_labels=knowledgebases)
-            now = datetime.fromtimestamp(now, tz=UTC)
+        def _period(days):
             return {
                 "period_days": days,
-                "period_start": now - timedelta(days=days),
-                "period_end": now,
-                "categories": value,
+                "period_start": period_start(period_bounds(built_at.date(), days)[0]),
+                "period_end": built_at,
+                "categories": [snapshot[days][knowledgebase] for knowledgebase in knowledgebases],
             }
 
         data = {
-            "last_7_days": _period(now, 7),
-            "last_30_days": _period(now, 30),
+            "last_7_days": _period(7),
+            "last_30_days": _period(30),
         }
         return Response(StatisticsResponseSerializer(data).data)
+
+    @extend_schema(
+        summary="Get trending TTP statistics for any period",
+        description=textwrap.dedent(
+            """
+            Returns the same top 10 most-seen objects per category as the Get trending TTP statistics endpoint, for the posts published in the last `days` days or between the days `since` and `until`.
+
+            These are counted from a rollup of the number of posts per day and object, which is updated as posts are processed or deleted, so the results are always up to date. Periods can be at most 366 days long.
+            """
+        ),
+        responses={200: PeriodSerializer, 400: api_schema.DEFAULT_400_ERROR},
+        parameters=[PeriodQuerySerializer, KNOWLEDGEBASE_PARAMETER],
+    )
+    @decorators.action(detail=False, methods=["GET"])
+    def period(self, request):
+        knowledgebases = self.get_knowledgebases(request)
+        query = PeriodQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        since, until = query.validated_data["since"], query.validated_data["until"]
+        data = {
+            "period_days": (until - since).days + 1,
+            "period_start": period_start(since),
+            "period_end": min(timezone.now(), period_start(until + timedelta(days=1))),
+            "categories": [
+                _build_category(STATISTICS_KNOWLEDGEBASES[knowledgebase], knowledgebase, since, until)
+                for knowledgebase in knowledgebases
+            ],
+        }
+        return Response(PeriodSerializer(data).data)
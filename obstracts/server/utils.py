@@ -1,8 +1,16 @@
+import base64
+import json
+import uuid
+from functools import cached_property
+
 from django.conf import settings
+from django.core.paginator import Paginator
 from rest_framework import pagination, response
+from rest_framework.exceptions import ValidationError
 from rest_framework.filters import OrderingFilter, BaseFilterBackend
 from django.utils.encoding import force_str
 from django.db.models import Q
+from django.db.models.fields.tuple_lookups import Tuple, TupleGreaterThan, TupleLessThan
 from datetime import datetime
 from rest_framework import response
 
@@ -38,3 +46,116 @@ FEED_406_ERROR = OpenApiResponse(
         )
     ],
 )
+
+
+def estimated_count(queryset):
+    """
+    Exact count of `queryset` up to `POST_EXACT_COUNT_LIMIT` rows, the
+    planner's estimate above that, so counting costs at most that many rows.
+    """
+    limit = settings.POST_EXACT_COUNT_LIMIT
+    queryset = queryset.order_by()
+    count = queryset[: limit + 1].count()
+    if count <= limit:
+        return count
+    plan = json.loads(queryset.explain(format="json"))
+    return max(count, int(plan[0]["Plan"]["Plan Rows"]))
+
+
+class _EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return estimated_count(self.object_list)
+
+
+class PostPagination(Pagination):
+    """
+    Page number pagination of posts, with an opt-in keyset mode.
+
+    When posts are sorted by `pubdate`, every page has a `next_cursor`, and
+    passing it as `cursor` returns the posts after the last one of that
+    page by seeking on (pubdate, id) instead of using an OFFSET, so deep
+    pages cost the same as the first one.
+    """
+    django_paginator_class = _EstimatedCountPaginator
+    cursor_query_param = "cursor"
+    KEYSET_ORDERINGS = {
+        ("-pubdate",): ("-pubdate", "-id"),
+        ("pubdate",): ("pubdate", "id"),
+    }
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.keyset_ordering = self.KEYSET_ORDERINGS.get(tuple(queryset.query.order_by))
+        self.cursor = request.query_params.get(self.cursor_query_param)
+        self.next_cursor = None
+        if self.keyset_ordering:
+            # same order as the cursor seeks in, so posts with the same pubdate are not skipped or repeated
+            queryset = queryset.order_by(*self.keyset_ordering)
+        if self.cursor is None:
+            page = super().paginate_queryset(queryset, request, view)
+            if page is not None and self.keyset_ordering and self.page.has_next():
+                self.next_cursor = self.encode_cursor(page[-1])
+            return page
+
+        if not self.keyset_ordering:
+            raise ValidationError({self.cursor_query_param: "cursor pagination is only supported when sorting by pubdate"})
+        page_size = self.get_page_size(request)
+        self.total_results_count = estimated_count(queryset)
+        queryset = queryset.order_by(*self.keyset_ordering)
+        if self.cursor:
+            position = self.decode_cursor(self.cursor)
+            seek = TupleLessThan if self.keyset_ordering[0].startswith("-") else TupleGreaterThan
+            queryset = queryset.filter(seek(Tuple("pubdate", "id"), position))
+        results = list(queryset[: page_size + 1])
+        self.page = results[:page_size]
+        if len(results) > page_size:
+            self.next_cursor = self.encode_cursor(self.page[-1])
+        return self.page
+
+    def encode_cursor(self, post):
+        position = json.dumps([post.pubdate.isoformat(), str(post.id)])
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            pubdate, post_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return [datetime.fromisoformat(pubdate), str(uuid.UUID(post_id))]
+        except Exception:
+            raise ValidationError({self.cursor_query_param: "invalid cursor"})
+
+    def get_paginated_response(self, data):
+        if self.cursor is None:
+            resp = super().get_paginated_response(data)
+            resp.data["next_cursor"] = self.next_cursor
+            return resp
+        return response.Response({
+            'page_size': self.get_page_size(self.request),
+            'page_results_count': len(self.page),
+            'total_results_count': self.total_results_count,
+            'next_cursor': self.next_cursor,
+            self.results_key: data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema['properties']['next_cursor'] = {
+            'type': 'string',
+            'nullable': True,
+            'description': "Pass as `cursor` to get the next page, only set when sorting by `pubdate`.",
+        }
+        return schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': (
+                    "`next_cursor` of the previous page (empty for the first page). Seeks to the posts after that page instead of using `page`, "
+                    "so deep pages are as fast as the first one. Only supported when sorting by `pubdate`."
+                ),
+                'schema': {'type': 'string'},
+            },
+        ]
@@ -0,0 +1,74 @@
+"""
+Bulk lookup of whole values, e.g. the observables of a SIEM export.
+"""
+
+import json
+
+from django.db import connection
+
+from obstracts.server.models import ObjectSummaryValue
+
+LOOKUP_SQL = """
+    WITH input AS (
+        SELECT value, min(n) AS n
+        FROM unnest(%(values)s::text[]) WITH ORDINALITY AS t(value, n)
+        GROUP BY value
+    ),
+    matches AS (
+        SELECT i.value, s.stix_id, s.type,
+            array_agg(DISTINCT ov.file_id::text) AS post_ids,
+            array_agg(DISTINCT f.feed_id::text) AS feed_ids
+        FROM input i
+        JOIN obstracts_objectsummaryvalue sv ON sv.value = left(i.value, %(indexed_length)s)
+        JOIN obstracts_objectsummary s ON s.stix_id = sv.stix_id
+        JOIN obstracts_objectvalue ov ON ov.stix_id = s.stix_id
+        JOIN obstracts_file f ON f.post_id = ov.file_id
+        WHERE (%(types)s::text[] IS NULL OR s.type = ANY(%(types)s::text[]))
+        -- values longer than the indexed prefix are rechecked in full
+        AND (length(i.value) <= %(indexed_length)s OR i.value = ANY(s.values_list))
+        GROUP BY i.value, s.stix_id, s.type
+    )
+    SELECT i.value, m.stix_id, m.type, m.post_ids, m.feed_ids
+    FROM input i
+    LEFT JOIN matches m ON m.value = i.value
+    ORDER BY i.n, m.stix_id
+"""
+
+
+def lookup_values(values: list[str], types: list[str] | None = None):
+    """
+    Yield `{"value", "matches"}` for each distinct value, in the order they
+    were given, each match being the STIX object that has that exact value
+    with the posts and feeds it was extracted from.
+
+    All the values are resolved by one query, read with a server-side
+    cursor so large lookups are not held in memory.
+    """
+    params = dict(
+        values=[value.strip().lower() for value in values],
+        types=types or None,
+        indexed_length=ObjectSummaryValue.INDEXED_LENGTH,
+    )
+    current = None
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(LOOKUP_SQL, params)
+        while rows := cursor.fetchmany(1000):
+            for value, stix_id, type, post_ids, feed_ids in rows:
+                if current and current["value"] != value:
+                    yield current
+                    current = None
+                current = current or dict(value=value, matches=[])
+                if stix_id:
+                    current["matches"].append(
+                        dict(id=stix_id, type=type, post_ids=sorted(post_ids), feed_ids=sorted(feed_ids))
+                    )
+    if current:
+        yield current
+
+
+def stream_json(results):
+    """Encode `lookup_values()` as `{"lookups": [...]}` one lookup at a time."""
+    yield '{"lookups": ['
+    for i, result in enumerate(results):
+        yield ("," if i else "") + json.dumps(result)
+    yield "]}"
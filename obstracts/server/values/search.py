@@ -0,0 +1,111 @@
+"""
+Picks the index a `value` search can use from the shape of the value.
+"""
+
+import contextlib
+import ipaddress
+import operator
+import re
+from functools import reduce
+
+from django.db.models import BooleanField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.exceptions import ValidationError
+
+from obstracts.server.models import ObjectSummaryValue
+
+
+HASH_RE = re.compile(r"^(?:[0-9a-f]{32}|[0-9a-f]{40}|[0-9a-f]{56}|[0-9a-f]{64}|[0-9a-f]{96}|[0-9a-f]{128})$")
+PARTIAL_IPV4_RE = re.compile(r"^\d{1,3}\.(?:\d{1,3}(?:\.\d{1,3}){0,2}\.?)?$")
+DOMAIN_RE = re.compile(r"^(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?\.)+[a-z]{2,63}\.?$")
+URL_RE = re.compile(r"^[a-z][a-z0-9+.-]*://\S+$")
+IPV4_RE = r"^(25[0-5]|2[0-4][0-9]|1?[0-9]?[0-9])(\.(25[0-5]|2[0-4][0-9]|1?[0-9]?[0-9])){3}(/([0-9]|[12][0-9]|3[0-2]))?$"
+MIN_CONTAINS_LENGTH = 3
+# file extensions that also look like a TLD, values ending with them are file names more often than domains
+FILE_EXTENSIONS = frozenset(
+    """
+    exe dll sys drv ocx cpl scr pif lnk msi msp bat cmd ps1 psm1 vbs vbe js jse wsf wsh hta jar apk dex elf
+    bin so dylib sh py pl rb php asp aspx jsp doc docx docm dot dotm xls xlsx xlsm ppt pptx pptm pdf rtf txt
+    csv json xml yaml yml ini cfg conf log tmp dat db sqlite zip rar gz tgz tar bz2 xz iso img vhd vhdx vmdk
+    cab png jpg jpeg gif bmp svg ico html htm mht eml msg bak pem crt cer der pfx
+    """.split()
+)
+
+
+def plan_value_search(value: str) -> tuple[str, object]:
+    """
+    Pick how to search for a `value` typed without `value_exact`.
+
+    Returns `(mode, term)`: IoC shaped values (hashes, IPs, domains) are
+    looked up as whole values ("exact", list of spellings), URLs and partial
+    IPv4 addresses as prefixes ("prefix"), IPv4 CIDRs as the addresses in
+    the network ("cidr"), anything else as a substring ("contains").
+    Domain shaped values ending with a `FILE_EXTENSIONS` extension, like
+    `invoice.pdf`, are searched as substrings, as they are usually part of
+    file names, paths or URLs.
+    """
+    value = value.strip().lower()
+    if HASH_RE.match(value):
+        return "exact", [value]
+    with contextlib.suppress(ValueError):
+        address = ipaddress.ip_address(value)
+        return "exact", sorted({value, address.compressed, address.exploded})
+    if "/" in value and not URL_RE.match(value):
+        with contextlib.suppress(ValueError):
+            network = ipaddress.ip_network(value, strict=False)
+            if network.version == 4:
+                return "cidr", network
+    if PARTIAL_IPV4_RE.match(value):
+        return "prefix", value
+    if URL_RE.match(value):
+        return "prefix", value
+    if DOMAIN_RE.match(value) and value.rstrip(".").rsplit(".", 1)[-1] not in FILE_EXTENSIONS:
+        return "exact", [value.rstrip(".")]
+    return "contains", value
+
+
+def _summary_values(**filters):
+    return ObjectSummaryValue.objects.filter(**filters).values("stix_id")
+
+
+def value_search_filter(value: str, exact=False) -> Q:
+    """Q on ObjectSummary matching `value` as planned by `plan_value_search`."""
+    if exact:
+        mode, term = "exact", [value.lower()]
+    else:
+        mode, term = plan_value_search(value)
+
+    length = ObjectSummaryValue.INDEXED_LENGTH
+    match mode:
+        case "exact":
+            q = Q(stix_id__in=_summary_values(value__in=[t[:length] for t in term]))
+            if any(len(t) > length for t in term):
+                q &= reduce(operator.or_, [Q(values_list__contains=[t]) for t in term])
+            return q
+        case "prefix":
+            q = Q(stix_id__in=_summary_values(value__startswith=term[:length]))
+            if len(term) > length:
+                q &= Q(values_concat__contains=term)
+            return q
+        case "cidr":
+            if term.prefixlen == 32:
+                return Q(stix_id__in=_summary_values(value__in=[str(term.network_address), str(term)]))
+            # only the network's whole octets narrow down the index scan
+            octets = str(term.network_address).split(".")[: term.prefixlen // 8]
+            prefix = "".join(f"{octet}." for octet in octets)
+            in_network = RawSQL(
+                "CASE WHEN value ~ %s THEN value::inet <<= %s::inet ELSE false END",
+                (IPV4_RE, str(term)),
+                output_field=BooleanField(),
+            )
+            return Q(
+                stix_id__in=ObjectSummaryValue.objects.filter(value__startswith=prefix)
+                .alias(in_network=in_network)
+                .filter(in_network=True)
+                .values("stix_id")
+            )
+    if len(term) < MIN_CONTAINS_LENGTH:
+        raise ValidationError(
+            {"value": f"search for at least {MIN_CONTAINS_LENGTH} characters, or a whole IP address, hash or domain"}
+        )
+    return Q(values_concat__contains=term)
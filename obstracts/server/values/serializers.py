@@ -1,18 +1,52 @@
 from rest_framework import serializers
-from obstracts.server.models import ObjectValue
 
 class ObjectValueSerializer(serializers.Serializer):
-    """Serializer for ObjectValue model with aggregated post_ids."""
-    
+    """Serializer for ObjectSummary model."""
+
     id = serializers.CharField(source='stix_id')
     type = serializers.CharField()
     knowledgebase = serializers.CharField(required=False)
     values = serializers.JSONField(read_only=True)
     created = serializers.DateTimeField(required=False)
     modified = serializers.DateTimeField(required=False)
+    matched_posts = serializers.IntegerField(source='post_count', help_text="Number of posts this object was extracted from.")
+    feed_count = serializers.IntegerField(help_text="Number of feeds this object was extracted from.")
+    first_seen = serializers.DateTimeField(required=False, help_text="Publish date of the oldest post this object was extracted from.")
+    last_seen = serializers.DateTimeField(required=False, help_text="Publish date of the newest post this object was extracted from.")
 
     def to_representation(self, instance):
         """remove null fields from the output"""
         representation = super().to_representation(instance)
         representation = {k: v for k, v in representation.items() if v is not None}
-        return representation
\ No newline at end of file
+        return representation
+
+class ValueLookupRequestSerializer(serializers.Serializer):
+    MAX_VALUES = 10_000
+
+    values = serializers.ListField(
+        child=serializers.CharField(max_length=4096),
+        min_length=1,
+        max_length=MAX_VALUES,
+        help_text=f"Values to look up (up to {MAX_VALUES}), e.g. IP addresses, hashes or domains. Matching is exact and case-insensitive.",
+    )
+    types = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        help_text="Only match objects of these STIX types, e.g. `ipv4-addr`, `file`.",
+    )
+
+
+class ValueLookupMatchSerializer(serializers.Serializer):
+    id = serializers.CharField(help_text="STIX ID of the object with this value.")
+    type = serializers.CharField()
+    post_ids = serializers.ListField(child=serializers.UUIDField(), help_text="Posts the object was extracted from.")
+    feed_ids = serializers.ListField(child=serializers.UUIDField(), help_text="Feeds of those posts.")
+
+
+class ValueLookupSerializer(serializers.Serializer):
+    value = serializers.CharField(help_text="The looked up value, lowercased.")
+    matches = ValueLookupMatchSerializer(many=True)
+
+
+class ValueLookupResponseSerializer(serializers.Serializer):
+    lookups = ValueLookupSerializer(many=True)
@@ -1,7 +1,14 @@
 from typing import Callable
+import contextlib
+import io
+import json
 import logging
+import threading
 
+from django.db import connection, transaction
 from stix2arango.stix2arango.stix2arango import post_upload_hook
+from obstracts.cjob import timing
+from obstracts.server import metrics
 from obstracts.server.models import ObjectValue
 
 
@@ -248,6 +255,115 @@ def extract_object_metadata(obj: dict) -> dict:
     }
 
 
+STAGING_COLUMNS = ["stix_id", "type", "knowledgebase", "values", "file_id", "created", "modified"]
+
+
+def _copy_value(value) -> str:
+    """Format one value for COPY ... FROM STDIN in text format."""
+    if value is None:
+        return r"\N"
+    if isinstance(value, dict):
+        value = json.dumps(value)
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def ingest_object_values(rows: list[dict]) -> tuple[int, int]:
+    """
+    Upsert ObjectValue rows.
+
+    Rows are COPYed into a temporary staging table, then a single statement
+    inserts the new (stix_id, file) pairs and rewrites existing pairs whose
+    content changed. Unchanged rows are not written, so they don't make the
+    ObjectSummary triggers update their summaries.
+
+    Returns the number of rows created and updated.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row[column]) for column in STAGING_COLUMNS))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    table = ObjectValue._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            """
+            DROP TABLE IF EXISTS pg_temp.object_value_staging;
+            CREATE TEMP TABLE object_value_staging (
+                stix_id varchar(256),
+                type varchar(256),
+                knowledgebase varchar(64),
+                "values" jsonb,
+                file_id uuid,
+                created timestamptz,
+                modified timestamptz
+            ) ON COMMIT DROP;
+            """
+        )
+        cursor.copy_expert(
+            "COPY object_value_staging (%s) FROM STDIN"
+            % ", ".join(f'"{column}"' for column in STAGING_COLUMNS),
+            buffer,
+        )
+        cursor.execute(
+            f"""
+            WITH upserted AS (
+                INSERT INTO {table} AS ov (stix_id, type, knowledgebase, "values", file_id, created, modified)
+                -- an upload can hold the same object more than once, and a row
+                -- cannot be upserted twice by one statement
+                SELECT DISTINCT ON (stix_id, file_id) stix_id, type, knowledgebase, "values", file_id, created, modified
+                FROM object_value_staging
+                ORDER BY stix_id, file_id, modified DESC NULLS LAST
+                ON CONFLICT (stix_id, file_id) DO UPDATE
+                SET type = EXCLUDED.type,
+                    knowledgebase = EXCLUDED.knowledgebase,
+                    "values" = EXCLUDED."values",
+                    created = EXCLUDED.created,
+                    modified = EXCLUDED.modified
+                WHERE (ov.type, ov.knowledgebase, ov."values", ov.created, ov.modified)
+                    IS DISTINCT FROM
+                    (EXCLUDED.type, EXCLUDED.knowledgebase, EXCLUDED."values", EXCLUDED.created, EXCLUDED.modified)
+                RETURNING (xmax = 0) AS created
+            )
+            SELECT
+                (SELECT count(*) FROM upserted WHERE created),
+                (SELECT count(*) FROM upserted WHERE NOT created)
+            """
+        )
+        return cursor.fetchone()
+
+
+_upload_tracker = threading.local()
+
+
+@contextlib.contextmanager
+def track_uploaded_objects():
+    """
+    Collect the `id;_record_md5_hash` key of every object Stix2Arango uploads
+    on this thread, whether it was inserted or already stored unchanged.
+    """
+    keys = set()
+    _upload_tracker.keys = keys
+    try:
+        yield keys
+    finally:
+        _upload_tracker.keys = None
+
+
+@post_upload_hook(fail_on_error=True)
+def record_uploaded_objects_hook(instance, collection_name, objects, **kwargs):
+    keys = getattr(_upload_tracker, "keys", None)
+    if keys is None:
+        return
+    keys.update(f"{obj['id']};{obj['_record_md5_hash']}" for obj in objects)
+
+
 @post_upload_hook(fail_on_error=True)
 def process_uploaded_objects_hook(instance, collection_name, objects, **kwargs):
     """
@@ -263,10 +379,14 @@ def process_uploaded_objects_hook(instance, collection_name, objects, **kwargs):
         **kwargs: Additional keyword arguments including inserted_ids, existing_objects
     """
 
+    with timing.stage("object_values"):
+        _process_uploaded_objects(objects)
+
+
+def _process_uploaded_objects(objects):
     logging.info(f"Processing {len(objects)} objects for ObjectValue extraction")
 
-    # Build list of ObjectValue instances to create
-    object_values_to_create = []
+    rows = []
 
     for obj in objects:
         post_uuid = obj.get("_stixify_report_id", "").replace("report--", "")
@@ -277,29 +397,12 @@ def process_uploaded_objects_hook(instance, collection_name, objects, **kwargs):
         metadata = extract_object_metadata(obj)
         if not metadata["values"]:
             continue
-        object_values_to_create.append(
-            ObjectValue(
-                file_id=post_uuid,
-                **metadata,
-                is_dupe=False,  # will be updated later in a deduplication step
-            )
-        )
+        rows.append(dict(file_id=post_uuid, **metadata))
 
-    # Bulk create with ignore_conflicts to handle duplicates
-    if object_values_to_create:
-        created = ObjectValue.objects.bulk_create(
-            object_values_to_create, ignore_conflicts=True
-        )
-        new_dupes = ObjectValue.objects.filter(
-            stix_id__in=[obj.stix_id for obj in created],
-            is_dupe=False,
-        ).exclude(
-            file_id__in=[obj.file_id for obj in created],
-        )
-        new_dupes.update(is_dupe=True)
-        logging.info(
-            f"Created {len(created)} ObjectValue records for {len(object_values_to_create)} objects"
-        )
-        logging.info(f"Marked {new_dupes.count()} ObjectValue records as duplicates")
+    if rows:
+        created, updated = ingest_object_values(rows)
+        metrics.object_values_ingested.labels("created").inc(created)
+        metrics.object_values_ingested.labels("updated").inc(updated)
+        logging.info(f"Created {created} and updated {updated} ObjectValue records for {len(rows)} objects")
     else:
         logging.info("No ObjectValue records to create")
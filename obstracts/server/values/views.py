@@ -1,6 +1,7 @@
 from functools import reduce
 import operator
 import textwrap
+from django.http import StreamingHttpResponse
 from rest_framework import viewsets, mixins
 from django_filters.rest_framework import (
     DjangoFilterBackend,
@@ -18,12 +19,14 @@ from django.db.models.functions import Lower
 from django.contrib.postgres.aggregates import ArrayAgg
 
 
-from obstracts.server.models import ObjectValue
+from obstracts.server.models import ObjectSummary, ObjectValue
 import dogesec_commons.utils.pagination as dsc_pagination
 from obstracts.server.values.values import sco_value_map, sdo_value_map, KB_TYPES
-from .serializers import ObjectValueSerializer
+from .serializers import ObjectValueSerializer, ValueLookupRequestSerializer, ValueLookupResponseSerializer
+from .lookup import lookup_values, stream_json
 from dogesec_commons.utils.ordering import Ordering
 from .filters import DictFirstValue
+from .search import MIN_CONTAINS_LENGTH, value_search_filter
 
 
 TTP_TYPES = [
@@ -49,7 +52,7 @@ class ChoiceCSVFilter(BaseCSVFilter):
 
 
 class ObjectValueFilterSet(FilterSet):
-    """Base filterset for ObjectValue queries."""
+    """Base filterset for ObjectSummary queries."""
 
     id = CharFilter(
         field_name="stix_id",
@@ -57,36 +60,47 @@ class ObjectValueFilterSet(FilterSet):
         help_text="Filter by exact STIX object ID. e.g. `ipv4-addr--ba6b3f21-d818-4e7c-bfff-765805177512`, `indicator--7bff059e-6963-4b50-b901-4aba20ce1c01`",
     )
     post_id = CharFilter(
-        field_name="file__post_id",
+        method="filter_post_id",
         help_text="Filter the results to only contain objects present in the specified Post ID. Get a Post ID using the Feeds endpoints.",
     )
     value = CharFilter(
         method="filter_value",
-        help_text="Search within all extracted values using full-text search. This is the IoC or meaningful data extracted from the object. Search is wildcard. For example, `1.1` will return objects with values containing `1.1.1.1`, `2.1.1.2`, etc. Searches across all value fields for the object type.",
+        help_text=(
+            "Search within all extracted values. This is the IoC or meaningful data extracted from the object. Searches across all value fields for the object type. "
+            "Whole IP addresses, hashes and domains only match values equal to them, URLs and partial IPv4 addresses match values starting with them (e.g. `1.1` returns `1.1.1.1` and `1.10.0.1`, not `2.1.1.2`), and an IPv4 CIDR such as `10.0.0.0/8` returns the IPv4 addresses in that network. "
+            f"Anything else is a wildcard search, e.g. `wanna` returns `WannaCry`, and must be at least {MIN_CONTAINS_LENGTH} characters long."
+        ),
     )
     value_exact = BooleanFilter(
         method="filter_noop",
         help_text="Set to `true` to only return exact matches on the `value` field. Default behaviour is wildcard search.",
     )
     feed_id = CharFilter(
-        field_name="file__feed__feed_id",
+        method="filter_feed_id",
         help_text="Filter the results to only contain objects present in posts from the specified Feed ID. Get a Feed ID using the Feeds endpoints.",
     )
 
     def filter_value(self, queryset, name, value):
         """
-        Filter by value field, using exact or wildcard matching based on value_exact parameter.
+        Filter by value field, using exact matching if value_exact is set, or else
+        the lookup `plan_value_search` picks for the shape of the value.
         """
         if not value:
             return queryset
 
         # Check if value_exact is set to True
         value_exact = self.data.get("value_exact", "false").lower() == "true"
+        return queryset.filter(value_search_filter(value, exact=value_exact))
 
-        if value_exact:
-            return queryset.filter(values_list__contains=[value.lower()])
-        else:
-            return queryset.filter(values_concat__contains=value.lower())
+    def filter_post_id(self, queryset, name, value):
+        return queryset.filter(
+            stix_id__in=ObjectValue.objects.filter(file_id=value).values("stix_id")
+        )
+
+    def filter_feed_id(self, queryset, name, value):
+        return queryset.filter(
+            stix_id__in=ObjectValue.objects.filter(file__feed_id=value).values("stix_id")
+        )
 
     def filter_noop(self, queryset, name, value):
         """
@@ -105,9 +119,9 @@ class ObjectValueFilterSet(FilterSet):
     )
 )
 class BaseObjectValueView(mixins.ListModelMixin, viewsets.GenericViewSet):
-    """Base view for ObjectValue queries with common functionality."""
+    """Base view for ObjectSummary queries with common functionality."""
 
-    queryset = ObjectValue.objects.all()
+    queryset = ObjectSummary.objects.all()
     serializer_class = ObjectValueSerializer
     pagination_class = dsc_pagination.CompositeCursorPagination('values')
     filter_backends = [
@@ -129,11 +143,7 @@ class BaseObjectValueView(mixins.ListModelMixin, viewsets.GenericViewSet):
         if self.allowed_types:
             queryset = queryset.filter(type__in=self.allowed_types)
 
-        from django.db.models import F
         queryset = queryset.alias(value=F('values_sort'))
-        queryset = queryset.filter(
-            is_dupe=False
-        )
         return queryset
 
 
@@ -165,7 +175,7 @@ class BaseObjectValueView(mixins.ListModelMixin, viewsets.GenericViewSet):
             * `windows-registry-key.key`
             * `x509-certificate.subject`, `x509-certificate.issuer`, `x509-certificate.serial_number`
 
-            Results are deduplicated by `stix_id`, with all associated `post_id`s aggregated in the `matched_posts` field.
+            Results are deduplicated by `stix_id`. `matched_posts` is the number of posts the object was extracted from, `first_seen` and `last_seen` the publish dates of the oldest and newest of them. Sort by `matched_posts` or `last_seen` to find the most common or most recently seen objects.
             """
         ),
     ),
@@ -174,7 +184,14 @@ class SCOValueView(BaseObjectValueView):
     """View for STIX Cyber Observable Objects (SCOs) only."""
 
     allowed_types = list(sco_value_map.keys())
-    ordering_fields = ["value"]
+    ordering_fields = {
+        "value_descending": ("-value",),
+        "value_ascending": ("value",),
+        "matched_posts_descending": ("-post_count", "-stix_id"),
+        "matched_posts_ascending": ("post_count", "stix_id"),
+        "last_seen_descending": ("-last_seen", "-stix_id"),
+        "last_seen_ascending": ("last_seen", "stix_id"),
+    }
     ordering = "value_ascending"
 
     class filterset_class(ObjectValueFilterSet):
@@ -215,7 +232,7 @@ class SCOValueView(BaseObjectValueView):
             * `vulnerability.name`
             * MITRE ATT&CK objects: `x-mitre-analytic`, `x-mitre-asset`, `x-mitre-collection`, `x-mitre-data-component`, `x-mitre-data-source`, `x-mitre-detection-strategy`, `x-mitre-matrix`, `x-mitre-tactic`
 
-            Results are deduplicated by `stix_id`, with all associated `post_id`s aggregated in the `matched_posts` field.
+            Results are deduplicated by `stix_id`. `matched_posts` is the number of posts the object was extracted from, `first_seen` and `last_seen` the publish dates of the oldest and newest of them. Sort by `matched_posts` or `last_seen` to find the most common or most recently seen objects.
             """
         ),
     ),
@@ -225,12 +242,16 @@ class SDOValueView(BaseObjectValueView):
 
     allowed_types = list(sdo_value_map.keys())
     ordering_fields = {
-        "value_descending": "-value",
-        "value_ascending": "value",
-        "created_descending": ("-created", "-id"),
-        "created_ascending": ("created", "id"),
-        "modified_descending": ("-modified", "-id"),
-        "modified_ascending": ("modified", "id")
+        "value_descending": ("-value",),
+        "value_ascending": ("value",),
+        "created_descending": ("-created", "-stix_id"),
+        "created_ascending": ("created", "stix_id"),
+        "modified_descending": ("-modified", "-stix_id"),
+        "modified_ascending": ("modified", "stix_id"),
+        "matched_posts_descending": ("-post_count", "-stix_id"),
+        "matched_posts_ascending": ("post_count", "stix_id"),
+        "last_seen_descending": ("-last_seen", "-stix_id"),
+        "last_seen_ascending": ("last_seen", "stix_id"),
     }
     ordering = "modified_descending"
 
@@ -268,3 +289,27 @@ class SDOValueView(BaseObjectValueView):
                 ],
             )
             return queryset.filter(filter)
+
+
+class ValueLookupView(viewsets.ViewSet):
+    openapi_tags = ["Object Values"]
+
+    @extend_schema(
+        request=ValueLookupRequestSerializer,
+        responses={200: ValueLookupResponseSerializer, 400: api_schema.DEFAULT_400_ERROR},
+        summary="Look up many values at once",
+        description=textwrap.dedent(
+            """
+            Check a batch of observables (e.g. the IP addresses and hashes of a SIEM export) against all extracted values in one request, instead of one Search and filter STIX Cyber Observable Objects request with `value_exact=true` per value.
+
+            Each value is matched exactly (case-insensitive) against the values of all STIX Cyber Observable and Domain Objects, optionally only those of the given `types`. The response has one entry per distinct value, in the order they were sent, with the matching objects and the posts and feeds they were extracted from. Values without a match have no `matches`.
+
+            The response is streamed, so large lookups start returning straight away.
+            """
+        ),
+    )
+    def create(self, request, *args, **kwargs):
+        s = ValueLookupRequestSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+        results = lookup_values(s.validated_data["values"], s.validated_data.get("types"))
+        return StreamingHttpResponse(stream_json(results), content_type="application/json")
@@ -1,6 +1,7 @@
 from datetime import datetime
 from functools import lru_cache
 import logging
+import time
 import typing
 import uuid
 from django import forms
@@ -26,6 +27,7 @@ from .utils import (
     MinMaxDateFilter,
     Ordering,
     Pagination,
+    PostPagination,
     Response,
 )
 from django_filters.rest_framework import (
@@ -51,7 +53,7 @@ from . import models
 from .autoschema import ObstractsAutoSchema
 from .topics import TopicView
 
-from ..cjob import tasks
+from ..cjob import feed_lock, tasks
 from obstracts.server import serializers
 import textwrap
 
@@ -591,8 +593,21 @@ class PostOnlyView(h4f_views.PostOnlyView):
     openapi_tags = ["Posts (by ID)"]
     schema = ObstractsAutoSchema()
 
-    pagination_class = Pagination("posts")
+    pagination_class = PostPagination("posts")
     filter_backends = [DjangoFilterBackend, Ordering, MinMaxDateFilter]
+    ordering_fields = {
+        "pubdate_descending": ("-pubdate",),
+        "pubdate_ascending": ("pubdate",),
+        "title_descending": ("-title",),
+        "title_ascending": ("title",),
+        "datetime_updated_descending": ("-datetime_updated",),
+        "datetime_updated_ascending": ("datetime_updated",),
+        "datetime_added_descending": ("-datetime_added",),
+        "datetime_added_ascending": ("datetime_added",),
+        # posts without a threat score sort as the lowest, matching obstracts_file_threat_score_idx
+        "ai_threat_score_descending": (F("obstracts_post__ai_threat_score").desc(nulls_last=True), "-id"),
+        "ai_threat_score_ascending": (F("obstracts_post__ai_threat_score").asc(nulls_first=True), "id"),
+    }
     ordering = "pubdate_descending"
 
     class filterset_class(h4f_views.PostOnlyView.filterset_class):
@@ -634,7 +649,7 @@ class PostOnlyView(h4f_views.PostOnlyView):
             choices=[(c, c) for c in incident_classification_types],
         )
         min_confidence = IntegerFilter(
-            field_name="threat_score",
+            field_name="obstracts_post__ai_threat_score",
             lookup_expr="gte",
             help_text="If `ai_content_check_provider` set in Profile and the AI believes the post describes a security incident, then it will also assign a confidence score between 0 and 100. Use this filter to only include posts where the confidence score is above a certain threshold.",
         )
@@ -710,9 +725,6 @@ class PostOnlyView(h4f_views.PostOnlyView):
         queryset = queryset.annotate(
             last_job_id=db_models.Value(None, output_field=db_models.UUIDField()),
             job_state=db_models.Value(None, output_field=db_models.CharField()),
-            threat_score=F(
-                "obstracts_post__txt2stix_data__content_check__threat_score"
-            ),
         )
         return super().filter_queryset(queryset)
 
@@ -923,8 +935,44 @@ class PostOnlyView(h4f_views.PostOnlyView):
 
     @staticmethod
     def remove_report_objects(instance: models.File):
+        timings = PostOnlyView._remove_post_objects(instance)
+        logging.info("removed report objects for post %s: %s", instance.post_id, timings)
+        return timings
+
+    @staticmethod
+    def remove_stale_report_objects(instance: models.File, uploaded_keys: set[str]):
+        """
+        Remove the post's objects that the latest upload no longer contains.
+
+        `uploaded_keys` holds the `id;_record_md5_hash` of every object of the
+        upload. Stored objects with another key were either dropped from the
+        bundle or replaced by a changed version, so only they are removed.
+        Embedded relationships are kept while their source object is kept.
+
+        Stix2Arango still writes every object of the upload and recomputes
+        their `_is_latest`, this only saves removing and re-inserting them.
+        Nothing is removed if `uploaded_keys` is empty, as that means no
+        upload was recorded rather than an empty one.
+        """
+        if not uploaded_keys:
+            logging.warning("no uploaded objects recorded for post %s, keeping its stored objects", instance.post_id)
+            return None
+        timings = PostOnlyView._remove_post_objects(instance, keep_keys=uploaded_keys)
+        logging.info("removed stale report objects for post %s: %s", instance.post_id, timings)
+        return timings
+
+    @staticmethod
+    def _remove_post_objects(instance: models.File, keep_keys: set[str] | None = None):
+        """
+        Remove the post's objects from arangodb and its object values, except
+        the objects whose `id;_record_md5_hash` is in `keep_keys`, and
+        recompute the `_is_latest` of the other versions of removed objects.
+        """
         instance = models.File.objects.get(pk=instance.post_id)
-        instance.object_values.all().delete()
+        keep_keys = list(keep_keys or [])
+        instance.object_values.exclude(
+            stix_id__in={key.split(";", 1)[0] for key in keep_keys}
+        ).delete()
         db_service = ArangoDBService(
             settings.ARANGODB_DATABASE,
             [],
@@ -937,42 +985,68 @@ class PostOnlyView(h4f_views.PostOnlyView):
         helper = ArangoDBHelper(settings.VIEW_NAME, None)
         bind_vars = {
             "post_id": str(instance.post_id),
+            "keep_keys": keep_keys,
             "@vertex": instance.feed.vertex_collection,
             "@edge": instance.feed.edge_collection,
         }
+        # removed server side in one query, using the persistent _obstracts_post_id indexes
         query = """
+        LET kept = LENGTH(@keep_keys) == 0 ? [] : APPEND(
+            (
+                FOR dv IN @@vertex
+                FILTER dv._obstracts_post_id == @post_id AND CONCAT(dv.id, ";", dv._record_md5_hash) IN @keep_keys
+                RETURN dv._id
+            ),
+            (
+                FOR de IN @@edge
+                FILTER de._obstracts_post_id == @post_id AND CONCAT(de.id, ";", de._record_md5_hash) IN @keep_keys
+                RETURN de._id
+            )
+        )
+
         LET removed_edges = (
             FOR de IN @@edge
-            FILTER de._obstracts_post_id == @post_id
-            RETURN [de._key, de.id]
+            FILTER de._obstracts_post_id == @post_id AND CONCAT(de.id, ";", de._record_md5_hash) NOT IN @keep_keys
+            FILTER de._is_ref != TRUE OR de._from NOT IN kept
+            REMOVE de IN @@edge
+            RETURN OLD.id
         )
 
         LET removed_vertices = (
             FOR dv IN @@vertex
-            FILTER dv._obstracts_post_id == @post_id
-            RETURN [dv._key, dv.id]
+            FILTER dv._obstracts_post_id == @post_id AND CONCAT(dv.id, ";", dv._record_md5_hash) NOT IN @keep_keys
+            REMOVE dv IN @@vertex
+            RETURN OLD.id
         )
-        RETURN [removed_vertices, removed_edges]
+        RETURN [removed_vertices, removed_edges, LENGTH(kept)]
         """
-        removed_vertices, removed_edges = helper.execute_query(
+        started_at = time.monotonic()
+        removed_vertices, removed_edges, kept = helper.execute_query(
             query, bind_vars=bind_vars, paginate=False
         )[0]
+        removed_at = time.monotonic()
 
-        for collection, objects in [
+        for collection, removed_ids in [
             (instance.feed.vertex_collection, removed_vertices),
             (instance.feed.edge_collection, removed_edges),
         ]:
-            helper.db.collection(collection).delete_many(
-                [dict(_key=x[0]) for x in objects], silent=True
-            )
             db_service.update_is_latest_several_chunked(
-                [x[1] for x in objects],
+                removed_ids,
                 collection,
                 collection.removesuffix("_vertex_collection").removesuffix(
                     "_edge_collection"
                 )
                 + "_edge_collection",
             )
+        timings = dict(
+            removed_vertices=len(removed_vertices),
+            removed_edges=len(removed_edges),
+            remove_seconds=round(removed_at - started_at, 3),
+            update_is_latest_seconds=round(time.monotonic() - removed_at, 3),
+        )
+        if keep_keys:
+            timings.update(kept_objects=kept)
+        return timings
 
     def get_post_objects(self, post_id):
         post_file: models.File = self.get_obstracts_file()
@@ -1177,9 +1251,11 @@ class RSSView(h4f_views.RSSView):
         description=textwrap.dedent(
             """
             Using a Job ID you can retrieve information about its state via this endpoint. This is useful to see if a Job to get data is complete, how many posts were imported in the job, or if an error has occurred.
+
+            `processing_metrics` shows where the time went while processing the job's posts: the median (`p50`) and 95th percentile (`p95`) of the seconds spent in each stage, and of the database queries and ArangoDB requests made per post. It is `null` until the first post has been processed.
             """
         ),
-        responses={404: api_schema.DEFAULT_404_ERROR, 200: ObstractsJobSerializer},
+        responses={404: api_schema.DEFAULT_404_ERROR, 200: serializers.ObstractsJobDetailSerializer},
     ),
     cancel_job=extend_schema(
         summary="Kill a running Job that is performing extractions on Posts",
@@ -1201,6 +1277,16 @@ class RSSView(h4f_views.RSSView):
             404: api_schema.DEFAULT_404_ERROR,
         },
     ),
+    feed_locks=extend_schema(
+        summary="List feed locks",
+        description=textwrap.dedent(
+            """
+            Jobs for the same feed are processed one at a time. This endpoint lists, for every feed with processing jobs, the job currently holding the feed's lock and the jobs waiting for it in the order they will run.
+            """
+        ),
+        filters=False,
+        responses={200: serializers.FeedLockSerializer(many=True)},
+    ),
 )
 class JobView(
     mixins.RetrieveModelMixin,
@@ -1256,12 +1342,22 @@ class JobView(
     def get_queryset(self):
         return models.Job.objects
 
+    def get_serializer_class(self):
+        if self.action == "retrieve":
+            return serializers.ObstractsJobDetailSerializer
+        return super().get_serializer_class()
+
     @decorators.action(methods=["DELETE"], detail=True, url_path="kill")
     def cancel_job(self, request, *args, **kwargs):
         obj: models.Job = self.get_object()
         obj.cancel()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @decorators.action(methods=["GET"], detail=False, url_path="feed-locks", pagination_class=None)
+    def feed_locks(self, request, *args, **kwargs):
+        s = serializers.FeedLockSerializer(feed_lock.describe_locks(), many=True)
+        return Response(s.data)
+
 
 @extend_schema_view(
     update_vulnerabilities=extend_schema(
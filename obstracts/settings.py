@@ -73,6 +73,7 @@ PROJECT_APPS = [
 INSTALLED_APPS = CORE_APPS + OBSTRACTS_APPS + PROJECT_APPS
 
 MIDDLEWARE = [
+    "obstracts.server.metrics.RequestLatencyMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
 
@@ -276,6 +277,7 @@ ARANGODB_HOST_URL   = os.getenv("ARANGODB_HOST_URL")
 
 DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 50))
 MAXIMUM_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", DEFAULT_PAGE_SIZE*2))
+POST_EXACT_COUNT_LIMIT = int(os.getenv("POST_EXACT_COUNT_LIMIT", 10_000))  # post listings count exactly up to this many posts, and estimate larger counts
 
 
 HISTORY4FEED_SETTINGS = {
@@ -287,6 +289,11 @@ HISTORY4FEED_SETTINGS = {
 }
 PROCESSING_TIMEOUT_SECONDS = int(os.getenv("PROCESSING_TIMEOUT_SECONDS", 300))  # time limit for processing tasks
 MAX_FAILED_PROCESSES = int(os.getenv("MAX_FAILED_PROCESSES", 10))  # max number of failed processes before giving up on a task
+POST_PROCESSING_CONCURRENCY = max(1, int(os.getenv("POST_PROCESSING_CONCURRENCY", 1)))  # max number of posts of a single job processed at the same time
+FEED_LOCK_LEASE_SECONDS = int(os.getenv("FEED_LOCK_LEASE_SECONDS", 2 * PROCESSING_TIMEOUT_SECONDS))  # how long a job keeps its feed lock without a heartbeat
+JOB_HEARTBEAT_TIMEOUT_SECONDS = int(os.getenv("JOB_HEARTBEAT_TIMEOUT_SECONDS", 2 * PROCESSING_TIMEOUT_SECONDS))  # how long a processing job can go without a heartbeat before it is resumed on worker startup
+CELERY_METRICS_PORT = int(os.getenv("CELERY_METRICS_PORT") or 0)  # port the prometheus exporter of each celery worker listens on, 0 to disable
+PRIORITY_JOB_MAX_ITEMS = int(os.getenv("PRIORITY_JOB_MAX_ITEMS", 10))  # jobs with at most this many posts/pdfs are sent to the priority celery queues
 # stixifier settings
 STIXIFIER_NAMESPACE = uuid.UUID("a1f2e3ed-6241-5f05-ac2e-3394213b8e08")
 TXT2STIX_INCLUDE_URL = "https://github.com/muchdogesec/txt2stix/blob/obstracts/includes/"
@@ -297,9 +304,22 @@ if not GOOGLE_VISION_API_KEY:
 INPUT_TOKEN_LIMIT = int(os.environ["INPUT_TOKEN_LIMIT"])
 SRO_OBJECTS_ONLY_LATEST = os.getenv('SRO_OBJECTS_ONLY_LATEST', False)
 PDFSHIFT_API_KEY = os.getenv('PDFSHIFT_API_KEY')
+PDF_BACKEND = os.getenv("PDF_BACKEND", "obstracts.cjob.pdf.PDFShiftBackend")
+PDFSHIFT_API_URL = os.getenv("PDFSHIFT_API_URL", "https://api.pdfshift.io/v3/convert/pdf")
+PDF_RATE_LIMIT_PER_MINUTE = max(1, int(os.getenv("PDF_RATE_LIMIT_PER_MINUTE", 60)))  # conversions started per minute, shared by all workers
+PDF_RATE_LIMIT_BURST = int(os.getenv("PDF_RATE_LIMIT_BURST", 5))  # conversions that can start at once after an idle period
+PDF_MAX_IN_FLIGHT = max(1, int(os.getenv("PDF_MAX_IN_FLIGHT", 4)))  # conversions running at the same time, shared by all workers
+PDF_MAX_RETRIES = int(os.getenv("PDF_MAX_RETRIES", 3))  # retries of a conversion on 429s, server and connection errors
+PDF_RETRY_BACKOFF_SECONDS = float(os.getenv("PDF_RETRY_BACKOFF_SECONDS", 2))
+PDF_REQUEST_TIMEOUT_SECONDS = int(os.getenv("PDF_REQUEST_TIMEOUT_SECONDS", 60))
 
 CLASSIFIER_MIN_CLUSTER_SIZE = int(os.getenv("CLASSIFIER_MIN_CLUSTER_SIZE", 5))
 CLASSIFIER_LABEL_SAMPLE_SIZE = int(os.getenv("CLASSIFIER_LABEL_SAMPLE_SIZE", 10))
-CLASSIFIER_MODEL_PATH = os.getenv("CLASSIFIER_MODEL_PATH", os.path.join(BASE_DIR, "classifier_hdbscan.joblib"))
+CLASSIFIER_MODEL_PATH = os.getenv("CLASSIFIER_MODEL_PATH", os.path.join(BASE_DIR, "classifier_hdbscan.joblib"))  # model file of older versions, imported into the model store on first load
+CLASSIFIER_MODEL_KEEP_VERSIONS = max(1, int(os.getenv("CLASSIFIER_MODEL_KEEP_VERSIONS", 3)))  # saved clustering model versions kept in storage
 CLASSIFIER_CONCURRENCY = int(os.getenv("CLASSIFIER_CONCURRENCY", 12))
+CLASSIFIER_EMBEDDING_BATCH_SIZE = int(os.getenv("CLASSIFIER_EMBEDDING_BATCH_SIZE", 256))  # max number of inputs per embeddings request (provider limit is 2048)
+CLASSIFIER_EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("CLASSIFIER_EMBEDDING_BATCH_MAX_TOKENS", 250_000))  # approximate token budget per embeddings request (provider limit is 300k)
+CLASSIFIER_EMBEDDING_MAX_RETRIES = int(os.getenv("CLASSIFIER_EMBEDDING_MAX_RETRIES", 5))
+CLASSIFIER_REDUCTION_DIMENSIONS = int(os.getenv("CLASSIFIER_REDUCTION_DIMENSIONS", 0))  # PCA target dimensions before HDBSCAN, 0 clusters the raw embeddings
 CREATE_EMBEDDING_INCLUDE_NON_INCIDENT = bool(os.getenv("CREATE_EMBEDDING_INCLUDE_NON_INCIDENT", False))
@@ -21,6 +21,7 @@ from django.conf.urls.static import static
 from obstracts.server.values import views as values
 from obstracts.server.identities import IdentityView
 from obstracts.server.statistics import StatisticsView
+from obstracts.server.metrics import metrics_view
 from .server import views
 from rest_framework import routers, response
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
@@ -65,6 +66,7 @@ regex_router.register('objects/sdos', arango_views.SDOView, "object-view-sdo")
 ## values
 regex_router.register('values/scos', values.SCOValueView, "value-view-sco")
 regex_router.register('values/sdos', values.SDOValueView, "value-view-sdo")
+regex_router.register('values/lookup', values.ValueLookupView, "value-lookup-view")
 
 ## statistics
 regex_router.register('statistics', StatisticsView, "statistics-view")
@@ -77,6 +79,7 @@ healthcheck.register('', views.HealthCheck, "service-status-view")
 
 urlpatterns = [
     path(f'api/healthcheck/', include(healthcheck.urls)),
+    path('api/metrics/', metrics_view, name='metrics'),
     path(f'api/{API_VERSION}/', include(router.urls)),
     path(f'api/{API_VERSION}/', include(regex_router.urls)),
     path('admin/', admin.site.urls),
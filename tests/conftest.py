@@ -12,6 +12,8 @@ import pytest
 from obstracts.cjob.tasks import create_job_entry
 from obstracts.server import models
 from history4feed.app import models as h4f_models
+from obstracts.classifier.models import Cluster, DocumentEmbedding
+from tests.utils import CLUSTER_1_ID, CLUSTER_2_ID, CLUSTER_HIDDEN_ID, POST1_ID, POST2_ID
 from django.utils import timezone
 
 
@@ -146,6 +148,63 @@ def make_feed(feed_id, profile=None):
     return feed
 
 
+# 512-dimensional unit vectors
+VEC1 = [1.0] + [0.0] * 511
+VEC2 = [0.0, 1.0] + [0.0] * 510
+
+
+@pytest.fixture
+def posts_with_clusters(feed_with_posts):
+    """Attach DocumentEmbeddings and two Clusters to the first two posts."""
+    file1 = models.File.objects.get(post_id=POST1_ID)
+    file2 = models.File.objects.get(post_id=POST2_ID)
+
+    emb1 = DocumentEmbedding.objects.create(
+        id=POST1_ID, text="Iran cyber ops text", embedding=VEC1
+    )
+    emb2 = DocumentEmbedding.objects.create(
+        id=POST2_ID, text="Ransomware overview text", embedding=VEC2
+    )
+
+    file1.embedding = emb1
+    file1.save(update_fields=["embedding"])
+    file2.embedding = emb2
+    file2.save(update_fields=["embedding"])
+
+    # cluster1 contains both posts; cluster2 contains only post2
+    cluster1 = Cluster.objects.create(
+        id=CLUSTER_1_ID,
+        label="Iran Cyber Threats",
+        description="Iran-aligned cyber operations",
+    )
+    cluster1.members.set([emb1, emb2])
+
+
+    # cluster1 contains both posts; cluster2 contains only post2
+    cluster1_but_hidden = Cluster.objects.create(
+        id=CLUSTER_HIDDEN_ID,
+        label="",
+        description="Iran-aligned cyber operations",
+    )
+    cluster1_but_hidden.members.set([emb1, emb2])
+
+    cluster2 = Cluster.objects.create(
+        id=CLUSTER_2_ID,
+        label="Ransomware Campaigns",
+        description="Ransomware activity overview",
+    )
+    cluster2.members.set([emb2])
+
+    return dict(
+        feed=feed_with_posts,
+        emb1=emb1,
+        emb2=emb2,
+        cluster1=cluster1,
+        cluster2=cluster2,
+        cluster_hidden=cluster1_but_hidden,
+    )
+
+
 @pytest.fixture
 def feeds():
     return [
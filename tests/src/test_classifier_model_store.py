@@ -0,0 +1,98 @@
+import os
+from unittest.mock import patch
+
+import joblib
+import pytest
+
+from obstracts.classifier import model_store
+from obstracts.classifier.models import ClusteringModel
+
+
+@pytest.fixture(autouse=True)
+def model_storage(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    settings.CLASSIFIER_MODEL_PATH = str(tmp_path / "classifier_hdbscan.joblib")
+    model_store._cached = (None, None)
+    yield
+    model_store._cached = (None, None)
+
+
+@pytest.mark.django_db
+def test_load_model_without_saved_model():
+    assert model_store.has_model() is False
+    assert model_store.current_version() is None
+    assert model_store.load_model() is None
+
+
+@pytest.mark.django_db
+def test_save_model_creates_new_version():
+    first = model_store.save_model({"label_to_cluster_id": {0: "a"}})
+    second = model_store.save_model({"label_to_cluster_id": {0: "b"}})
+
+    assert first.pk != second.pk
+    assert model_store.has_model() is True
+    assert model_store.current_version() == second.pk
+    assert second.file.name.startswith("classifier/models/")
+
+
+@pytest.mark.django_db
+def test_load_model_uses_cache_for_current_version():
+    payload = {"label_to_cluster_id": {0: "a"}}
+    model_store.save_model(payload)
+
+    with patch("obstracts.classifier.model_store.joblib.load") as mock_load:
+        assert model_store.load_model() is payload
+    mock_load.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_load_model_reads_storage_when_version_changed():
+    model_store.save_model({"label_to_cluster_id": {0: "a"}})
+    # another worker saved a newer version
+    model_store._cached = (None, None)
+
+    loaded = model_store.load_model()
+
+    assert loaded == {"label_to_cluster_id": {0: "a"}}
+    assert model_store._cached[0] == model_store.current_version()
+    with patch("obstracts.classifier.model_store.joblib.load") as mock_load:
+        assert model_store.load_model() is loaded
+    mock_load.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_save_model_keeps_latest_versions(settings):
+    settings.CLASSIFIER_MODEL_KEEP_VERSIONS = 2
+    artifacts = [model_store.save_model({"n": n}) for n in range(4)]
+
+    assert set(ClusteringModel.objects.values_list("pk", flat=True)) == {
+        artifacts[2].pk,
+        artifacts[3].pk,
+    }
+
+
+@pytest.mark.django_db
+def test_delete_models():
+    model_store.save_model({"n": 1})
+
+    model_store.delete_models()
+
+    assert not ClusteringModel.objects.exists()
+    assert model_store._cached == (None, None)
+    assert model_store.load_model() is None
+
+
+@pytest.mark.django_db
+def test_load_model_imports_legacy_model_file(settings):
+    path = settings.CLASSIFIER_MODEL_PATH
+    joblib.dump({"label_to_cluster_id": {0: "a"}}, path)
+
+    assert model_store.has_model() is True
+    assert model_store.load_model() == {"label_to_cluster_id": {0: "a"}}
+    assert ClusteringModel.objects.count() == 1
+    assert not os.path.exists(path)
+    assert os.path.exists(path + ".imported")
+
+    # not imported again once the saved versions are deleted
+    model_store.delete_models()
+    assert model_store.has_model() is False
@@ -2,7 +2,9 @@ import uuid
 from datetime import timedelta
 from unittest.mock import MagicMock, patch, call
 
+import httpx
 import numpy as np
+import openai
 import pytest
 from django.utils import timezone
 
@@ -12,9 +14,15 @@ from obstracts.classifier.tasks import (
     _label_clusters,
     _run_full_clustering,
     _run_incremental_clustering,
+    _pack_embedding_batches,
+    assign_to_cluster,
     compute_embedding_for_document,
+    compute_embeddings_for_documents,
     create_embedding_text,
+    fit_reducer,
+    load_embeddings,
     new_cluster,
+    reduce_embeddings,
     run_clustering,
 )
 import obstracts.classifier.tasks
@@ -89,7 +97,7 @@ def test_compute_embedding_saves_vector(embeddings):
     emb1.refresh_from_db()
     assert emb1.embedding is not None
     mock_client.embeddings.create.assert_called_once_with(
-        input=emb1.text, model="text-embedding-3-small", dimensions=512
+        input=[emb1.text], model="text-embedding-3-small", dimensions=512
     )
 
 
@@ -112,6 +120,150 @@ def test_compute_embedding_reraises_openai_error(embeddings):
             compute_embedding_for_document(emb1)
 
 
+def _bad_request(message="bad input"):
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+    return openai.BadRequestError(message, response=response, body=None)
+
+
+def _embeddings_response(*vectors):
+    return MagicMock(data=[MagicMock(embedding=vec) for vec in vectors])
+
+
+@pytest.mark.django_db
+def test_compute_embeddings_for_documents_batches_requests(embeddings):
+    emb1, emb2, emb3 = embeddings
+    DocumentEmbedding.objects.update(embedding=None)
+    mock_client = MagicMock()
+    mock_client.embeddings.create.side_effect = [
+        _embeddings_response(VEC3, VEC2),
+        _embeddings_response(VEC1),
+    ]
+
+    with patch("obstracts.classifier.tasks._openai_client", return_value=mock_client):
+        failures = compute_embeddings_for_documents([emb3, emb2, emb1], batch_size=2)
+
+    assert failures == {}
+    mock_client.embeddings.create.assert_has_calls(
+        [
+            call(input=[emb3.text, emb2.text], model="text-embedding-3-small", dimensions=512),
+            call(input=[emb1.text], model="text-embedding-3-small", dimensions=512),
+        ]
+    )
+    for emb, vec in [(emb1, VEC1), (emb2, VEC2), (emb3, VEC3)]:
+        emb.refresh_from_db()
+        assert list(emb.embedding) == vec
+
+
+@pytest.mark.django_db
+def test_compute_embeddings_for_documents_isolates_rejected_input(embeddings):
+    emb1, emb2, _ = embeddings
+    DocumentEmbedding.objects.update(embedding=None)
+    mock_client = MagicMock()
+    mock_client.embeddings.create.side_effect = [
+        _bad_request(),
+        _embeddings_response(VEC1),
+        _bad_request("input too long"),
+    ]
+
+    with patch("obstracts.classifier.tasks._openai_client", return_value=mock_client):
+        failures = compute_embeddings_for_documents([emb1, emb2])
+
+    assert list(failures) == [emb2.pk]
+    assert "input too long" in failures[emb2.pk]
+    emb1.refresh_from_db()
+    emb2.refresh_from_db()
+    assert list(emb1.embedding) == VEC1
+    assert emb2.embedding is None
+
+
+@pytest.mark.django_db
+def test_compute_embeddings_for_documents_retries_transient_errors(embeddings):
+    emb1, _, _ = embeddings
+    mock_client = MagicMock()
+    mock_client.embeddings.create.side_effect = [
+        openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/embeddings")),
+        _embeddings_response(VEC2),
+    ]
+
+    with (
+        patch("obstracts.classifier.tasks._openai_client", return_value=mock_client),
+        patch("obstracts.classifier.tasks.time.sleep") as mock_sleep,
+    ):
+        failures = compute_embeddings_for_documents([emb1])
+
+    assert failures == {}
+    assert mock_client.embeddings.create.call_count == 2
+    mock_sleep.assert_called_once()
+    emb1.refresh_from_db()
+    assert list(emb1.embedding) == VEC2
+
+
+@pytest.mark.django_db
+def test_compute_embeddings_for_documents_skips_up_to_date(embeddings):
+    emb1, _, _ = embeddings
+    emb1.content_hash = DocumentEmbedding.compute_content_hash(emb1.text)
+    emb1.save(update_fields=["content_hash"])
+    mock_client = MagicMock()
+
+    with patch("obstracts.classifier.tasks._openai_client", return_value=mock_client):
+        assert compute_embeddings_for_documents([emb1]) == {}
+        compute_embedding_for_document(emb1)
+
+    mock_client.embeddings.create.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_compute_embeddings_for_documents_recomputes_changed_text(embeddings):
+    emb1, _, _ = embeddings
+    emb1.content_hash = DocumentEmbedding.compute_content_hash(emb1.text)
+    emb1.text = "Article about malware campaigns, updated"
+    emb1.save(update_fields=["text", "content_hash"])
+    mock_client = MagicMock()
+    mock_client.embeddings.create.return_value = _embeddings_response(VEC2)
+
+    with patch("obstracts.classifier.tasks._openai_client", return_value=mock_client):
+        compute_embeddings_for_documents([emb1])
+
+    mock_client.embeddings.create.assert_called_once()
+    emb1.refresh_from_db()
+    assert list(emb1.embedding) == VEC2
+    assert emb1.content_hash == DocumentEmbedding.compute_content_hash(emb1.text)
+
+
+@pytest.mark.django_db
+def test_compute_embeddings_for_documents_shares_identical_texts(embeddings):
+    emb1, _, _ = embeddings
+    emb1.content_hash = DocumentEmbedding.compute_content_hash(emb1.text)
+    emb1.save(update_fields=["content_hash"])
+    same_as_emb1 = DocumentEmbedding.objects.create(text=emb1.text)
+    new_a = DocumentEmbedding.objects.create(text="Brand new text")
+    new_b = DocumentEmbedding.objects.create(text="Brand new text")
+    mock_client = MagicMock()
+    mock_client.embeddings.create.return_value = _embeddings_response(VEC3)
+
+    with patch("obstracts.classifier.tasks._openai_client", return_value=mock_client):
+        assert compute_embeddings_for_documents([same_as_emb1, new_a, new_b]) == {}
+
+    mock_client.embeddings.create.assert_called_once_with(
+        input=["Brand new text"], model="text-embedding-3-small", dimensions=512
+    )
+    same_as_emb1.refresh_from_db()
+    new_a.refresh_from_db()
+    new_b.refresh_from_db()
+    assert list(same_as_emb1.embedding) == VEC1
+    assert list(new_a.embedding) == VEC3
+    assert list(new_b.embedding) == VEC3
+
+
+def test_pack_embedding_batches_respects_token_budget():
+    docs = [DocumentEmbedding(text="x" * 30) for _ in range(5)]
+    batches = list(_pack_embedding_batches(docs, batch_size=10, max_batch_tokens=25))
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+
+    batches = list(_pack_embedding_batches(docs, batch_size=3, max_batch_tokens=1000))
+    assert [len(batch) for batch in batches] == [3, 2]
+
+
 # ── new_cluster ────────────────────────────────────────────────────────────────
 
 
@@ -204,45 +356,42 @@ def test_label_clusters_handles_per_cluster_error_gracefully(embeddings):
 
 
 @pytest.mark.django_db
-def test_run_full_clustering_skips_when_no_embeddings(tmp_path):
-    model_path = str(tmp_path / "model.joblib")
-    with patch("obstracts.classifier.tasks.joblib.dump") as mock_dump:
-        _run_full_clustering(model_path, min_cluster_size=2, workers=2)
-    mock_dump.assert_not_called()
+def test_run_full_clustering_skips_when_no_embeddings():
+    with patch("obstracts.classifier.tasks.model_store.save_model") as mock_save:
+        _run_full_clustering(min_cluster_size=2, workers=2)
+    mock_save.assert_not_called()
 
 
 @pytest.mark.django_db
-def test_run_full_clustering_creates_clusters_and_saves_model(embeddings, tmp_path):
-    model_path = str(tmp_path / "model.joblib")
+def test_run_full_clustering_creates_clusters_and_saves_model(embeddings):
     mock_clusterer = MagicMock()
     mock_clusterer.fit_predict.return_value = np.array([0, 0, 1])
 
     with (
         patch("obstracts.classifier.tasks.hdbscan.HDBSCAN", return_value=mock_clusterer),
         patch("obstracts.classifier.tasks._label_clusters"),
-        patch("obstracts.classifier.tasks.joblib.dump") as mock_dump,
+        patch("obstracts.classifier.tasks.model_store.save_model") as mock_save,
     ):
-        _run_full_clustering(model_path, min_cluster_size=2, workers=2)
+        _run_full_clustering(min_cluster_size=2, workers=2)
 
     assert Cluster.objects.count() == 2
-    mock_dump.assert_called_once()
-    saved = mock_dump.call_args[0][0]
+    mock_save.assert_called_once()
+    saved = mock_save.call_args[0][0]
     assert "clusterer" in saved
     assert set(saved["label_to_cluster_id"].keys()) == {0, 1}
 
 
 @pytest.mark.django_db
-def test_run_full_clustering_calls_label_clusters_with_new_clusters(embeddings, tmp_path):
-    model_path = str(tmp_path / "model.joblib")
+def test_run_full_clustering_calls_label_clusters_with_new_clusters(embeddings):
     mock_clusterer = MagicMock()
     mock_clusterer.fit_predict.return_value = np.array([0, 0, 1])
 
     with (
         patch("obstracts.classifier.tasks.hdbscan.HDBSCAN", return_value=mock_clusterer),
         patch("obstracts.classifier.tasks._label_clusters") as mock_label,
-        patch("obstracts.classifier.tasks.joblib.dump"),
+        patch("obstracts.classifier.tasks.model_store.save_model"),
     ):
-        _run_full_clustering(model_path, min_cluster_size=2, workers=2)
+        _run_full_clustering(min_cluster_size=2, workers=2)
 
     mock_label.assert_called_once()
     clusters_arg, workers_arg, cancel_arg = mock_label.call_args[0]
@@ -252,8 +401,7 @@ def test_run_full_clustering_calls_label_clusters_with_new_clusters(embeddings,
 
 
 @pytest.mark.django_db
-def test_run_full_clustering_deletes_old_clusters(embeddings, tmp_path):
-    model_path = str(tmp_path / "model.joblib")
+def test_run_full_clustering_deletes_old_clusters(embeddings):
     old_cluster = Cluster.objects.create(label="old")
     mock_clusterer = MagicMock()
     mock_clusterer.fit_predict.return_value = np.array([0, 0, 1])
@@ -261,52 +409,101 @@ def test_run_full_clustering_deletes_old_clusters(embeddings, tmp_path):
     with (
         patch("obstracts.classifier.tasks.hdbscan.HDBSCAN", return_value=mock_clusterer),
         patch("obstracts.classifier.tasks._label_clusters"),
-        patch("obstracts.classifier.tasks.joblib.dump"),
+        patch("obstracts.classifier.tasks.model_store.save_model"),
     ):
-        _run_full_clustering(model_path, min_cluster_size=2, workers=2)
+        _run_full_clustering(min_cluster_size=2, workers=2)
 
     assert not Cluster.objects.filter(pk=old_cluster.pk).exists()
 
 
 @pytest.mark.django_db
-def test_run_full_clustering_noise_label_ignored(embeddings, tmp_path):
-    model_path = str(tmp_path / "model.joblib")
+def test_run_full_clustering_noise_label_ignored(embeddings):
     mock_clusterer = MagicMock()
     mock_clusterer.fit_predict.return_value = np.array([-1, -1, -1])
 
     with (
         patch("obstracts.classifier.tasks.hdbscan.HDBSCAN", return_value=mock_clusterer),
         patch("obstracts.classifier.tasks._label_clusters"),
-        patch("obstracts.classifier.tasks.joblib.dump") as mock_dump,
+        patch("obstracts.classifier.tasks.model_store.save_model") as mock_save,
     ):
-        _run_full_clustering(model_path, min_cluster_size=2, workers=2)
+        _run_full_clustering(min_cluster_size=2, workers=2)
 
     assert Cluster.objects.count() == 0
-    saved = mock_dump.call_args[0][0]
+    saved = mock_save.call_args[0][0]
     assert saved["label_to_cluster_id"] == {}
 
 
+@pytest.mark.django_db
+def test_run_full_clustering_reduces_dimensions_before_fit(embeddings):
+    mock_clusterer = MagicMock()
+    mock_clusterer.fit_predict.return_value = np.array([0, 0, 1])
+
+    with (
+        patch("obstracts.classifier.tasks.hdbscan.HDBSCAN", return_value=mock_clusterer),
+        patch("obstracts.classifier.tasks._label_clusters"),
+        patch("obstracts.classifier.tasks.model_store.save_model") as mock_save,
+    ):
+        metrics = _run_full_clustering(
+            min_cluster_size=2, workers=2, reduction_dimensions=2
+        )
+
+    assert mock_clusterer.fit_predict.call_args[0][0].shape == (3, 2)
+    saved = mock_save.call_args[0][0]
+    assert saved["reducer"].n_components_ == 2
+    assert metrics["dimensions"] == 2
+    assert metrics["fit_seconds"] >= 0
+
+
+@pytest.mark.django_db
+def test_run_full_clustering_without_reduction_saves_no_reducer(embeddings):
+    mock_clusterer = MagicMock()
+    mock_clusterer.fit_predict.return_value = np.array([0, 0, 1])
+
+    with (
+        patch("obstracts.classifier.tasks.hdbscan.HDBSCAN", return_value=mock_clusterer),
+        patch("obstracts.classifier.tasks._label_clusters"),
+        patch("obstracts.classifier.tasks.model_store.save_model") as mock_save,
+    ):
+        _run_full_clustering(min_cluster_size=2, workers=2, reduction_dimensions=0)
+
+    assert mock_clusterer.fit_predict.call_args[0][0].shape == (3, 512)
+    assert mock_save.call_args[0][0]["reducer"] is None
+
+
+def test_fit_reducer_disabled_or_not_reducing():
+    X = np.random.default_rng(0).random((10, 8), dtype=np.float32)
+    assert fit_reducer(X, 0) is None
+    assert fit_reducer(X, 8) is None
+    assert reduce_embeddings(None, X) is X
+
+
+def test_fit_reducer_caps_components_at_sample_count():
+    X = np.random.default_rng(0).random((4, 8), dtype=np.float32)
+    reducer = fit_reducer(X, 6)
+    reduced = reduce_embeddings(reducer, X)
+    assert reduced.shape == (4, 4)
+    assert reduced.dtype == np.float32
+
+
 # ── _run_incremental_clustering ───────────────────────────────────────────────
 
 
 @pytest.mark.django_db
-def test_run_incremental_skips_when_no_new_embeddings(tmp_path):
-    model_path = str(tmp_path / "model.joblib")
+def test_run_incremental_skips_when_no_new_embeddings():
     # Cluster created in the future → its created_at > any embedding's updated_at
     future = timezone.now() + timedelta(hours=1)
     Cluster.objects.create(label="existing", created_at=future)
     DocumentEmbedding.objects.create(id=EMB1_ID, text="old text", embedding=VEC1)
 
-    with patch("obstracts.classifier.tasks.joblib.load") as mock_load:
-        _run_incremental_clustering(model_path, workers=2)
+    with patch("obstracts.classifier.tasks.model_store.load_model") as mock_load:
+        _run_incremental_clustering(workers=2)
 
     mock_load.assert_not_called()
 
 
 @pytest.mark.django_db
-def test_run_incremental_adds_members_to_existing_clusters(embeddings, tmp_path):
+def test_run_incremental_adds_members_to_existing_clusters(embeddings):
     emb1, emb2, emb3 = embeddings
-    model_path = str(tmp_path / "model.joblib")
 
     # Cluster created in the past → all embeddings are "new"
     cluster_id = str(uuid.uuid4())
@@ -319,26 +516,25 @@ def test_run_incremental_adds_members_to_existing_clusters(embeddings, tmp_path)
     }
 
     with (
-        patch("obstracts.classifier.tasks.joblib.load", return_value=saved_model),
+        patch("obstracts.classifier.tasks.model_store.load_model", return_value=saved_model),
         patch(
             "obstracts.classifier.tasks.hdbscan.approximate_predict",
             return_value=(np.array([0, 0, 0]), None),
         ),
-        patch("obstracts.classifier.tasks.joblib.dump") as mock_dump,
+        patch("obstracts.classifier.tasks.model_store.save_model") as mock_save,
         patch("obstracts.classifier.tasks._label_clusters"),
     ):
-        _run_incremental_clustering(model_path, workers=2)
+        _run_incremental_clustering(workers=2)
 
     cluster = Cluster.objects.get(pk=cluster_id)
     assert cluster.members.count() == 3
-    # No new clusters were created → joblib not re-saved
-    mock_dump.assert_not_called()
+    # No new clusters were created → model not re-saved
+    mock_save.assert_not_called()
 
 
 @pytest.mark.django_db
-def test_run_incremental_creates_new_cluster_for_unknown_label(embeddings, tmp_path):
+def test_run_incremental_creates_new_cluster_for_unknown_label(embeddings):
     emb1, emb2, emb3 = embeddings
-    model_path = str(tmp_path / "model.joblib")
 
     cluster_id = str(uuid.uuid4())
     past = timezone.now() - timedelta(hours=1)
@@ -350,21 +546,21 @@ def test_run_incremental_creates_new_cluster_for_unknown_label(embeddings, tmp_p
     }
 
     with (
-        patch("obstracts.classifier.tasks.joblib.load", return_value=saved_model),
+        patch("obstracts.classifier.tasks.model_store.load_model", return_value=saved_model),
         # emb1 → existing cluster 0; emb2 + emb3 → new label 1
         patch(
             "obstracts.classifier.tasks.hdbscan.approximate_predict",
             return_value=(np.array([0, 1, 1]), None),
         ),
-        patch("obstracts.classifier.tasks.joblib.dump") as mock_dump,
+        patch("obstracts.classifier.tasks.model_store.save_model") as mock_save,
         patch("obstracts.classifier.tasks._label_clusters") as mock_label,
     ):
-        _run_incremental_clustering(model_path, workers=2)
+        _run_incremental_clustering(workers=2)
 
     assert Cluster.objects.count() == 2
-    # Joblib updated with new label→uuid mapping
-    mock_dump.assert_called_once()
-    updated_model = mock_dump.call_args[0][0]
+    # New model version saved with new label→uuid mapping
+    mock_save.assert_called_once()
+    updated_model = mock_save.call_args[0][0]
     assert 1 in updated_model["label_to_cluster_id"]
     # Only the new cluster is labelled
     mock_label.assert_called_once()
@@ -373,71 +569,217 @@ def test_run_incremental_creates_new_cluster_for_unknown_label(embeddings, tmp_p
 
 
 @pytest.mark.django_db
-def test_run_incremental_skips_noise_embeddings(embeddings, tmp_path):
+def test_run_incremental_applies_saved_reducer(embeddings):
+    X = np.array([VEC1, VEC2, VEC3], dtype=np.float32)
+    reducer = fit_reducer(X, 2)
+    saved_model = {"clusterer": MagicMock(), "reducer": reducer, "label_to_cluster_id": {}}
+
+    with (
+        patch("obstracts.classifier.tasks.model_store.load_model", return_value=saved_model),
+        patch(
+            "obstracts.classifier.tasks.hdbscan.approximate_predict",
+            return_value=(np.array([0, 0, 0]), None),
+        ) as mock_predict,
+        patch("obstracts.classifier.tasks.model_store.save_model") as mock_save,
+        patch("obstracts.classifier.tasks._label_clusters"),
+    ):
+        _run_incremental_clustering(workers=2)
+
+    np.testing.assert_allclose(mock_predict.call_args[0][1], reducer.transform(X), atol=1e-6)
+    assert mock_save.call_args[0][0]["reducer"] is reducer
+
+
+@pytest.mark.django_db
+def test_run_incremental_skips_noise_embeddings(embeddings):
     emb1, emb2, emb3 = embeddings
-    model_path = str(tmp_path / "model.joblib")
 
     saved_model = {"clusterer": MagicMock(), "label_to_cluster_id": {}}
 
     with (
-        patch("obstracts.classifier.tasks.joblib.load", return_value=saved_model),
+        patch("obstracts.classifier.tasks.model_store.load_model", return_value=saved_model),
         patch(
             "obstracts.classifier.tasks.hdbscan.approximate_predict",
             return_value=(np.array([-1, -1, -1]), None),
         ),
-        patch("obstracts.classifier.tasks.joblib.dump") as mock_dump,
+        patch("obstracts.classifier.tasks.model_store.save_model") as mock_save,
     ):
-        _run_incremental_clustering(model_path, workers=2)
+        _run_incremental_clustering(workers=2)
 
     assert Cluster.objects.count() == 0
-    mock_dump.assert_not_called()
+    mock_save.assert_not_called()
 
 
-# ── run_clustering dispatch ────────────────────────────────────────────────────
+@pytest.mark.django_db
+def test_load_embeddings_streams_into_float32_matrix(embeddings, monkeypatch):
+    monkeypatch.setattr(obstracts.classifier.tasks, "EMBEDDING_LOAD_CHUNK_SIZE", 2)
+    DocumentEmbedding.objects.create(text="no embedding yet")
+    qs = DocumentEmbedding.objects.exclude(embedding__isnull=True)
+
+    X, ids, metrics = load_embeddings(qs)
+
+    assert X.dtype == np.float32
+    assert X.shape == (3, 512)
+    assert list(ids) == [EMB1_ID, EMB2_ID, EMB3_ID]
+    np.testing.assert_array_equal(X, np.array([VEC1, VEC2, VEC3], dtype=np.float32))
+    assert metrics["documents"] == 3
+    assert metrics["load_seconds"] >= 0
+    assert metrics["load_peak_memory_bytes"] >= X.nbytes
+
+
+@pytest.mark.django_db
+def test_load_embeddings_empty_queryset():
+    X, ids, metrics = load_embeddings(DocumentEmbedding.objects.all())
+    assert X.shape == (0, 512)
+    assert len(ids) == 0
+    assert metrics["documents"] == 0
+
+
+@pytest.mark.django_db
+def test_run_incremental_skips_embeddings_already_assigned(embeddings):
+    emb1, emb2, emb3 = embeddings
+    DocumentEmbedding.objects.filter(pk__in=[EMB1_ID, EMB2_ID]).update(
+        clustered_at=timezone.now() + timedelta(minutes=1)
+    )
+    saved_model = {"clusterer": MagicMock(), "label_to_cluster_id": {}}
+
+    with (
+        patch("obstracts.classifier.tasks.model_store.load_model", return_value=saved_model),
+        patch(
+            "obstracts.classifier.tasks.hdbscan.approximate_predict",
+            return_value=(np.array([-1]), None),
+        ) as mock_predict,
+    ):
+        metrics = _run_incremental_clustering(workers=2)
+
+    assert mock_predict.call_args[0][1].shape == (1, 512)
+    assert metrics["documents"] == 1
+    emb3.refresh_from_db()
+    assert emb3.clustered_at is not None
+
+
+# ── assign_to_cluster ─────────────────────────────────────────────────────────
+
+
+@pytest.mark.django_db
+def test_assign_to_cluster_adds_document_to_cluster(embeddings):
+    emb1, _, _ = embeddings
+    cluster = Cluster.objects.create(label="Malware")
+    saved_model = {"clusterer": MagicMock(), "label_to_cluster_id": {3: str(cluster.pk)}}
+
+    with (
+        patch("obstracts.classifier.tasks.model_store.load_model", return_value=saved_model),
+        patch(
+            "obstracts.classifier.tasks.hdbscan.approximate_predict",
+            return_value=(np.array([3]), None),
+        ) as mock_predict,
+    ):
+        assert assign_to_cluster(emb1) == cluster
+
+    assert mock_predict.call_args[0][1].shape == (1, 512)
+    assert list(cluster.members.all()) == [emb1]
+    emb1.refresh_from_db()
+    assert emb1.clustered_at is not None
+
+
+@pytest.mark.django_db
+def test_assign_to_cluster_applies_saved_reducer(embeddings):
+    emb1, _, _ = embeddings
+    reducer = MagicMock()
+    reducer.transform.return_value = np.zeros((1, 2))
+    saved_model = {"clusterer": MagicMock(), "reducer": reducer, "label_to_cluster_id": {}}
+
+    with (
+        patch("obstracts.classifier.tasks.model_store.load_model", return_value=saved_model),
+        patch(
+            "obstracts.classifier.tasks.hdbscan.approximate_predict",
+            return_value=(np.array([-1]), None),
+        ) as mock_predict,
+    ):
+        assert assign_to_cluster(emb1) is None
+
+    assert mock_predict.call_args[0][1].shape == (1, 2)
+    # noise is final for this model, the sweep does not need to retry it
+    emb1.refresh_from_db()
+    assert emb1.clustered_at is not None
+
+
+@pytest.mark.django_db
+def test_assign_to_cluster_without_model(embeddings):
+    emb1, _, _ = embeddings
+    with (
+        patch("obstracts.classifier.tasks.model_store.load_model", return_value=None),
+        patch("obstracts.classifier.tasks.hdbscan.approximate_predict") as mock_predict,
+    ):
+        assert assign_to_cluster(emb1) is None
+    mock_predict.assert_not_called()
+    emb1.refresh_from_db()
+    assert emb1.clustered_at is None
+
+
+@pytest.mark.django_db
+def test_assign_to_cluster_leaves_unknown_label_to_sweep(embeddings):
+    emb1, _, _ = embeddings
+    saved_model = {"clusterer": MagicMock(), "label_to_cluster_id": {}}
+
+    with (
+        patch("obstracts.classifier.tasks.model_store.load_model", return_value=saved_model),
+        patch(
+            "obstracts.classifier.tasks.hdbscan.approximate_predict",
+            return_value=(np.array([7]), None),
+        ),
+    ):
+        assert assign_to_cluster(emb1) is None
+
+    assert Cluster.objects.count() == 0
+    emb1.refresh_from_db()
+    assert emb1.clustered_at is None
 
 
 @pytest.mark.django_db
-def test_run_clustering_dispatches_full_when_no_model(tmp_path):
-    model_path = str(tmp_path / "model.joblib")
+def test_assign_to_cluster_skips_already_assigned(embeddings):
+    emb1, _, _ = embeddings
+    emb1.clustered_at = timezone.now() + timedelta(minutes=1)
+    with patch("obstracts.classifier.tasks.model_store.load_model") as mock_load:
+        assert assign_to_cluster(emb1) is None
+    mock_load.assert_not_called()
+
 
+# ── run_clustering dispatch ────────────────────────────────────────────────────
+
+
+@pytest.mark.django_db
+def test_run_clustering_dispatches_full_when_no_model():
     with (
-        patch("obstracts.classifier.tasks.settings.CLASSIFIER_MODEL_PATH", model_path),
         patch("obstracts.classifier.tasks._run_full_clustering") as mock_full,
         patch("obstracts.classifier.tasks._run_incremental_clustering") as mock_inc,
     ):
         run_clustering(min_cluster_size=5, force=False, workers=2)
 
-    mock_full.assert_called_once_with(model_path, 5, 2, None)
+    mock_full.assert_called_once_with(5, 2, None)
     mock_inc.assert_not_called()
 
 
 @pytest.mark.django_db
-def test_run_clustering_dispatches_incremental_when_model_exists(tmp_path):
-    model_path = str(tmp_path / "model.joblib")
-    open(model_path, "w").close()
-
+def test_run_clustering_dispatches_incremental_when_model_exists():
     with (
-        patch("obstracts.classifier.tasks.settings.CLASSIFIER_MODEL_PATH", model_path),
+        patch("obstracts.classifier.tasks.model_store.has_model", return_value=True),
         patch("obstracts.classifier.tasks._run_full_clustering") as mock_full,
         patch("obstracts.classifier.tasks._run_incremental_clustering") as mock_inc,
     ):
         run_clustering(min_cluster_size=5, force=False, workers=2)
 
-    mock_inc.assert_called_once_with(model_path, 2, None)
+    mock_inc.assert_called_once_with(2, None)
     mock_full.assert_not_called()
 
 
 @pytest.mark.django_db
-def test_run_clustering_force_dispatches_full_even_with_existing_model(tmp_path):
-    model_path = str(tmp_path / "model.joblib")
-    open(model_path, "w").close()
-
+def test_run_clustering_force_dispatches_full_even_with_existing_model():
     with (
-        patch("obstracts.classifier.tasks.settings.CLASSIFIER_MODEL_PATH", model_path),
+        patch("obstracts.classifier.tasks.model_store.has_model", return_value=True),
         patch("obstracts.classifier.tasks._run_full_clustering") as mock_full,
         patch("obstracts.classifier.tasks._run_incremental_clustering") as mock_inc,
     ):
         run_clustering(min_cluster_size=5, force=True, workers=2)
 
-    mock_full.assert_called_once_with(model_path, 5, 2, None)
+    mock_full.assert_called_once_with(5, 2, None)
     mock_inc.assert_not_called()
@@ -0,0 +1,140 @@
+from datetime import timedelta
+import uuid
+from unittest.mock import patch
+
+import pytest
+from django.utils import timezone
+
+from obstracts.cjob import feed_lock
+from obstracts.server import models
+
+
+def make_job(feed, **kwargs):
+    return models.Job.objects.create(
+        id=uuid.uuid4(),
+        feed=feed,
+        type=models.JobType.REPROCESS_POSTS,
+        state=models.JobState.QUEUED,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def jobs(feed_with_posts):
+    return [make_job(feed_with_posts) for _ in range(3)]
+
+
+@pytest.fixture
+def mock_resume():
+    with patch("obstracts.cjob.feed_lock._resume") as mock_resume:
+        yield mock_resume
+
+
+@pytest.mark.django_db(transaction=True)
+def test_acquire_queues_jobs_in_order(jobs, mock_resume):
+    assert feed_lock.acquire(jobs[0], continuation=[{"task": "first"}]) is True
+    assert feed_lock.acquire(jobs[1], continuation=[{"task": "second"}]) is False
+    assert feed_lock.acquire(jobs[2], continuation=[{"task": "third"}]) is False
+
+    holder = models.FeedLock.objects.get(job=jobs[0])
+    assert holder.is_holder
+    assert holder.continuation is None
+    assert holder.lease_expires_at > timezone.now()
+    assert list(
+        models.FeedLock.objects.filter(acquired_at__isnull=True).values_list("job_id", flat=True)
+    ) == [jobs[1].pk, jobs[2].pk]
+    mock_resume.assert_not_called()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_release_resumes_next_waiter(jobs, mock_resume):
+    feed_lock.acquire(jobs[0])
+    feed_lock.acquire(jobs[1], continuation=[{"task": "second"}])
+    feed_lock.acquire(jobs[2], continuation=[{"task": "third"}])
+
+    assert feed_lock.release(jobs[0]) is True
+
+    assert models.FeedLock.objects.get(job=jobs[1]).is_holder
+    assert not models.FeedLock.objects.get(job=jobs[2]).is_holder
+    mock_resume.assert_called_once_with(jobs[1].pk, [{"task": "second"}])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_release_by_non_holder(jobs, mock_resume):
+    feed_lock.acquire(jobs[0])
+    feed_lock.acquire(jobs[1], continuation=[{"task": "second"}])
+
+    # a waiter giving up leaves the holder alone
+    assert feed_lock.release(jobs[1]) is True
+    assert feed_lock.release(jobs[2]) is False
+    assert list(models.FeedLock.objects.values_list("job_id", flat=True)) == [jobs[0].pk]
+    mock_resume.assert_not_called()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_renew(jobs):
+    feed_lock.acquire(jobs[0])
+    feed_lock.acquire(jobs[1])
+    models.FeedLock.objects.filter(job=jobs[0]).update(lease_expires_at=timezone.now())
+
+    assert feed_lock.renew(jobs[0]) is True
+    assert feed_lock.renew(jobs[1]) is False
+    assert models.FeedLock.objects.get(job=jobs[0]).lease_expires_at > timezone.now() + timedelta(seconds=60)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_expired_lease_is_handed_over(jobs, mock_resume):
+    feed_lock.acquire(jobs[0])
+    feed_lock.acquire(jobs[1], continuation=[{"task": "second"}])
+    models.FeedLock.objects.filter(job=jobs[0]).update(
+        lease_expires_at=timezone.now() - timedelta(seconds=1)
+    )
+
+    assert feed_lock.release_expired() == 1
+
+    assert models.FeedLock.objects.get(job=jobs[1]).is_holder
+    assert not models.FeedLock.objects.filter(job=jobs[0]).exists()
+    assert models.Job.objects.get(pk=jobs[0].pk).errors == ["feed lock lease expired"]
+    mock_resume.assert_called_once_with(jobs[1].pk, [{"task": "second"}])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_expired_lease_kept_while_heartbeating(jobs, mock_resume):
+    feed_lock.acquire(jobs[0])
+    feed_lock.acquire(jobs[1], continuation=[{"task": "second"}])
+    models.FeedLock.objects.filter(job=jobs[0]).update(
+        lease_expires_at=timezone.now() - timedelta(seconds=1)
+    )
+    jobs[0].heartbeat("worker-1")
+
+    assert feed_lock.release_expired() == 0
+    assert feed_lock.acquire(jobs[2]) is False
+
+    assert models.FeedLock.objects.get(job=jobs[0]).is_holder
+    mock_resume.assert_not_called()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_acquire_takes_over_expired_lease(jobs, mock_resume):
+    feed_lock.acquire(jobs[0])
+    models.FeedLock.objects.filter(job=jobs[0]).update(
+        lease_expires_at=timezone.now() - timedelta(seconds=1)
+    )
+
+    assert feed_lock.acquire(jobs[1]) is True
+    mock_resume.assert_not_called()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_describe_locks(jobs, feed_with_posts):
+    feed_lock.acquire(jobs[0])
+    feed_lock.acquire(jobs[1])
+    feed_lock.acquire(jobs[2])
+
+    (lock,) = feed_lock.describe_locks()
+    assert lock["feed_id"] == feed_with_posts.pk
+    assert lock["holder"]["job_id"] == jobs[0].pk
+    assert [(w["job_id"], w["position"]) for w in lock["waiting"]] == [
+        (jobs[1].pk, 1),
+        (jobs[2].pk, 2),
+    ]
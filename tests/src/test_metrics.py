@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+import pytest
+from prometheus_client import REGISTRY
+
+from obstracts.server import metrics
+
+
+def sample(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0
+
+
+@pytest.mark.django_db
+def test_metrics_view(client, obstracts_job):
+    with patch.object(metrics.StateCollector, "_celery_queues", return_value=[]):
+        resp = client.get("/api/metrics/")
+    assert resp.status_code == 200
+    body = resp.content.decode()
+    assert 'obstracts_jobs{state="retrieving",type="feed_index"} 1.0' in body
+    assert 'obstracts_job_oldest_age_seconds{state="retrieving"}' in body
+    assert "obstracts_feed_lock_waiting_jobs 0.0" in body
+    assert "# TYPE obstracts_post_processing_seconds histogram" in body
+
+
+@pytest.mark.django_db
+def test_metrics_view__collector_failure_does_not_fail_scrape(client):
+    with (
+        patch.object(metrics.StateCollector, "_celery_queues", side_effect=ConnectionError),
+        patch.object(metrics.StateCollector, "_jobs", side_effect=RuntimeError),
+    ):
+        resp = client.get("/api/metrics/")
+    assert resp.status_code == 200
+    assert "obstracts_feed_lock_waiting_jobs" in resp.content.decode()
+
+
+@pytest.mark.django_db
+def test_request_latency_middleware(client):
+    labels = dict(view="service-status-view-list", method="GET", status="204")
+    before = sample("obstracts_http_request_seconds_count", labels)
+    client.get("/api/healthcheck/")
+    assert sample("obstracts_http_request_seconds_count", labels) == before + 1
+
+
+@pytest.mark.django_db
+def test_process_post_counts_posts(obstracts_job):
+    from obstracts.cjob.tasks import process_post
+
+    labels = dict(
+        feed_id=str(obstracts_job.feed_id),
+        profile_id=str(obstracts_job.profile_id),
+        status="failed",
+    )
+    before = sample("obstracts_posts_processed_total", labels)
+    with (
+        patch("obstracts.cjob.tasks.feed_lock.renew", return_value=True),
+        patch("obstracts.cjob.tasks.StixifyProcessor", side_effect=ValueError),
+        patch("obstracts.cjob.tasks.add_pdf_to_post.run"),
+    ):
+        process_post.si(obstracts_job.id, "72e1ad04-8ce9-413d-b620-fe7c75dc0a39").delay()
+    assert sample("obstracts_posts_processed_total", labels) == before + 1
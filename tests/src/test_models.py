@@ -1,8 +1,10 @@
+import uuid
 from unittest.mock import patch
 
 from django.conf import settings
 import pytest
 from obstracts.server import models
+from obstracts.classifier.models import DocumentEmbedding
 from obstracts.server.models import JobState
 from history4feed.app import models as h4f_models
 from datetime import datetime as dt
@@ -109,6 +111,14 @@ def test_create_collection():
             break
     else:
         raise AssertionError("identity not uploaded")
+    for collection in [feed.vertex_collection, feed.edge_collection]:
+        indexed_fields = [
+            index["fields"]
+            for index in helper.db.collection(collection).indexes()
+            if index["type"] == "persistent"
+        ]
+        assert ["_obstracts_post_id"] in indexed_fields
+        assert ["_stixify_report_id"] in indexed_fields
 
 
 @pytest.mark.django_db
@@ -293,6 +303,21 @@ def test_file_create_embedding_defaults_to_false_for_non_incident(feed_with_post
     mock_compute.assert_not_called()
 
 
+@pytest.mark.django_db
+def test_file_create_embedding_force_updates_changed_text(feed_with_posts):
+    file = models.File.objects.filter(feed=feed_with_posts).first()
+    file.ai_describes_incident = True
+    file.embedding = DocumentEmbedding.objects.create(id=file.pk, text="stale text")
+    file.save(update_fields=["ai_describes_incident", "embedding"])
+
+    with patch("obstracts.server.models.compute_embedding_for_document") as mock_compute:
+        file.create_embedding(force=True)
+
+    file.embedding.refresh_from_db()
+    assert file.embedding.text == file.embedding_text
+    mock_compute.assert_called_once_with(file.embedding)
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "original_state, new_state, expected_state, has_completion_time",
@@ -324,3 +349,80 @@ def test_update_state_behavior(
         assert obstracts_job.completion_time is not None
     else:
         assert obstracts_job.completion_time is None
+
+
+@pytest.mark.django_db
+def test_job_record_progress(obstracts_job):
+    stale_job = models.Job.objects.get(pk=obstracts_job.pk)
+    obstracts_job.record_progress(processed=2, error="first error")
+    stale_job.record_progress(failed=1, error="second error")
+    stale_job.record_progress()
+
+    obstracts_job.refresh_progress()
+    assert obstracts_job.processed_items == 2
+    assert obstracts_job.failed_processes == 1
+    assert obstracts_job.errors == ["first error", "second error"]
+
+
+@pytest.mark.django_db
+def test_job_record_progress__truncates_long_errors(obstracts_job):
+    obstracts_job.record_progress(error="x" * 2000)
+    obstracts_job.refresh_progress()
+    assert obstracts_job.errors == ["x" * 1024]
+
+
+@pytest.mark.django_db
+def test_post_processing_metrics_summarize(obstracts_job):
+    assert models.PostProcessingMetrics.summarize(obstracts_job.post_metrics.all()) is None
+    for i in range(1, 11):
+        models.PostProcessingMetrics.objects.create(
+            job=obstracts_job,
+            post_id=uuid.uuid4(),
+            succeeded=i != 10,
+            total_seconds=i * 10,
+            stages=dict(markdown=i, extraction=i * 5) if i % 2 else dict(extraction=i * 5),
+            db_queries=i,
+            arango_requests=2 * i,
+        )
+    summary = models.PostProcessingMetrics.summarize(obstracts_job.post_metrics.all())
+    assert summary["posts"] == 10
+    assert summary["failed"] == 1
+    assert summary["total_seconds"] == pytest.approx(dict(p50=55.0, p95=95.5))
+    assert summary["db_queries"] == pytest.approx(dict(p50=5.5, p95=9.55))
+    assert summary["arango_requests"] == pytest.approx(dict(p50=11.0, p95=19.1))
+    assert summary["stages"]["extraction"] == pytest.approx(dict(posts=10, p50=27.5, p95=47.75))
+    assert summary["stages"]["markdown"] == pytest.approx(dict(posts=5, p50=5.0, p95=8.6))
+
+
+from tests.utils import POST1_ID, POST2_ID  # noqa: E402
+
+
+@pytest.mark.django_db
+def test_file_similar_posts_single_query(posts_with_clusters, django_assert_num_queries):
+    file = models.File.objects.select_related("embedding").get(pk=POST1_ID)
+
+    with django_assert_num_queries(1):
+        similar = file.similar_posts
+
+    assert [s["post_id"] for s in similar] == [POST2_ID]
+    match = similar[0]
+    post2 = h4f_models.Post.objects.get(pk=POST2_ID)
+    assert match["similarity_score"] == pytest.approx(0.0)
+    assert match["shared_topics"] == ["", "Iran Cyber Threats"]
+    assert match["feed_id"] == models.File.objects.get(pk=POST2_ID).feed_id
+    assert match["post_title"] == post2.title
+    assert match["pubdate"] == post2.pubdate
+
+
+@pytest.mark.django_db
+def test_file_similar_posts_cached_until_clusters_change(posts_with_clusters, django_assert_num_queries):
+    file = models.File.objects.select_related("embedding").get(pk=POST1_ID)
+    first = file.similar_posts
+
+    with django_assert_num_queries(0):
+        assert file.similar_posts == first
+
+    posts_with_clusters["cluster1"].members.remove(posts_with_clusters["emb2"])
+
+    with django_assert_num_queries(1):
+        assert file.similar_posts[0]["shared_topics"] == [""]
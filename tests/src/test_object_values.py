@@ -0,0 +1,128 @@
+from datetime import UTC, datetime
+
+import pytest
+from history4feed.app.models import Post
+
+from obstracts.server.models import ObjectSummary, ObjectSummaryFeed, ObjectValue
+from obstracts.server.values.values import ingest_object_values
+
+POST1_ID = "561ed102-7584-4b7d-a302-43d4bca5605b"
+POST2_ID = "345c8d0b-c6ca-4419-b1f7-0daeb4e9278b"
+POST3_ID = "72e1ad04-8ce9-413d-b620-fe7c75dc0a39"
+
+
+def make_row(stix_id, file_id, **values):
+    return dict(
+        stix_id=stix_id,
+        type=stix_id.split("--")[0],
+        knowledgebase=None,
+        values=values or dict(value="example.com"),
+        file_id=file_id,
+        created="2024-01-01T00:00:00.000Z",
+        modified=None,
+    )
+
+
+@pytest.mark.django_db
+def test_ingest_object_values_creates_rows(feed_with_posts):
+    result = ingest_object_values(
+        [
+            make_row("domain-name--1", POST1_ID),
+            make_row("domain-name--2", POST1_ID, value="tab\tnew\nline \\ slash"),
+        ]
+    )
+
+    assert result == (2, 0)
+    assert ObjectValue.objects.filter(file_id=POST1_ID).count() == 2
+    ov = ObjectValue.objects.get(stix_id="domain-name--2")
+    assert ov.values == dict(value="tab\tnew\nline \\ slash")
+    assert ov.knowledgebase is None
+    assert ov.modified is None
+    assert ov.created.year == 2024
+
+
+@pytest.mark.django_db
+def test_ingest_object_values_summarises_each_stix_id(feed_with_posts):
+    ingest_object_values([make_row("domain-name--1", POST1_ID), make_row("domain-name--2", POST1_ID)])
+
+    result = ingest_object_values([make_row("domain-name--1", POST2_ID, value="newer.example.com")])
+
+    assert result == (1, 0)
+    summary = ObjectSummary.objects.get(stix_id="domain-name--1")
+    assert summary.post_count == 2
+    assert summary.feed_count == 1
+    assert (summary.first_seen.day, summary.last_seen.day) == (1, 2)
+    assert summary.values == dict(value="newer.example.com"), "values of the latest post are canonical"
+    assert ObjectSummary.objects.get(stix_id="domain-name--2").post_count == 1
+
+
+@pytest.mark.django_db
+def test_object_summary_follows_deletes_and_pubdate(feed_with_posts):
+    ingest_object_values([make_row("domain-name--1", POST1_ID, value="old.example.com")])
+    ingest_object_values([make_row("domain-name--1", POST2_ID)])
+
+    Post.objects.filter(id=POST1_ID).update(pubdate=datetime(2021, 1, 1, tzinfo=UTC))
+    summary = ObjectSummary.objects.get(stix_id="domain-name--1")
+    assert summary.values == dict(value="old.example.com")
+    assert summary.last_seen.year == 2021
+
+    ObjectValue.objects.filter(file_id=POST1_ID).delete()
+    summary.refresh_from_db()
+    assert (summary.post_count, summary.values) == (1, dict(value="example.com"))
+
+    ObjectValue.objects.filter(file_id=POST2_ID).delete()
+    assert not ObjectSummary.objects.filter(stix_id="domain-name--1").exists()
+
+
+@pytest.mark.django_db
+def test_object_summary_moved_by_changes(feed_with_posts):
+    for post_id in [POST1_ID, POST2_ID, POST3_ID]:
+        ingest_object_values([make_row("domain-name--1", post_id, value=f"{post_id}.example.com")])
+    summary = ObjectSummary.objects.get(stix_id="domain-name--1")
+    canonical = ObjectValue.objects.get(stix_id="domain-name--1", file_id=POST3_ID)
+    assert (summary.post_count, summary.feed_count, summary.canonical_id) == (3, 1, canonical.id)
+    assert ObjectSummaryFeed.objects.get(stix_id="domain-name--1").post_count == 3
+
+    ObjectValue.objects.filter(file_id=POST2_ID).delete()
+    summary.refresh_from_db()
+    assert (summary.post_count, summary.first_seen.day, summary.last_seen.day) == (2, 1, 3)
+    assert summary.values == dict(value=f"{POST3_ID}.example.com")
+    assert ObjectSummaryFeed.objects.get(stix_id="domain-name--1").post_count == 2
+
+    ingest_object_values([make_row("domain-name--1", POST1_ID, value="older.example.com")])
+    ingest_object_values([make_row("domain-name--1", POST3_ID, value="newer.example.com")])
+    summary.refresh_from_db()
+    assert summary.values == dict(value="newer.example.com"), "only the canonical value is shown"
+
+    ObjectValue.objects.filter(file_id=POST3_ID).delete()
+    summary.refresh_from_db()
+    assert (summary.post_count, summary.feed_count, summary.last_seen.day) == (1, 1, 1)
+    assert summary.values == dict(value="older.example.com"), "rebuilt when the canonical value goes"
+
+    ObjectValue.objects.filter(file_id=POST1_ID).delete()
+    assert not ObjectSummary.objects.filter(stix_id="domain-name--1").exists()
+    assert not ObjectSummaryFeed.objects.filter(stix_id="domain-name--1").exists()
+
+
+@pytest.mark.django_db
+def test_ingest_object_values_only_rewrites_changed_rows(feed_with_posts):
+    ingest_object_values([make_row("domain-name--1", POST1_ID), make_row("domain-name--2", POST1_ID)])
+
+    result = ingest_object_values(
+        [
+            make_row("domain-name--1", POST1_ID),
+            make_row("domain-name--2", POST1_ID, value="changed.example.com"),
+        ]
+    )
+
+    assert result == (0, 1)
+    assert ObjectValue.objects.get(stix_id="domain-name--1").values == dict(value="example.com")
+    assert ObjectValue.objects.get(stix_id="domain-name--2").values == dict(value="changed.example.com")
+
+
+@pytest.mark.django_db
+def test_ingest_object_values_same_object_twice(feed_with_posts):
+    result = ingest_object_values([make_row("domain-name--1", POST1_ID), make_row("domain-name--1", POST1_ID)])
+
+    assert result == (1, 0)
+    assert ObjectValue.objects.filter(stix_id="domain-name--1").count() == 1
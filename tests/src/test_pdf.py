@@ -0,0 +1,134 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from obstracts.cjob import pdf
+
+
+@pytest.fixture(autouse=True)
+def local_limits():
+    with (
+        patch.object(pdf._LocalLimits, "tokens", None),
+        patch.object(pdf._LocalLimits, "in_flight", 0),
+    ):
+        pdf.get_backend.cache_clear()
+        yield pdf._LocalLimits
+        pdf.get_backend.cache_clear()
+
+
+def test_take_token__burst_then_wait(local_limits):
+    assert [local_limits.take_token(1, 3) for _ in range(3)] == [0, 0, 0]
+    assert 0 < local_limits.take_token(1, 3) <= 1
+
+
+def test_in_flight_slot__bounded(settings):
+    settings.PDF_MAX_IN_FLIGHT = 1
+    with pdf.in_flight_slot():
+        assert pdf._LocalLimits.acquire_slot(1) is False
+    assert pdf._LocalLimits.in_flight == 0
+
+
+def test_in_flight_slot__released_on_error():
+    with pytest.raises(ValueError):
+        with pdf.in_flight_slot():
+            raise ValueError
+    assert pdf._LocalLimits.in_flight == 0
+
+
+def test_wait_for_token__sleeps_when_empty(settings):
+    settings.PDF_RATE_LIMIT_PER_MINUTE = 60
+    settings.PDF_RATE_LIMIT_BURST = 1
+    with patch("obstracts.cjob.pdf.time.sleep") as mock_sleep:
+        pdf.wait_for_token()
+        mock_sleep.assert_not_called()
+        with patch.object(pdf._LocalLimits, "take_token", side_effect=[0.5, 0]):
+            pdf.wait_for_token()
+        mock_sleep.assert_called_once_with(0.5)
+
+
+def test_get_backend__from_settings(settings):
+    settings.PDF_BACKEND = "obstracts.cjob.pdf.PDFShiftBackend"
+    settings.PDFSHIFT_API_URL = "http://localhost:8090/v3/convert/pdf"
+    backend = pdf.get_backend()
+    assert isinstance(backend, pdf.PDFShiftBackend)
+    assert backend.url == "http://localhost:8090/v3/convert/pdf"
+    assert pdf.get_backend() is backend, "backend and its session are reused"
+    adapter = backend.session.get_adapter(backend.url)
+    assert adapter.max_retries.total == 0, "retried by convert(), not urllib3"
+
+
+@pytest.mark.parametrize(
+    "status,retry_after,expected_retry_after",
+    [
+        (429, "7", 7.0),
+        (503, None, None),
+        (429, "Wed, 21 Oct 2026 07:28:00 GMT", None),
+    ],
+)
+def test_pdfshift_backend__retryable_statuses(settings, status, retry_after, expected_retry_after):
+    settings.PDFSHIFT_API_URL = "http://localhost:8090/v3/convert/pdf"
+    backend = pdf.PDFShiftBackend()
+    response = MagicMock(status_code=status, ok=False, headers={"Retry-After": retry_after})
+    with (
+        patch.object(backend.session, "post", return_value=response),
+        pytest.raises(pdf.RetryableConversionError) as exc_info,
+    ):
+        backend.convert({})
+    assert exc_info.value.retry_after == expected_retry_after
+
+
+def test_retry_delay(settings):
+    settings.PDF_RETRY_BACKOFF_SECONDS = 2
+    assert [pdf.retry_delay(attempt) for attempt in range(3)] == [2, 4, 8]
+    assert pdf.retry_delay(0, retry_after=5) == 5
+    assert pdf.retry_delay(20) == pdf.RETRY_DELAY_MAX_SECONDS
+    assert pdf.retry_delay(0, retry_after=3600) == pdf.RETRY_DELAY_MAX_SECONDS
+
+
+def test_convert__uses_backend():
+    backend = MagicMock()
+    backend.convert.return_value = b"%PDF"
+    with patch("obstracts.cjob.pdf.get_backend", return_value=backend):
+        assert pdf.convert({"source": "https://example.com"}) == b"%PDF"
+    backend.convert.assert_called_once_with({"source": "https://example.com"})
+    assert pdf._LocalLimits.in_flight == 0
+
+
+def test_convert__retries_outside_slot(settings):
+    settings.PDF_MAX_RETRIES = 2
+    settings.PDF_RETRY_BACKOFF_SECONDS = 1
+    backend = MagicMock()
+    backend.convert.side_effect = [
+        pdf.RetryableConversionError("429", retry_after=5),
+        pdf.RetryableConversionError("503"),
+        b"%PDF",
+    ]
+    in_flight_while_sleeping = []
+    with (
+        patch("obstracts.cjob.pdf.get_backend", return_value=backend),
+        patch("obstracts.cjob.pdf.wait_for_token") as mock_wait_for_token,
+        patch(
+            "obstracts.cjob.pdf.time.sleep",
+            side_effect=lambda _: in_flight_while_sleeping.append(pdf._LocalLimits.in_flight),
+        ) as mock_sleep,
+    ):
+        assert pdf.convert({}) == b"%PDF"
+    assert [c.args for c in mock_sleep.call_args_list] == [(5,), (2,)]
+    assert in_flight_while_sleeping == [0, 0], "backoff must not hold a slot"
+    assert mock_wait_for_token.call_count == 3, "every attempt is rate limited"
+    assert pdf._LocalLimits.in_flight == 0
+
+
+def test_convert__gives_up_after_max_retries(settings):
+    settings.PDF_MAX_RETRIES = 1
+    backend = MagicMock()
+    backend.convert.side_effect = pdf.RetryableConversionError("503")
+    with (
+        patch("obstracts.cjob.pdf.get_backend", return_value=backend),
+        patch("obstracts.cjob.pdf.time.sleep") as mock_sleep,
+        pytest.raises(pdf.RetryableConversionError),
+    ):
+        pdf.convert({})
+    assert backend.convert.call_count == 2
+    mock_sleep.assert_called_once()
+    assert pdf._LocalLimits.in_flight == 0
@@ -1,13 +1,21 @@
+from datetime import timedelta
 import io
-from unittest.mock import ANY, MagicMock, patch, call
+import time
+from unittest.mock import MagicMock, patch, call
 import pytest
 import uuid
 from celery.exceptions import SoftTimeLimitExceeded, TimeLimitExceeded
+from django.utils import timezone
 from obstracts.cjob.tasks import (
     add_pdf_to_post,
     build_topic_clusters,
     create_pdf_reindex_job,
+    job_completed_with_error,
     download_pdf,
+    JobHeartbeat,
+    fail_orphaned_jobs,
+    lane_completed,
+    mark_old_jobs_as_failed,
     ProcessPostRequest,
     process_post,
     process_post_hard_timeout,
@@ -16,14 +24,20 @@ from obstracts.cjob.tasks import (
     run_topic_embeddings_job,
     start_processing,
     reindex_pdf_for_post,
+    resume_from_checkpoint,
+    resume_orphaned_jobs,
+    unconsumed_queues,
+    update_knowledgebase,
     wait_in_queue,
 )
+from obstracts.cjob import queues
 from obstracts.server import models
 from obstracts.classifier.models import DocumentEmbedding
 import obstracts.classifier.tasks as classifier_tasks
 from history4feed.app import models as h4f_models
 
 from obstracts.server.views import PostOnlyView
+from obstracts.server.values.values import record_uploaded_objects_hook
 from txt2stix.txt2stix import Txt2StixData
 
 
@@ -37,36 +51,99 @@ def celery_eager():
     app.conf.task_always_eager = False
 
 
+@pytest.fixture(autouse=True)
+def feed_lock_held():
+    # posts are only processed by jobs that still hold their feed lock
+    with patch("obstracts.cjob.tasks.feed_lock.renew", return_value=True) as mock_renew:
+        yield mock_renew
+
+
 @pytest.mark.django_db
 def test_wait_in_queue_already_cancelled(obstracts_job):
     obstracts_job.cancel()
     with (
-        patch("obstracts.cjob.tasks.queue_lock", return_value=True) as mock_queue_lock,
+        patch("obstracts.cjob.tasks.feed_lock.acquire", return_value=True) as mock_acquire,
     ):
         result = wait_in_queue.si(obstracts_job.id).delay()
         obstracts_job.refresh_from_db()
         assert result.get() == False, obstracts_job.errors
-        mock_queue_lock.assert_not_called()
+        mock_acquire.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_wait_in_queue_takes_feed_lock(obstracts_job):
+    result = wait_in_queue.si(obstracts_job.id).delay()
+    obstracts_job.refresh_from_db()
+    assert result.get() == True
+    assert obstracts_job.state == models.JobState.PROCESSING
+    assert models.FeedLock.objects.get(job=obstracts_job).is_holder
+
+
+@pytest.mark.django_db
+def test_wait_in_queue_parks_chain_while_feed_locked(obstracts_job):
+    continuation = [{"task": "obstracts.cjob.tasks.job_completed_with_error"}]
+    wait_in_queue.push_request(chain=list(continuation))
+    try:
+        with patch("obstracts.cjob.tasks.feed_lock.acquire", return_value=False) as mock_acquire:
+            assert wait_in_queue.run(obstracts_job.id) == False
+        # the chain stops here and is resumed when the lock is released
+        assert wait_in_queue.request.chain is None
+    finally:
+        wait_in_queue.pop_request()
+    mock_acquire.assert_called_once_with(obstracts_job, continuation=continuation)
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.state != models.JobState.PROCESSING
+
+
+@pytest.mark.django_db
+def test_job_completed_with_error_releases_feed_lock(obstracts_job):
+    with patch("obstracts.cjob.tasks.feed_lock.release") as mock_release:
+        job_completed_with_error(obstracts_job.id)
+    mock_release.assert_called_once_with(obstracts_job)
 
 
 @pytest.mark.django_db
-def test_wait_in_queue_retries_until_queue_no_longer_locked(obstracts_job):
+def test_start_processing(obstracts_job):
+    obstracts_job.update_state(models.JobState.PROCESSING)
+    post_ids = []
+    for post in obstracts_job.feed.feed.posts.all():
+        h4f_models.FulltextJob.objects.create(
+            post_id=post.id,
+            job_id=obstracts_job.id,
+            status=h4f_models.FullTextState.RETRIEVED,
+        )
+        post_ids.append(str(post.id))
+
     with (
+        patch("obstracts.cjob.tasks.wait_in_queue.run") as mock_wait_in_queue,
+        patch("obstracts.cjob.tasks.process_post.run") as mock_process_post,
         patch(
-            "obstracts.cjob.tasks.queue_lock",
-            side_effect=[False, False, True],
-        ) as mock_queue_lock,
+            "obstracts.cjob.tasks.job_completed_with_error.run"
+        ) as mock_job_completed_with_error,
+        patch("celery.result.assert_will_not_block"),
     ):
-        result = wait_in_queue.si(obstracts_job.id).delay()
-        obstracts_job.refresh_from_db()
-        assert result.get() == True
-        assert obstracts_job.state == models.JobState.PROCESSING
-        mock_queue_lock.assert_called()
-        assert len(mock_queue_lock.call_args_list) == 3
+        start_processing.si(obstracts_job.id).delay()
+        mock_wait_in_queue.assert_called_once_with(job_id=obstracts_job.id)
+        mock_process_post.assert_has_calls(
+            [
+                call(
+                    job_id=obstracts_job.id,
+                    post_id=post_id,
+                    profile_id=None,
+                    post_ids=post_ids,
+                    post_index=index,
+                    profile_ids=[None] * len(post_ids),
+                )
+                for index, post_id in enumerate(post_ids)
+            ],
+            any_order=True,
+        )
+        mock_job_completed_with_error.assert_called_once_with(job_id=obstracts_job.id)
 
 
 @pytest.mark.django_db
-def test_start_processing(obstracts_job):
+def test_start_processing__parallel(obstracts_job, settings):
+    settings.POST_PROCESSING_CONCURRENCY = 2
     obstracts_job.update_state(models.JobState.PROCESSING)
     post_ids = []
     for post in obstracts_job.feed.feed.posts.all():
@@ -76,6 +153,7 @@ def test_start_processing(obstracts_job):
             status=h4f_models.FullTextState.RETRIEVED,
         )
         post_ids.append(str(post.id))
+    assert len(post_ids) > 2
 
     with (
         patch("obstracts.cjob.tasks.wait_in_queue.run") as mock_wait_in_queue,
@@ -96,12 +174,247 @@ def test_start_processing(obstracts_job):
                     post_ids=post_ids,
                     post_index=index,
                     profile_ids=[None] * len(post_ids),
+                    stride=2,
                 )
                 for index, post_id in enumerate(post_ids)
             ],
             any_order=True,
         )
+        assert mock_process_post.call_count == len(post_ids)
         mock_job_completed_with_error.assert_called_once_with(job_id=obstracts_job.id)
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.pending_lanes == 0
+
+
+def test_process_posts_from_index__lane_continuation():
+    post_ids = ["post-0", "post-1", "post-2", "post-3", "post-4"]
+    lane = process_posts_from_index("job-id", post_ids, 1, stride=2)
+    *post_tasks, last_task = lane.tasks
+    assert [t.kwargs["post_index"] for t in post_tasks] == [1, 3]
+    assert {t.kwargs["stride"] for t in post_tasks} == {2}
+    assert last_task.name == lane_completed.name
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "post_count,expected_queue",
+    [
+        (1, "posts_priority"),
+        (3, "posts_priority"),
+        (4, "posts"),
+    ],
+)
+def test_process_posts_from_index_routes_small_jobs_to_priority_queue(
+    obstracts_job, settings, post_count, expected_queue
+):
+    settings.PRIORITY_JOB_MAX_ITEMS = 3
+    post_ids = [f"post-{i}" for i in range(post_count)]
+    *post_tasks, last_task = process_posts_from_index(obstracts_job.id, post_ids, 0).tasks
+    assert {t.options["queue"] for t in post_tasks} == {expected_queue}
+    assert "queue" not in last_task.options
+
+
+def test_task_queues():
+    assert process_post.queue == "posts"
+    assert add_pdf_to_post.queue == reindex_pdf_for_post.queue == "pdf"
+    assert build_topic_clusters.queue == "clustering"
+    assert update_knowledgebase.queue == "knowledgebase"
+    assert wait_in_queue.queue is None
+
+
+@pytest.mark.django_db
+def test_lane_completed_finalizes_job_once(obstracts_job):
+    obstracts_job.pending_lanes = 2
+    obstracts_job.save(update_fields=["pending_lanes"])
+    with patch(
+        "obstracts.cjob.tasks.job_completed_with_error.run"
+    ) as mock_job_completed:
+        lane_completed.run(obstracts_job.id)
+        mock_job_completed.assert_not_called()
+        lane_completed.run(obstracts_job.id)
+        mock_job_completed.assert_called_once_with(job_id=obstracts_job.id)
+        lane_completed.run(obstracts_job.id)
+        mock_job_completed.assert_called_once()
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.pending_lanes == 0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "concurrency,expected_stride,expected_lanes",
+    [
+        (1, None, {"0": 1}),
+        (2, 2, {"1": 1, "0": 2}),
+    ],
+)
+def test_process_posts_from_index_records_checkpoint(
+    obstracts_job, settings, concurrency, expected_stride, expected_lanes
+):
+    settings.POST_PROCESSING_CONCURRENCY = concurrency
+    post_ids = ["post-0", "post-1", "post-2", "post-3"]
+    process_posts_from_index(obstracts_job.id, post_ids, 1)
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.checkpoint == dict(
+        post_ids=post_ids,
+        profile_ids=[None] * 4,
+        stride=expected_stride,
+        lanes=expected_lanes,
+    )
+
+
+@pytest.mark.django_db
+def test_record_checkpoint_moves_lane(obstracts_job):
+    process_posts_from_index(obstracts_job.id, ["post-0", "post-1", "post-2"], 0)
+    obstracts_job.checkpoint = dict(obstracts_job.checkpoint, stride=2, lanes={"0": 0, "1": 1})
+    obstracts_job.save(update_fields=["checkpoint"])
+
+    obstracts_job.record_checkpoint(1, 2)
+    obstracts_job.record_checkpoint(0, 2)
+
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.checkpoint["lanes"] == {"0": 2, "1": 3}
+    assert obstracts_job.heartbeat_at is not None
+
+
+def make_orphan(job, checkpoint, heartbeat_seconds_ago=3600, state=models.JobState.PROCESSING):
+    models.Job.objects.filter(pk=job.pk).update(
+        state=state,
+        checkpoint=checkpoint,
+        worker="dead-worker",
+        heartbeat_at=timezone.now() - timedelta(seconds=heartbeat_seconds_ago),
+    )
+    job.refresh_from_db()
+    return job
+
+
+@pytest.mark.django_db
+def test_resume_from_checkpoint(obstracts_job):
+    post_ids = ["post-0", "post-1", "post-2"]
+    make_orphan(
+        obstracts_job,
+        dict(post_ids=post_ids, profile_ids=[None] * 3, stride=None, lanes={"0": 2}),
+    )
+    t = resume_from_checkpoint(obstracts_job)
+    wait_task, *post_tasks, last_task = t.tasks
+    assert wait_task.name == wait_in_queue.name
+    assert [task.kwargs["post_id"] for task in post_tasks] == ["post-2"]
+    assert last_task.name == job_completed_with_error.name
+
+
+@pytest.mark.django_db
+def test_resume_from_checkpoint__lanes(obstracts_job):
+    post_ids = ["post-0", "post-1", "post-2", "post-3", "post-4", "post-5"]
+    make_orphan(
+        obstracts_job,
+        dict(post_ids=post_ids, profile_ids=[None] * 6, stride=3, lanes={"0": 3, "1": 7, "2": 2}),
+    )
+    t = resume_from_checkpoint(obstracts_job)
+    _, lanes = t.tasks
+    # the finished lane is not resumed
+    assert [[task.kwargs["post_index"] for task in lane.tasks[:-1]] for lane in lanes.tasks] == [
+        [2, 5],
+        [3],
+    ]
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.pending_lanes == 2
+
+
+@pytest.mark.django_db
+def test_resume_orphaned_jobs(obstracts_job, obstracts_job_reprocess, settings):
+    settings.JOB_HEARTBEAT_TIMEOUT_SECONDS = 600
+    checkpoint = dict(post_ids=["post-0"], profile_ids=[None], stride=None, lanes={"0": 0})
+    make_orphan(obstracts_job, checkpoint)
+    # still heartbeating on another worker
+    make_orphan(obstracts_job_reprocess, checkpoint, heartbeat_seconds_ago=10)
+
+    with patch("obstracts.cjob.tasks.resume_from_checkpoint") as mock_resume:
+        assert resume_orphaned_jobs("new-worker") == [obstracts_job.id]
+        # a second booting worker finds nothing left to resume
+        assert resume_orphaned_jobs("other-worker") == []
+
+    mock_resume.assert_called_once_with(obstracts_job)
+    mock_resume.return_value.apply_async.assert_called_once()
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.worker == "new-worker"
+    assert obstracts_job.state == models.JobState.PROCESSING
+    obstracts_job_reprocess.refresh_from_db()
+    assert obstracts_job_reprocess.worker == "dead-worker"
+    assert obstracts_job_reprocess.state == models.JobState.PROCESSING
+
+
+@pytest.mark.django_db
+def test_resume_orphaned_jobs__cancelling(obstracts_job):
+    make_orphan(
+        obstracts_job,
+        dict(post_ids=["post-0"], profile_ids=[None], stride=None, lanes={"0": 0}),
+        state=models.JobState.CANCELLING,
+    )
+    with patch("obstracts.cjob.tasks.resume_from_checkpoint") as mock_resume:
+        resume_orphaned_jobs()
+    mock_resume.assert_not_called()
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.state == models.JobState.CANCELLED
+
+
+@pytest.mark.django_db
+def test_fail_orphaned_jobs(obstracts_job, obstracts_job_reprocess, pdf_job, settings):
+    settings.JOB_HEARTBEAT_TIMEOUT_SECONDS = 600
+    make_orphan(obstracts_job, None)
+    make_orphan(obstracts_job_reprocess, None, state=models.JobState.CANCELLING)
+    # still heartbeating on another worker
+    make_orphan(pdf_job, None, heartbeat_seconds_ago=10)
+    models.FeedLock.objects.create(
+        feed_id=obstracts_job.feed_id, job=obstracts_job, acquired_at=timezone.now(), lease_expires_at=timezone.now()
+    )
+
+    assert set(fail_orphaned_jobs()) == {obstracts_job.id, obstracts_job_reprocess.id}
+    assert fail_orphaned_jobs() == []
+
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.state == models.JobState.PROCESS_FAILED
+    assert obstracts_job.errors == ["job was orphaned by a worker shutdown and cannot be resumed"]
+    assert not models.FeedLock.objects.filter(job=obstracts_job).exists()
+    obstracts_job_reprocess.refresh_from_db()
+    assert obstracts_job_reprocess.state == models.JobState.CANCELLED
+    pdf_job.refresh_from_db()
+    assert pdf_job.state == models.JobState.PROCESSING
+
+
+@pytest.mark.django_db
+def test_mark_old_jobs_as_failed_keeps_live_jobs(obstracts_job, obstracts_job_reprocess):
+    obstracts_job_reprocess.update_state(models.JobState.QUEUED)
+    make_orphan(
+        obstracts_job,
+        dict(post_ids=["post-0"], profile_ids=[None], stride=None, lanes={"0": 0}),
+        heartbeat_seconds_ago=0,
+    )
+    with patch("obstracts.cjob.tasks.auto_refresh_statistics_data.delay"):
+        mark_old_jobs_as_failed()
+    obstracts_job.refresh_from_db()
+    obstracts_job_reprocess.refresh_from_db()
+    assert obstracts_job.state == models.JobState.PROCESSING
+    assert obstracts_job_reprocess.state == models.JobState.QUEUED
+
+
+def test_unconsumed_queues():
+    active_queues = {
+        "default@host": [{"name": "celery"}, {"name": "maintenance"}],
+        "posts@host": [{"name": "posts_priority"}, {"name": "posts"}],
+    }
+    assert unconsumed_queues(active_queues) == [
+        "pdf_priority",
+        "pdf",
+        "knowledgebase",
+        "clustering",
+    ]
+    # no worker answered
+    assert unconsumed_queues(None) == queues.ALL
+
+
+def test_celery_app_consumes_every_queue_by_default():
+    from obstracts.cjob.celery import app
+
+    assert [queue.name for queue in app.conf.task_queues] == queues.ALL
 
 
 @pytest.mark.django_db
@@ -229,6 +542,7 @@ def test_process_post_request_schedules_hard_timeout_handler():
         post_ids=["post-id", "next-post-id"],
         post_index=0,
         profile_ids=[None, None],
+        stride=None,
     )
 
 
@@ -251,7 +565,32 @@ def test_process_post_hard_timeout_continues_from_next_post(obstracts_job):
         )
 
     mock_process_posts.assert_called_once_with(
-        str(obstracts_job.id), post_ids, 1, profile_ids=None
+        str(obstracts_job.id), post_ids, 1, profile_ids=None, stride=None
+    )
+    continuation.apply_async.assert_called_once_with(task_id="failed-task-id")
+
+
+@pytest.mark.django_db
+def test_process_post_hard_timeout_continues_lane(obstracts_job):
+    post_ids = ["post-0", "post-1", "post-2", "post-3", "post-4"]
+    continuation = MagicMock()
+
+    with patch(
+        "obstracts.cjob.tasks.process_posts_from_index",
+        return_value=continuation,
+    ) as mock_process_posts:
+        process_post_hard_timeout.run(
+            obstracts_job.id,
+            post_ids[1],
+            120,
+            "failed-task-id",
+            post_ids,
+            1,
+            stride=2,
+        )
+
+    mock_process_posts.assert_called_once_with(
+        str(obstracts_job.id), post_ids, 3, profile_ids=None, stride=2
     )
     continuation.apply_async.assert_called_once_with(task_id="failed-task-id")
 
@@ -323,8 +662,8 @@ def test_process_post_job(obstracts_job, fake_stixifier_processor):
         patch("obstracts.server.models.File.create_embedding") as mock_create_embedding,
         patch("obstracts.cjob.tasks.download_pdf") as mock_download_pdf,
         patch.object(
-            PostOnlyView, "remove_report_objects"
-        ) as mock_remove_report_objects,
+            PostOnlyView, "remove_stale_report_objects"
+        ) as mock_remove_stale_report_objects,
     ):
         mock_download_pdf.return_value = b"this is a pdf"
         mock_stixify_processor_cls.return_value = fake_stixifier_processor
@@ -332,9 +671,9 @@ def test_process_post_job(obstracts_job, fake_stixifier_processor):
         obstracts_job.refresh_from_db()
         file = models.File.objects.get(pk=post_id)
         mock_add_pdf_to_post.assert_called_once_with(str(obstracts_job.id), post_id)
-        mock_remove_report_objects.assert_called_once_with(
-            file
-        )  # assert report/post objects removed
+        mock_remove_stale_report_objects.assert_called_once_with(
+            file, set()
+        )  # assert objects missing from the upload removed
         assert file.profile == obstracts_job.profile
         assert file.feed == obstracts_job.feed
         mock_stixify_processor_cls.assert_called_once()
@@ -359,6 +698,7 @@ def test_process_post_job(obstracts_job, fake_stixifier_processor):
                 "incident_classification": ["class1", "class2"],
             }
         }
+        assert file.ai_threat_score == 8
         assert file.markdown_file.read() == b"Generated MD File"
         mock_create_embedding.assert_called_once_with(include_non_incident=False)
         assert obstracts_job.failed_processes == 5
@@ -377,6 +717,105 @@ def test_process_post_job(obstracts_job, fake_stixifier_processor):
         )
 
 
+@pytest.mark.django_db
+def test_process_post_removes_only_stale_objects(obstracts_job, fake_stixifier_processor):
+    post_id = "72e1ad04-8ce9-413d-b620-fe7c75dc0a39"
+
+    def upload():
+        # what stix2arango's post-upload hooks see for one vertex and one edge
+        record_uploaded_objects_hook(None, "vertex", [dict(id="indicator--1", _record_md5_hash="a")])
+        record_uploaded_objects_hook(None, "edge", [dict(id="relationship--1", _record_md5_hash="b")])
+
+    fake_stixifier_processor.upload_to_arango.side_effect = upload
+    with (
+        patch("obstracts.cjob.tasks.StixifyProcessor", return_value=fake_stixifier_processor),
+        patch("obstracts.cjob.tasks.add_pdf_to_post.run"),
+        patch("obstracts.server.models.File.create_embedding"),
+        patch.object(PostOnlyView, "remove_report_objects") as mock_remove_report_objects,
+        patch.object(
+            PostOnlyView, "remove_stale_report_objects"
+        ) as mock_remove_stale_report_objects,
+    ):
+        process_post.si(obstracts_job.id, post_id).delay()
+
+    mock_remove_report_objects.assert_not_called()
+    mock_remove_stale_report_objects.assert_called_once_with(
+        models.File.objects.get(pk=post_id), {"indicator--1;a", "relationship--1;b"}
+    )
+    # uploads outside process_post are not tracked
+    record_uploaded_objects_hook(None, "vertex", [dict(id="indicator--2", _record_md5_hash="c")])
+
+
+@pytest.mark.django_db
+def test_process_post_records_metrics(obstracts_job, fake_stixifier_processor):
+    post_id = "72e1ad04-8ce9-413d-b620-fe7c75dc0a39"
+    with (
+        patch("obstracts.cjob.tasks.StixifyProcessor", return_value=fake_stixifier_processor),
+        patch("obstracts.cjob.tasks.add_pdf_to_post.run"),
+        patch("obstracts.server.models.File.create_embedding"),
+        patch.object(PostOnlyView, "remove_stale_report_objects"),
+    ):
+        process_post.si(obstracts_job.id, post_id).delay()
+
+    metrics = models.PostProcessingMetrics.objects.get(job=obstracts_job)
+    assert str(metrics.post_id) == post_id
+    assert metrics.profile_id == obstracts_job.profile.id
+    assert metrics.succeeded == True
+    assert set(metrics.stages) == {
+        "markdown",
+        "extraction",
+        "upload_to_arango",
+        "remove_stale_objects",
+        "save_images",
+        "embedding",
+    }
+    assert sum(metrics.stages.values()) <= metrics.total_seconds
+    assert metrics.db_queries > 0
+
+
+@pytest.mark.django_db
+def test_process_post_records_metrics_on_failure(obstracts_job):
+    post_id = "72e1ad04-8ce9-413d-b620-fe7c75dc0a39"
+    with (
+        patch("obstracts.cjob.tasks.StixifyProcessor", side_effect=ValueError),
+        patch("obstracts.cjob.tasks.add_pdf_to_post.run"),
+    ):
+        process_post.si(obstracts_job.id, post_id).delay()
+
+    metrics = models.PostProcessingMetrics.objects.get(job=obstracts_job)
+    assert metrics.succeeded == False
+    assert metrics.stages == {}
+
+
+@pytest.mark.django_db
+def test_process_post_assigns_topic(obstracts_job, fake_stixifier_processor):
+    post_id = "72e1ad04-8ce9-413d-b620-fe7c75dc0a39"
+
+    def create_embedding(file, **kwargs):
+        file.embedding = DocumentEmbedding.objects.create(
+            id=file.pk, text="text", embedding=[1.0] + [0.0] * 511
+        )
+
+    with (
+        patch("obstracts.cjob.tasks.StixifyProcessor", return_value=fake_stixifier_processor),
+        patch("obstracts.cjob.tasks.add_pdf_to_post.run"),
+        patch.object(models.File, "create_embedding", autospec=True, side_effect=create_embedding),
+        patch(
+            "obstracts.cjob.tasks.classifier_tasks.assign_to_cluster",
+            side_effect=RuntimeError("model unavailable"),
+        ) as mock_assign,
+    ):
+        process_post.si(obstracts_job.id, post_id).delay()
+
+    mock_assign.assert_called_once()
+    assert mock_assign.call_args[0][0].pk == uuid.UUID(post_id)
+    # a failed topic assignment does not fail the post
+    file = models.File.objects.get(pk=post_id)
+    assert file.processed == True
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.failed_processes == 0
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize("generate_pdf", [True, False])
 def test_process_post_generate_pdf(
@@ -404,6 +843,74 @@ def test_process_post_generate_pdf(
         mock_create_embedding.assert_called_once_with(include_non_incident=True)
 
 
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "post_count,expected_queue",
+    [
+        (1, "pdf_priority"),
+        (4, "pdf"),
+    ],
+)
+def test_process_post_routes_pdf_like_the_job(
+    obstracts_job, fake_stixifier_processor, settings, post_count, expected_queue
+):
+    settings.PRIORITY_JOB_MAX_ITEMS = 3
+    post_id = "72e1ad04-8ce9-413d-b620-fe7c75dc0a39"
+    obstracts_job.profile.generate_pdf = True
+    obstracts_job.profile.save()
+
+    with (
+        patch("obstracts.cjob.tasks.StixifyProcessor") as mock_stixify_processor_cls,
+        patch("obstracts.server.models.File.create_embedding"),
+        patch("obstracts.cjob.tasks.add_pdf_to_post.apply_async") as mock_apply_async,
+    ):
+        mock_stixify_processor_cls.return_value = fake_stixifier_processor
+        process_post.si(
+            obstracts_job.id, post_id, post_ids=[post_id] * post_count
+        ).delay()
+    mock_apply_async.assert_called_once_with(
+        (obstracts_job.id, post_id), queue=expected_queue
+    )
+
+
+@pytest.mark.django_db
+def test_process_post_stops_when_feed_lock_lost(obstracts_job, feed_lock_held):
+    feed_lock_held.return_value = False
+    obstracts_job.update_state(models.JobState.PROCESSING)
+    post_id = "72e1ad04-8ce9-413d-b620-fe7c75dc0a39"
+    process_post.push_request(chain=[{"task": "obstracts.cjob.tasks.lane_completed"}], hostname="worker-1")
+    try:
+        with patch("obstracts.cjob.tasks.StixifyProcessor") as mock_stixify_processor_cls:
+            process_post.run(obstracts_job.id, post_id)
+        assert process_post.request.chain is None, "the rest of the lane is dropped"
+    finally:
+        process_post.pop_request()
+    mock_stixify_processor_cls.assert_not_called()
+    obstracts_job.refresh_from_db()
+    assert obstracts_job.state == models.JobState.PROCESS_FAILED
+    assert obstracts_job.errors == [f"job lost its feed lock before post {post_id}, stopping it"]
+
+
+def test_job_heartbeat_renews_until_lock_lost(settings, feed_lock_held):
+    settings.FEED_LOCK_LEASE_SECONDS = 0.04
+    feed_lock_held.side_effect = [True, True, False]
+    job = MagicMock()
+    heartbeat = JobHeartbeat(job, "worker-1")
+    assert heartbeat.start() is True
+    deadline = time.monotonic() + 5
+    while feed_lock_held.call_count < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    heartbeat.stop()
+    assert feed_lock_held.call_count == 3, "renewed by the thread, which stops once the lock is lost"
+    job.heartbeat.assert_called_with("worker-1")
+
+
+def test_job_heartbeat_not_started_without_lock(feed_lock_held):
+    feed_lock_held.return_value = False
+    heartbeat = JobHeartbeat(MagicMock(), "worker-1")
+    assert heartbeat.start() is False
+
+
 @pytest.mark.django_db
 @pytest.mark.parametrize(
     "has_pdf_file,generate_pdf,expected",
@@ -700,6 +1207,12 @@ def test_update_knowledgebase_task_failure():
     assert "boom" in job.errors[0]
 
 
+def _embedded_post_ids(mock_compute):
+    return sorted(
+        str(doc.id) for c in mock_compute.call_args_list for doc in c.args[0]
+    )
+
+
 @pytest.mark.django_db
 def test_run_topic_embeddings_job_success(feed_with_posts):
     job = models.Job.objects.create(
@@ -721,14 +1234,62 @@ def test_run_topic_embeddings_job_success(feed_with_posts):
     files[0].embedding = emb
     files[0].save(update_fields=["embedding"])
 
-    with patch("obstracts.cjob.tasks._build_topic_embedding_for_post", return_value=("processed", None)) as mock_build:
+    with patch("obstracts.cjob.tasks.classifier_tasks.compute_embeddings_for_documents", return_value={}) as mock_compute:
         run_topic_embeddings_job(job.id, force=False)
 
     job.refresh_from_db()
-    assert mock_build.call_count == 3
+    assert mock_compute.call_count == 1
+    assert _embedded_post_ids(mock_compute) == sorted(str(f.post_id) for f in files[1:])
     assert job.processed_items == 3
     assert job.failed_processes == 0
     assert job.state == models.JobState.PROCESSED
+    for f in files[1:]:
+        f.refresh_from_db()
+        assert f.embedding_id == f.pk
+        assert f.embedding.text == f.embedding_text
+
+
+@pytest.mark.django_db
+def test_run_topic_embeddings_job_batches_posts(feed_with_posts, settings):
+    settings.CLASSIFIER_EMBEDDING_BATCH_SIZE = 3
+    job = models.Job.objects.create(
+        id=uuid.uuid4(),
+        type=models.JobType.BUILD_EMBEDDINGS,
+        state=models.JobState.PROCESSING,
+    )
+    models.File.objects.filter(feed=feed_with_posts).update(ai_describes_incident=True, embedding=None)
+
+    with patch("obstracts.cjob.tasks.classifier_tasks.compute_embeddings_for_documents", return_value={}) as mock_compute:
+        run_topic_embeddings_job(job.id, force=False)
+
+    assert sorted(len(c.args[0]) for c in mock_compute.call_args_list) == [1, 3]
+    job.refresh_from_db()
+    assert job.processed_items == 4
+
+
+@pytest.mark.django_db
+def test_run_topic_embeddings_job_partial_failure(feed_with_posts):
+    job = models.Job.objects.create(
+        id=uuid.uuid4(),
+        type=models.JobType.BUILD_EMBEDDINGS,
+        state=models.JobState.PROCESSING,
+    )
+    files = list(models.File.objects.filter(feed=feed_with_posts).order_by("post_id"))
+    models.File.objects.filter(feed=feed_with_posts).update(ai_describes_incident=True, embedding=None)
+
+    with patch(
+        "obstracts.cjob.tasks.classifier_tasks.compute_embeddings_for_documents",
+        return_value={files[0].pk: "input too long"},
+    ):
+        run_topic_embeddings_job(job.id, force=False)
+
+    job.refresh_from_db()
+    assert job.processed_items == 3
+    assert job.failed_processes == 1
+    assert job.errors == [f"embedding build failed for post {files[0].post_id}"]
+    assert job.state == models.JobState.PROCESSED
+    files[0].refresh_from_db()
+    assert files[0].embedding_id is None
 
 
 @pytest.mark.django_db
@@ -752,13 +1313,15 @@ def test_run_topic_embeddings_job_force_includes_existing(feed_with_posts):
     files[0].embedding = emb
     files[0].save(update_fields=["embedding"])
 
-    with patch("obstracts.cjob.tasks._build_topic_embedding_for_post", return_value=("processed", None)) as mock_build:
+    with patch("obstracts.cjob.tasks.classifier_tasks.compute_embeddings_for_documents", return_value={}) as mock_compute:
         run_topic_embeddings_job(job.id, force=True)
 
     job.refresh_from_db()
-    assert mock_build.call_count == 4
+    assert len(_embedded_post_ids(mock_compute)) == 4
     assert job.processed_items == 4
     assert job.state == models.JobState.PROCESSED
+    emb.refresh_from_db()
+    assert emb.text == files[0].embedding_text
 
 
 @pytest.mark.django_db
@@ -772,7 +1335,7 @@ def test_run_topic_embeddings_job_cancelled(feed_with_posts):
     files = models.File.objects.filter(feed=feed_with_posts)
     files.update(ai_describes_incident=True, embedding=None)
 
-    with patch("obstracts.cjob.tasks._build_topic_embedding_for_post", return_value=("processed", None)):
+    with patch("obstracts.cjob.tasks.classifier_tasks.compute_embeddings_for_documents", return_value={}):
         run_topic_embeddings_job(job.id, force=False)
 
     job.refresh_from_db()
@@ -792,25 +1355,22 @@ def test_run_topic_embeddings_job_include_non_incident_flag(feed_with_posts):
         type=models.JobType.BUILD_EMBEDDINGS,
         state=models.JobState.PROCESSING,
     )
-    with patch("obstracts.cjob.tasks._build_topic_embedding_for_post", return_value=("processed", None)) as mock_build:
+    with patch("obstracts.cjob.tasks.classifier_tasks.compute_embeddings_for_documents", return_value={}) as mock_compute:
         run_topic_embeddings_job(job_without_flag.id, force=False, include_non_incident=False)
 
-    assert mock_build.call_count == 2 # should only process the 2 files that describe an incident
-    mock_build.assert_has_calls(
-        [call(ANY, False, False), call(ANY, False, False)], any_order=True
-    )  # should pass False for include_non_incident
-    mock_build.reset_mock()
+    # should only process the 2 files that describe an incident
+    assert _embedded_post_ids(mock_compute) == sorted(str(f.post_id) for f in files[:2])
+    models.File.objects.filter(feed=feed_with_posts).update(embedding=None)
 
     job_with_flag = models.Job.objects.create(
         id=uuid.uuid4(),
         type=models.JobType.BUILD_EMBEDDINGS,
         state=models.JobState.PROCESSING,
     )
-    with patch("obstracts.server.models.File.create_embedding") as mock_create_embedding:
+    with patch("obstracts.cjob.tasks.classifier_tasks.compute_embeddings_for_documents", return_value={}) as mock_compute:
         run_topic_embeddings_job(job_with_flag.id, force=False, include_non_incident=True)
 
-    assert mock_create_embedding.call_count == 4
-    mock_create_embedding.assert_has_calls([call(force=False, include_non_incident=True)] * 4, any_order=True)  # should default to False if include_non_incident is not passed
+    assert _embedded_post_ids(mock_compute) == sorted(str(f.post_id) for f in files)
 
 
 @pytest.mark.django_db
@@ -826,11 +1386,10 @@ def test_run_topic_embeddings_job_include_non_incident_defaults_false(feed_with_
         type=models.JobType.BUILD_EMBEDDINGS,
         state=models.JobState.PROCESSING,
     )
-    with patch("obstracts.cjob.tasks._build_topic_embedding_for_post", return_value=("processed", None)) as mock_build:
+    with patch("obstracts.cjob.tasks.classifier_tasks.compute_embeddings_for_documents", return_value={}) as mock_compute:
         run_topic_embeddings_job(job.id, force=False)
 
-    assert mock_build.call_count == 1
-    mock_build.assert_called_with(ANY, ANY, False)  # should default to False if include_non_incident is not passed
+    assert _embedded_post_ids(mock_compute) == [str(files[0].post_id)]
 
 
 @pytest.mark.django_db
@@ -841,7 +1400,8 @@ def test_run_topic_clusters_job_success():
         state=models.JobState.PROCESSING,
     )
 
-    with patch("obstracts.cjob.tasks.classifier_tasks.run_clustering") as mock_clustering:
+    metrics = dict(mode="full", documents=3, load_seconds=0.1, load_peak_memory_bytes=1024)
+    with patch("obstracts.cjob.tasks.classifier_tasks.run_clustering", return_value=metrics) as mock_clustering:
         run_topic_clusters_job(job.id, force=True)
 
     job.refresh_from_db()
@@ -850,8 +1410,9 @@ def test_run_topic_clusters_job_success():
     assert kwargs["force"] is True
     assert kwargs["workers"] >= 1
     assert callable(kwargs["should_cancel"])
-    assert job.processed_items == 0
+    assert job.processed_items == 1
     assert job.state == models.JobState.PROCESSED
+    assert job.extra == {"clustering": metrics}
 
 
 @pytest.mark.django_db
@@ -0,0 +1,44 @@
+from unittest.mock import patch
+
+from obstracts.cjob import timing
+
+
+def test_post_timer__nested_stages_exclude_inner_time():
+    clock = iter([0, 1, 3, 7, 8, 10])
+    with patch("obstracts.cjob.timing.time.perf_counter", side_effect=lambda: next(clock)):
+        timer = timing.PostTimer().start()
+        with timer.stage("upload"):
+            with timing.stage("object_values"):
+                pass
+        timer.stop()
+    assert timer.stages == {"upload": 3, "object_values": 4}
+    assert timer.total_seconds == 10
+
+
+def test_post_timer__repeated_stage_adds_up():
+    clock = iter([0, 1, 2, 3, 5, 6])
+    with patch("obstracts.cjob.timing.time.perf_counter", side_effect=lambda: next(clock)):
+        timer = timing.PostTimer().start()
+        for _ in range(2):
+            with timer.stage("images"):
+                pass
+        timer.stop()
+    assert timer.stages == {"images": 3}
+
+
+def test_stage__noop_without_timer():
+    assert timing.current_timer() is None
+    with timing.stage("object_values"):
+        pass
+    assert timing.current_timer() is None
+
+
+def test_post_timer__counts_db_queries(db):
+    from obstracts.server.models import Job
+
+    timer = timing.PostTimer().start()
+    Job.objects.count()
+    Job.objects.count()
+    timer.stop()
+    Job.objects.count()
+    assert timer.db_queries == 2
@@ -66,6 +66,64 @@ def test_list_posts(client, feed_with_posts, api_schema):
         )
 
 
+@pytest.mark.parametrize("sort", ["pubdate_descending", "pubdate_ascending"])
+@pytest.mark.django_db
+def test_list_posts_keyset(client, feed_with_posts, api_schema, sort):
+    expected_ids = [
+        post["id"] for post in client.get("/api/v1/posts/", query_params=dict(sort=sort)).data["posts"]
+    ]
+
+    resp = client.get("/api/v1/posts/", query_params=dict(sort=sort, page_size=3))
+    assert resp.status_code == 200
+    assert resp.data["next_cursor"]
+    first_page = [post["id"] for post in resp.data["posts"]]
+
+    resp = client.get("/api/v1/posts/", query_params=dict(sort=sort, page_size=3, cursor=resp.data["next_cursor"]))
+    assert resp.status_code == 200, resp.content
+    assert resp.data["total_results_count"] == 4
+    assert resp.data["next_cursor"] is None
+    assert first_page + [post["id"] for post in resp.data["posts"]] == expected_ids
+    api_schema["/api/v1/posts/"]["GET"].validate_response(
+        Transport.get_st_response(resp)
+    )
+
+
+@pytest.mark.django_db
+def test_list_posts_keyset__same_pubdate(client, feed_with_posts):
+    models.h4f_models.Post.objects.update(pubdate="2020-01-01T00:00:00Z")
+    resp = client.get("/api/v1/posts/", query_params=dict(page_size=3))
+    assert resp.status_code == 200
+    first_page = [post["id"] for post in resp.data["posts"]]
+
+    resp = client.get("/api/v1/posts/", query_params=dict(page_size=3, cursor=resp.data["next_cursor"]))
+    assert resp.status_code == 200, resp.content
+    post_ids = first_page + [post["id"] for post in resp.data["posts"]]
+    assert post_ids == sorted(post_ids, reverse=True), "ties are broken by id, as the cursor seeks"
+    assert len(set(post_ids)) == 4
+
+
+@pytest.mark.parametrize(
+    "query_params",
+    [
+        dict(cursor="", sort="title_ascending"),
+        dict(cursor="not-a-cursor"),
+    ],
+)
+@pytest.mark.django_db
+def test_list_posts_keyset_invalid(client, feed_with_posts, query_params):
+    resp = client.get("/api/v1/posts/", query_params=query_params)
+    assert resp.status_code == 400, resp.content
+
+
+@pytest.mark.django_db
+def test_list_posts_estimated_count(client, feed_with_posts, settings):
+    settings.POST_EXACT_COUNT_LIMIT = 2
+    resp = client.get("/api/v1/posts/", query_params=dict(page_size=1))
+    assert resp.status_code == 200
+    assert resp.data["total_results_count"] >= 3, "an estimate once there are more posts than the limit"
+    assert len(resp.data["posts"]) == 1
+
+
 @pytest.mark.django_db
 def test_retrieve_posts(client, feed_with_posts, api_schema):
     with patch.object(
@@ -410,6 +468,7 @@ def list_post_posts(feed_with_posts):
 
     post1 = posts[0]
     post1.ai_describes_incident = True
+    post1.ai_threat_score = 80
     post1.save()
 
     post3 = posts[2]
@@ -420,6 +479,7 @@ def list_post_posts(feed_with_posts):
         "cyber_crime",
         "indicator_of_compromise",
     ]
+    post3.ai_threat_score = 90
     post3.processed = False
     post3.save()
 
@@ -430,6 +490,7 @@ def list_post_posts(feed_with_posts):
         "infostealer",
     ]
     post4.ai_describes_incident = False
+    post4.ai_threat_score = 20
     post4.save()
     return posts
 
@@ -488,6 +549,20 @@ def list_post_posts(feed_with_posts):
                 "42a5d042-26fa-41f3-8850-307be3f330cf",
             ],
         ),
+        (
+            dict(min_confidence=50),
+            [
+                "561ed102-7584-4b7d-a302-43d4bca5605b",
+            ],
+        ),
+        (
+            dict(min_confidence=20, show_hidden_posts=True),
+            [
+                "561ed102-7584-4b7d-a302-43d4bca5605b",
+                "72e1ad04-8ce9-413d-b620-fe7c75dc0a39",
+                "42a5d042-26fa-41f3-8850-307be3f330cf",
+            ],
+        ),
     ],
 )
 @pytest.mark.django_db
@@ -501,6 +576,53 @@ def test_list_posts_filter(client, api_schema, list_post_posts, filters, expecte
     )
 
 
+@pytest.mark.django_db
+def test_list_posts_default_sort(client, api_schema, list_post_posts):
+    resp = client.get("/api/v1/posts/")
+    assert resp.status_code == 200, resp.content
+    visible = [file for file in list_post_posts if file.processed]
+    assert [post["id"] for post in resp.data["posts"]] == [
+        str(file.post_id) for file in sorted(visible, key=lambda file: file.post.pubdate, reverse=True)
+    ]
+    api_schema["/api/v1/posts/"]["GET"].validate_response(
+        Transport.get_st_response(resp)
+    )
+
+
+@pytest.mark.parametrize(
+    "sort,expected_ids",
+    [
+        (
+            "ai_threat_score_descending",
+            [
+                "561ed102-7584-4b7d-a302-43d4bca5605b",
+                "42a5d042-26fa-41f3-8850-307be3f330cf",
+                "345c8d0b-c6ca-4419-b1f7-0daeb4e9278b",
+            ],
+        ),
+        (
+            "ai_threat_score_ascending",
+            [
+                "345c8d0b-c6ca-4419-b1f7-0daeb4e9278b",
+                "42a5d042-26fa-41f3-8850-307be3f330cf",
+                "561ed102-7584-4b7d-a302-43d4bca5605b",
+            ],
+        ),
+    ],
+)
+@pytest.mark.django_db
+def test_list_posts_sort_by_threat_score(client, api_schema, list_post_posts, sort, expected_ids):
+    resp = client.get("/api/v1/posts/", query_params=dict(sort=sort))
+    assert resp.status_code == 200, resp.content
+    assert [post["id"] for post in resp.data["posts"]] == expected_ids
+    assert [post["ai_threat_score"] for post in resp.data["posts"]] == (
+        [80, 20, None] if sort.endswith("descending") else [None, 20, 80]
+    )
+    api_schema["/api/v1/posts/"]["GET"].validate_response(
+        Transport.get_st_response(resp)
+    )
+
+
 @pytest.mark.django_db
 def test_list_attack_navigator__not_processed(client, feed_with_posts, api_schema):
     post = File.objects.get(post_id="561ed102-7584-4b7d-a302-43d4bca5605b")
@@ -828,8 +950,7 @@ def test_reprocess_posts_in_feed_posts(
 
 
 # ── topic_id filter ───────────────────────────────────────────────────────────
-# Fixtures shared with test_topic_view.py live here for reuse via import.
-from tests.src.views.test_topic_view import posts_with_clusters, CLUSTER_1_ID, CLUSTER_2_ID, POST1_ID, POST2_ID  # noqa: E402
+from tests.utils import CLUSTER_1_ID, CLUSTER_2_ID, POST1_ID, POST2_ID  # noqa: E402
 
 
 @pytest.mark.django_db
@@ -121,7 +121,13 @@ def test_get_post_objects_filters(
 @pytest.mark.django_db
 def test_remove_report_objects(client, wp_feed, post_id):
     post = File.objects.get(pk=post_id)
-    PostOnlyView.remove_report_objects(post)
+    timings = PostOnlyView.remove_report_objects(post)
+    assert set(timings) == {
+        "removed_vertices",
+        "removed_edges",
+        "remove_seconds",
+        "update_is_latest_seconds",
+    }
     for collection_name in [
         wp_feed.edge_collection,
         wp_feed.vertex_collection,
@@ -129,3 +135,39 @@ def test_remove_report_objects(client, wp_feed, post_id):
         c = ArangoDBHelper("", None).db.collection(collection_name)
         for obj in c.all():
             assert obj.get("_obstracts_post_id") != post_id
+
+
+def get_post_arango_objects(feed, post_id):
+    db = ArangoDBHelper("", None).db
+    return [
+        obj
+        for collection_name in [feed.vertex_collection, feed.edge_collection]
+        for obj in db.collection(collection_name).all()
+        if obj.get("_obstracts_post_id") == post_id
+    ]
+
+
+@pytest.mark.django_db
+def test_remove_stale_report_objects(client, wp_feed):
+    post_id = "561ed102-7584-4b7d-a302-43d4bca5605b"
+    post = File.objects.get(pk=post_id)
+    post_objects = get_post_arango_objects(wp_feed, post_id)
+    uploaded_keys = {f"{obj['id']};{obj['_record_md5_hash']}" for obj in post_objects}
+
+    assert PostOnlyView.remove_stale_report_objects(post, set()) is None, "no upload recorded"
+    assert len(get_post_arango_objects(wp_feed, post_id)) == len(post_objects)
+
+    timings = PostOnlyView.remove_stale_report_objects(post, uploaded_keys)
+    assert timings["removed_vertices"] == timings["removed_edges"] == 0
+    assert len(get_post_arango_objects(wp_feed, post_id)) == len(post_objects)
+
+    stale = next(obj for obj in post_objects if obj["_id"].startswith(wp_feed.vertex_collection + "/"))
+    uploaded_keys.remove(f"{stale['id']};{stale['_record_md5_hash']}")
+    timings = PostOnlyView.remove_stale_report_objects(post, uploaded_keys)
+
+    remaining = {obj["_id"] for obj in get_post_arango_objects(wp_feed, post_id)}
+    assert timings["removed_vertices"] == 1
+    assert stale["_id"] not in remaining
+    assert {
+        obj["_id"] for obj in post_objects if obj is not stale and not obj.get("_is_ref")
+    } <= remaining
@@ -7,23 +7,36 @@ Verifies that:
 - Counts reflect only posts whose pubdate falls within the period window.
 - Objects outside the time window are not counted.
 - The top-10 ordering is by descending count.
+- The daily rollup follows ObjectValue and Post changes, and serves any period.
 """
 
+import time
+from unittest.mock import patch
+
 import pytest
-from datetime import timedelta
+from datetime import UTC, datetime, time as dt_time, timedelta
 
+from django.core.cache import cache
 from django.utils import timezone
 from rest_framework.test import APIClient
 
 from history4feed.app import models as h4f_models
-from obstracts.server.models import File, ObjectValue
+from obstracts.server.models import File, ObjectValue, ObjectValueDailyCount
 from dogesec_commons.stixifier.models import Profile
+from obstracts.server import statistics
 
 
 EXPECTED_CATEGORIES = ["enterprise-attack", "cve", "sector", "cwe"]
 STATISTICS_URL = "/api/v1/statistics/"
 
 
+@pytest.fixture(autouse=True)
+def clear_statistics_cache():
+    cache.delete_many([statistics.CACHE_KEY, statistics.REFRESH_LOCK_KEY])
+    yield
+    cache.delete_many([statistics.CACHE_KEY, statistics.REFRESH_LOCK_KEY])
+
+
 def _make_post(feed, title, pubdate, link_suffix, post_id):
     return h4f_models.Post.objects.create(
         feed=feed,
@@ -184,6 +197,14 @@ class TestStatisticsView:
         assert data["last_7_days"]["period_days"] == 7
         assert data["last_30_days"]["period_days"] == 30
 
+    def test_period_start_is_first_counted_day(self, client, stats_data):
+        """period_start is the midnight starting the first of the period_days days counted."""
+        data = client.get(STATISTICS_URL).json()
+        today = timezone.now().date()
+        for key, days in (("last_7_days", 7), ("last_30_days", 30)):
+            start = datetime.fromisoformat(data[key]["period_start"].replace("Z", "+00:00"))
+            assert start == datetime.combine(today - timedelta(days=days - 1), dt_time.min, tzinfo=UTC)
+
     def test_categories_present(self, client, stats_data):
         """All four expected knowledgebase categories are present in each period."""
         data = client.get(STATISTICS_URL).json()
@@ -298,3 +319,177 @@ class TestStatisticsView:
         data = client.get(STATISTICS_URL).json()
         cat = self._get_category(data, "last_7_days", "enterprise-attack")
         assert len(cat["results"]) <= 10
+
+
+def _snapshot(age_seconds):
+    categories = {
+        kb: {"label": label, "knowledgebase": kb, "results": []}
+        for kb, label in statistics.STATISTICS_KNOWLEDGEBASES.items()
+    }
+    return {7: categories, 30: categories, "time": time.time() - age_seconds}
+
+
+@pytest.mark.django_db
+def test_stale_snapshot_served_while_refreshing(client):
+    cache.set(statistics.CACHE_KEY, _snapshot(age_seconds=60 * 60))
+    with patch("obstracts.cjob.tasks.auto_refresh_statistics_data.delay") as mock_delay:
+        for _ in range(3):
+            resp = client.get(STATISTICS_URL)
+            assert resp.status_code == 200
+            assert resp.json()["last_7_days"]["categories"][0]["results"] == []
+    # single-flight: the other requests see the refresh already queued
+    mock_delay.assert_called_once_with(lock_acquired=True)
+
+
+@pytest.mark.django_db
+def test_fresh_snapshot_not_refreshed(client):
+    cache.set(statistics.CACHE_KEY, _snapshot(age_seconds=60))
+    with patch("obstracts.cjob.tasks.auto_refresh_statistics_data.delay") as mock_delay:
+        assert client.get(STATISTICS_URL).status_code == 200
+    mock_delay.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_no_snapshot_built_in_request(client, stats_data):
+    with patch("obstracts.cjob.tasks.auto_refresh_statistics_data.delay") as mock_delay:
+        resp = client.get(STATISTICS_URL)
+    assert resp.status_code == 200
+    assert cache.get(statistics.REFRESH_LOCK_KEY) is None
+    assert cache.get(statistics.CACHE_KEY)[7]["cve"]["results"][0]["count"] == 1
+    mock_delay.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_no_snapshot_waits_for_lock_holder(client):
+    cache.add(statistics.REFRESH_LOCK_KEY, time.time())
+
+    def snapshot_built(seconds):
+        cache.set(statistics.CACHE_KEY, _snapshot(age_seconds=0))
+
+    with (
+        patch("obstracts.server.statistics.time.sleep", side_effect=snapshot_built) as mock_sleep,
+        patch("obstracts.server.statistics.build_data_and_add_to_cache") as mock_build,
+    ):
+        resp = client.get(STATISTICS_URL)
+    assert resp.status_code == 200
+    mock_sleep.assert_called_once_with(statistics.FIRST_SNAPSHOT_POLL_SECONDS)
+    mock_build.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_no_snapshot_gives_up_waiting(client):
+    cache.add(statistics.REFRESH_LOCK_KEY, time.time())
+
+    with (
+        patch.object(statistics, "FIRST_SNAPSHOT_WAIT_SECONDS", 1),
+        patch("obstracts.server.statistics.time.sleep") as mock_sleep,
+        patch("obstracts.server.statistics.time.monotonic", side_effect=[0, 0.5, 1.5]),
+        patch("obstracts.server.statistics.build_data_and_add_to_cache") as mock_build,
+    ):
+        resp = client.get(STATISTICS_URL)
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(statistics.StatisticsNotReady.wait)
+    assert mock_sleep.call_count == 1
+    mock_build.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_refresh_releases_lock(stats_data):
+    assert statistics.refresh_statistics_data(timezone.now()) is True
+    assert cache.get(statistics.REFRESH_LOCK_KEY) is None
+    assert cache.get(statistics.CACHE_KEY)[7]["cve"]["results"][0]["count"] == 1
+
+
+@pytest.mark.django_db
+def test_refresh_skipped_while_another_runs():
+    cache.add(statistics.REFRESH_LOCK_KEY, time.time())
+    with patch("obstracts.server.statistics.build_data_and_add_to_cache") as mock_build:
+        assert statistics.refresh_statistics_data(timezone.now()) is False
+        assert statistics.request_refresh() is False
+    mock_build.assert_not_called()
+
+
+ATTACK_A = "attack-pattern--aaaaaaaa-0000-0000-0000-000000000001"
+
+
+def _rollup(stix_id):
+    return {
+        row.day: row.post_count
+        for row in ObjectValueDailyCount.objects.filter(stix_id=stix_id)
+    }
+
+
+@pytest.mark.django_db
+def test_rollup_maintained_on_insert_and_delete(stats_data):
+    assert sum(_rollup(ATTACK_A).values()) == 3
+    ObjectValue.objects.filter(stix_id=ATTACK_A, file=stats_data["files"]["30a"]).delete()
+    assert sum(_rollup(ATTACK_A).values()) == 2
+    stats_data["files"]["7b"].delete()
+    assert sum(_rollup(ATTACK_A).values()) == 1
+    assert 0 not in _rollup(ATTACK_A).values(), "emptied days are removed"
+
+
+@pytest.mark.django_db
+def test_rollup_follows_post_visibility_and_pubdate(stats_data):
+    post = stats_data["files"]["7a"].post
+    post.deleted_manually = True
+    post.save(update_fields=["deleted_manually"])
+    assert sum(_rollup(ATTACK_A).values()) == 2
+    assert not _rollup("vulnerability--cccccccc-0000-0000-0000-000000000003")
+
+    post.deleted_manually = False
+    post.pubdate = timezone.now() - timedelta(days=100)
+    post.save(update_fields=["deleted_manually", "pubdate"])
+    assert _rollup("vulnerability--cccccccc-0000-0000-0000-000000000003") == {post.pubdate.date(): 1}
+
+
+@pytest.mark.django_db
+def test_period_days(client, stats_data):
+    resp = client.get(STATISTICS_URL + "period/", query_params=dict(days=7, knowledgebase="enterprise-attack"))
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["period_days"] == 7
+    assert data["period_start"].startswith(str(timezone.now().date() - timedelta(days=6)))
+    [category] = data["categories"]
+    assert [(r["stix_id"], r["count"]) for r in category["results"]] == [
+        (ATTACK_A, 2),
+        ("attack-pattern--bbbbbbbb-0000-0000-0000-000000000002", 1),
+    ]
+    assert category["results"][0]["values"] == {"name": "Technique A", "aliases": ["T9000"]}
+
+
+@pytest.mark.django_db
+def test_period_since_until(client, stats_data):
+    today = timezone.now().date()
+    resp = client.get(
+        STATISTICS_URL + "period/",
+        query_params=dict(since=str(today - timedelta(days=45)), until=str(today - timedelta(days=10))),
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["period_days"] == 36, "since and until are both included"
+    counts = {
+        c["knowledgebase"]: [(r["stix_id"], r["count"]) for r in c["results"]]
+        for c in data["categories"]
+    }
+    assert counts["enterprise-attack"] == [(ATTACK_A, 1)]
+    assert counts["cwe"] == [("weakness--eeeeeeee-0000-0000-0000-000000000005", 1)]
+    assert counts["cve"] == []
+
+
+@pytest.mark.parametrize(
+    "query_params",
+    [
+        dict(days=0),
+        dict(days=statistics.MAX_PERIOD_DAYS + 1),
+        dict(days=7, since="2025-01-01"),
+        dict(since="2025-02-01", until="2025-01-01"),
+        dict(since="2020-01-01", until="2025-01-01"),
+        dict(since="yesterday"),
+        dict(days=7, knowledgebase="bad"),
+    ],
+)
+@pytest.mark.django_db
+def test_period_invalid(client, query_params):
+    resp = client.get(STATISTICS_URL + "period/", query_params=query_params)
+    assert resp.status_code == 400, resp.content
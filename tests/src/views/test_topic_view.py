@@ -5,78 +5,12 @@ from unittest.mock import patch
 import pytest
 from pytz import UTC
 
-from obstracts.classifier.models import Cluster, DocumentEmbedding
-from obstracts.server.models import File
 from obstracts.server.topics import TopicView
 from obstracts.server import models as ob_models
 from history4feed.app import models as h4f_models
 from dogesec_commons.utils import Pagination
 
-from tests.utils import Transport
-
-# ── fixtures ──────────────────────────────────────────────────────────────────
-
-CLUSTER_1_ID = uuid.UUID("a1111111-1111-1111-1111-111111111111")
-CLUSTER_2_ID = uuid.UUID("a2222222-2222-2222-2222-222222222222")
-CLUSTER_HIDDEN_ID = uuid.UUID("a3333333-3333-3333-3333-333333333333")
-POST1_ID = uuid.UUID("561ed102-7584-4b7d-a302-43d4bca5605b")
-POST2_ID = uuid.UUID("345c8d0b-c6ca-4419-b1f7-0daeb4e9278b")
-
-# 512-dimensional unit vectors
-VEC1 = [1.0] + [0.0] * 511
-VEC2 = [0.0, 1.0] + [0.0] * 510
-
-
-@pytest.fixture
-def posts_with_clusters(feed_with_posts):
-    """Attach DocumentEmbeddings and two Clusters to the first two posts."""
-    file1 = File.objects.get(post_id=POST1_ID)
-    file2 = File.objects.get(post_id=POST2_ID)
-
-    emb1 = DocumentEmbedding.objects.create(
-        id=POST1_ID, text="Iran cyber ops text", embedding=VEC1
-    )
-    emb2 = DocumentEmbedding.objects.create(
-        id=POST2_ID, text="Ransomware overview text", embedding=VEC2
-    )
-
-    file1.embedding = emb1
-    file1.save(update_fields=["embedding"])
-    file2.embedding = emb2
-    file2.save(update_fields=["embedding"])
-
-    # cluster1 contains both posts; cluster2 contains only post2
-    cluster1 = Cluster.objects.create(
-        id=CLUSTER_1_ID,
-        label="Iran Cyber Threats",
-        description="Iran-aligned cyber operations",
-    )
-    cluster1.members.set([emb1, emb2])
-
-
-    # cluster1 contains both posts; cluster2 contains only post2
-    cluster1_but_hidden = Cluster.objects.create(
-        id=CLUSTER_HIDDEN_ID,
-        label="",
-        description="Iran-aligned cyber operations",
-    )
-    cluster1_but_hidden.members.set([emb1, emb2])
-
-    cluster2 = Cluster.objects.create(
-        id=CLUSTER_2_ID,
-        label="Ransomware Campaigns",
-        description="Ransomware activity overview",
-    )
-    cluster2.members.set([emb2])
-
-    return dict(
-        feed=feed_with_posts,
-        emb1=emb1,
-        emb2=emb2,
-        cluster1=cluster1,
-        cluster2=cluster2,
-        cluster_hidden=cluster1_but_hidden,
-    )
+from tests.utils import Transport, CLUSTER_1_ID, CLUSTER_2_ID, CLUSTER_HIDDEN_ID, POST1_ID, POST2_ID
 
 
 # ── class-level checks ────────────────────────────────────────────────────────
@@ -1,11 +1,11 @@
 """
 Tests for Object Values endpoints (SCO and SDO views).
 
-These tests verify the functionality of the /api/v1/values/scos/ and /api/v1/values/sdos/
-endpoints which provide efficient querying of STIX object values extracted from posts.
+These tests verify the functionality of the /api/v1/values/scos/, /api/v1/values/sdos/ and
+/api/v1/values/lookup/ endpoints which provide efficient querying of STIX object values extracted from posts.
 """
 
-from unittest.mock import patch
+import json
 
 import pytest
 from django.utils import timezone
@@ -14,24 +14,7 @@ from tests.conftest import make_feed
 from tests.utils import Transport
 
 @pytest.fixture
-def override_save_method():
-    """Override the Celery task to save ObjectValues to the database immediately for testing."""
-    original_save = ObjectValue.save
-    with patch.object(ObjectValue, 'save', autospec=True) as mock_save:
-        def new_save(self, *args, **kwargs):
-            if not self.is_dupe:
-                existing = ObjectValue.objects.filter(stix_id=self.stix_id)
-                if self.pk:
-                    existing = existing.exclude(pk=self.pk)
-                self.is_dupe = existing.exists()
-            return original_save(self, *args, **kwargs)
-        
-        mock_save.side_effect = new_save
-        yield
-
-
-@pytest.fixture
-def feed_with_object_values(stixifier_profile, override_save_method):
+def feed_with_object_values(stixifier_profile):
     """Create a feed with posts that have ObjectValue entries."""
     feed = make_feed("6ca6ce37-1c69-4a81-8490-89c91b57e557", stixifier_profile)
     
@@ -203,13 +186,13 @@ class TestSCOValueView:
         )
     
     def test_filter_by_value_wildcard(self, client, feed_with_object_values, api_schema):
-        """Test default search uses vcontains for substring matching."""
+        """Test partial IPv4 addresses match the values they start."""
         response = client.get('/api/v1/values/scos/?value=192.168')
         
         assert response.status_code == 200
         data = response.json()
         
-        # Should return the 192.168.1.1 IP using substring matching
+        # Should return the 192.168.1.1 IP using prefix matching
         assert data['size'] == 1
         assert data['values'][0]['values']['value'] == '192.168.1.1'
         
@@ -246,6 +229,38 @@ class TestSCOValueView:
             Transport.get_st_response(response)
         )
     
+    @pytest.mark.parametrize(
+        ["value", "expected_ids"],
+        [
+            # domains match whole values, not the URL they appear in
+            ("Malicious.Example.com", ["domain-name--dd8c5e43-fa3a-6d9e-dfff-987027399734"]),
+            ("https://malicious.example.com/", ["url--ff0e7g65-hc5c-8f1g-ffff-109249511956"]),
+            ("10.0.0.0/8", ["ipv4-addr--cc7b4f32-e929-5c8d-cfff-876916288623"]),
+            ("192.168.0.0/16", ["ipv4-addr--ba6b3f21-d818-4e7c-bfff-765805177512"]),
+            ("10.0.0.1/32", ["ipv4-addr--cc7b4f32-e929-5c8d-cfff-876916288623"]),
+            ("10.1.0.0/16", []),
+            ("1.1", []),
+            # file names look like domains, but are searched as substrings
+            ("payload.exe", ["url--ff0e7g65-hc5c-8f1g-ffff-109249511956"]),
+            ("example.", ["domain-name--dd8c5e43-fa3a-6d9e-dfff-987027399734", "domain-name--ee9d6f54-gb4b-7e0f-efff-098138400845", "url--ff0e7g65-hc5c-8f1g-ffff-109249511956"]),
+        ],
+    )
+    def test_filter_by_value_shape(self, client, feed_with_object_values, api_schema, value, expected_ids):
+        """Test IoC shaped values are matched whole, by prefix or by network."""
+        response = client.get('/api/v1/values/scos/', query_params=dict(value=value))
+
+        assert response.status_code == 200
+        assert sorted(obj['id'] for obj in response.json()['values']) == expected_ids
+
+        api_schema['/api/v1/values/scos/']['GET'].validate_response(
+            Transport.get_st_response(response)
+        )
+
+    def test_filter_by_value_too_short(self, client, feed_with_object_values):
+        """Test short free text is rejected instead of scanning every value."""
+        response = client.get('/api/v1/values/scos/?value=ex')
+        assert response.status_code == 400
+
     def test_filter_by_post_id(self, client, feed_with_object_values, api_schema):
         """Test filtering by post ID."""
 
@@ -331,6 +346,24 @@ class TestSCOValueView:
             Transport.get_st_response(response)
         )
 
+    def test_ordering_by_matched_posts(self, client, feed_with_object_values, api_schema):
+        """Test ordering by the number of posts an object was seen in."""
+        response = client.get('/api/v1/values/scos/?sort=matched_posts_descending')
+
+        assert response.status_code == 200
+        data = response.json()
+
+        top = data['values'][0]
+        assert top['id'] == "ipv4-addr--ba6b3f21-d818-4e7c-bfff-765805177512"
+        assert top['matched_posts'] == 2
+        assert top['feed_count'] == 1
+        assert top['first_seen'] < top['last_seen']
+        assert [obj['matched_posts'] for obj in data['values'][1:]] == [1] * 4
+
+        api_schema['/api/v1/values/scos/']['GET'].validate_response(
+            Transport.get_st_response(response)
+        )
+
     def test_pagination(self, client, feed_with_object_values, api_schema):
         """Test pagination of results."""
         response = client.get('/api/v1/values/scos/?page_size=2')
@@ -727,4 +760,49 @@ class TestValuesViewEdgeCases:
         
         api_schema['/api/v1/values/scos/']['GET'].validate_response(
             Transport.get_st_response(response)
-        )
\ No newline at end of file
+        )
+
+@pytest.mark.django_db
+class TestValueLookupView:
+    """Tests for the bulk value lookup endpoint."""
+
+    def lookup(self, client, **body):
+        response = client.post('/api/v1/values/lookup/', data=body, content_type='application/json')
+        assert response.status_code == 200
+        assert response.streaming
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_lookup(self, client, feed_with_object_values):
+        files = File.objects.filter(feed=feed_with_object_values).order_by('post__pubdate')
+        data = self.lookup(client, values=["WannaCry", "192.168.1.1", "203.0.113.9", "wannacry"])
+
+        assert [lookup["value"] for lookup in data["lookups"]] == ["wannacry", "192.168.1.1", "203.0.113.9"]
+        malware, ip, unknown = data["lookups"]
+        assert malware["matches"] == [
+            dict(
+                id="malware--1a2b3c4d-5e6f-7a8b-9c0d-1e2f3a4b5c6d",
+                type="malware",
+                post_ids=[str(files[1].post_id)],
+                feed_ids=[str(feed_with_object_values.feed_id)],
+            )
+        ]
+        assert ip["matches"][0]["id"] == "ipv4-addr--ba6b3f21-d818-4e7c-bfff-765805177512"
+        assert ip["matches"][0]["post_ids"] == sorted([str(files[0].post_id), str(files[1].post_id)])
+        assert unknown["matches"] == []
+
+    def test_lookup_types(self, client, feed_with_object_values):
+        data = self.lookup(client, values=["192.168.1.1"], types=["domain-name"])
+        assert data["lookups"] == [dict(value="192.168.1.1", matches=[])]
+
+    @pytest.mark.parametrize(
+        "body",
+        [
+            dict(),
+            dict(values=[]),
+            dict(values="192.168.1.1"),
+            dict(values=["x"] * 10_001),
+        ],
+    )
+    def test_lookup_invalid(self, client, body):
+        response = client.post('/api/v1/values/lookup/', data=body, content_type='application/json')
+        assert response.status_code == 400
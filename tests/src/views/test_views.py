@@ -77,3 +77,58 @@ def test_jobs_filter_by_multiple_states(client, api_schema, states, expected_ids
     assert returned == expected_ids
 
     api_schema["/api/v1/jobs/"]["GET"].validate_response(Transport.get_st_response(resp))
+
+
+@pytest.mark.django_db
+def test_feed_locks(client, obstracts_job, api_schema):
+    from obstracts.cjob import feed_lock
+    from obstracts.server import models as ob_models
+
+    waiting = ob_models.Job.objects.create(
+        id=uuid.uuid4(),
+        feed=obstracts_job.feed,
+        type=ob_models.JobType.REPROCESS_POSTS,
+        state=ob_models.JobState.QUEUED,
+    )
+    feed_lock.acquire(obstracts_job)
+    feed_lock.acquire(waiting)
+
+    resp = client.get("/api/v1/jobs/feed-locks/")
+    assert resp.status_code == 200, resp.content
+    assert len(resp.data) == 1
+    assert resp.data[0]["feed_id"] == str(obstracts_job.feed.pk)
+    assert resp.data[0]["holder"]["job_id"] == str(obstracts_job.pk)
+    assert [(w["job_id"], w["position"]) for w in resp.data[0]["waiting"]] == [
+        (str(waiting.pk), 1)
+    ]
+    api_schema["/api/v1/jobs/feed-locks/"]["GET"].validate_response(Transport.get_st_response(resp))
+
+
+@pytest.mark.django_db
+def test_job_retrieve_processing_metrics(client, obstracts_job, api_schema):
+    from obstracts.server import models as ob_models
+
+    resp = client.get(f"/api/v1/jobs/{obstracts_job.pk}/")
+    assert resp.status_code == 200, resp.content
+    assert resp.data["processing_metrics"] is None
+    api_schema["/api/v1/jobs/{job_id}/"]["GET"].validate_response(Transport.get_st_response(resp))
+
+    ob_models.PostProcessingMetrics.objects.create(
+        job=obstracts_job,
+        post_id=uuid.uuid4(),
+        succeeded=True,
+        total_seconds=3.5,
+        stages=dict(markdown=1.0, extraction=2.0),
+        db_queries=40,
+        arango_requests=12,
+    )
+    resp = client.get(f"/api/v1/jobs/{obstracts_job.pk}/")
+    assert resp.status_code == 200, resp.content
+    metrics = resp.data["processing_metrics"]
+    assert metrics["posts"] == 1
+    assert metrics["total_seconds"] == dict(p50=3.5, p95=3.5)
+    assert metrics["stages"]["extraction"] == dict(posts=1, p50=2.0, p95=2.0)
+    api_schema["/api/v1/jobs/{job_id}/"]["GET"].validate_response(Transport.get_st_response(resp))
+
+    resp = client.get("/api/v1/jobs/")
+    assert "processing_metrics" not in resp.data["jobs"][0]
@@ -6,6 +6,7 @@ import schemathesis
 from schemathesis.core.transport import Response as SchemathesisResponse
 from rest_framework.response import Response as DRFResponse
 from django.core.handlers.wsgi import WSGIRequest
+import uuid
 
 from schemathesis.transport.wsgi import (
     WSGI_TRANSPORT,
@@ -14,6 +15,14 @@ from schemathesis.transport.wsgi import (
 )
 
 
+# ids used by the posts_with_clusters fixture
+CLUSTER_1_ID = uuid.UUID("a1111111-1111-1111-1111-111111111111")
+CLUSTER_2_ID = uuid.UUID("a2222222-2222-2222-2222-222222222222")
+CLUSTER_HIDDEN_ID = uuid.UUID("a3333333-3333-3333-3333-333333333333")
+POST1_ID = uuid.UUID("561ed102-7584-4b7d-a302-43d4bca5605b")
+POST2_ID = uuid.UUID("345c8d0b-c6ca-4419-b1f7-0daeb4e9278b")
+
+
 class Transport(WSGITransport):
     def __init__(self):
         super().__init__()